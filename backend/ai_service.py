@@ -2,11 +2,9 @@
 Servizio per analisi automatica ACF/PACF (euristica locale, senza IA esterna).
 """
 import os
-import matplotlib
-matplotlib.use('Agg')  # Usa backend non-interattivo
-import matplotlib.pyplot as plt
-from utils import calculate_acf_pacf
 import numpy as np
+from config import Config
+from render_service import RenderService
 
 
 class AIService:
@@ -14,187 +12,40 @@ class AIService:
     
     def __init__(self):
         """Inizializza il servizio e la cartella per le immagini ACF/PACF."""
-        self.images_folder = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'ai_images')
+        self.images_folder = Config.AI_IMAGES_FOLDER
         os.makedirs(self.images_folder, exist_ok=True)
     
-    def generate_acf_pacf_images(self, series, file_id, prefix='original'):
+    def generate_acf_pacf_images(self, series, file_id=None, prefix='original'):
         """
-        Genera immagini ACF e PACF e le salva come PNG
+        Genera immagini ACF, PACF e combinata (impilata) come PNG
+        
+        Le immagini sono indirizzate per contenuto (RenderService): file_id e
+        prefix non servono più a nominarle e restano per compatibilità.
         
         Args:
             series: pandas Series o array con valori della serie
-            file_id: ID del file per naming
-            prefix: Prefisso per il nome file ('original' o 'smoothed')
+            file_id: ID del file (non usato)
+            prefix: Prefisso della serie (non usato)
         
         Returns:
-            tuple: (path_acf_image, path_pacf_image)
+            tuple: (path_acf_image, path_pacf_image, path_combined_image)
         """
-        # Calcola ACF/PACF
-        acf_pacf_data = calculate_acf_pacf(series)
-        
-        # Crea figure
-        fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(10, 8))
-        
-        # Plot ACF
-        lags = acf_pacf_data['lags']
-        acf_values = acf_pacf_data['acf']
-        acf_confint = acf_pacf_data['acf_confint']
-        
-        ax1.bar(lags, acf_values, width=0.3, alpha=0.7, color='steelblue')
-        ax1.axhline(y=0, color='black', linestyle='-', linewidth=0.5)
-        
-        # Aggiungi bande di confidenza
-        if acf_confint:
-            ci_lower = [ci[0] for ci in acf_confint]
-            ci_upper = [ci[1] for ci in acf_confint]
-            ax1.fill_between(lags, ci_lower, ci_upper, alpha=0.2, color='red', label='95% CI')
-            ax1.axhline(y=ci_upper[0] if ci_upper else 0, color='red', linestyle='--', linewidth=1, alpha=0.7)
-            ax1.axhline(y=ci_lower[0] if ci_lower else 0, color='red', linestyle='--', linewidth=1, alpha=0.7)
-        
-        ax1.set_xlabel('Lag')
-        ax1.set_ylabel('Autocorrelation')
-        ax1.set_title('Autocorrelation Function (ACF)')
-        ax1.grid(True, alpha=0.3)
-        ax1.legend()
-        
-        # Plot PACF
-        pacf_values = acf_pacf_data['pacf']
-        pacf_confint = acf_pacf_data['pacf_confint']
-        
-        ax2.bar(lags, pacf_values, width=0.3, alpha=0.7, color='darkgreen')
-        ax2.axhline(y=0, color='black', linestyle='-', linewidth=0.5)
-        
-        # Aggiungi bande di confidenza
-        if pacf_confint:
-            ci_lower = [ci[0] for ci in pacf_confint]
-            ci_upper = [ci[1] for ci in pacf_confint]
-            ax2.fill_between(lags, ci_lower, ci_upper, alpha=0.2, color='red', label='95% CI')
-            ax2.axhline(y=ci_upper[0] if ci_upper else 0, color='red', linestyle='--', linewidth=1, alpha=0.7)
-            ax2.axhline(y=ci_lower[0] if ci_lower else 0, color='red', linestyle='--', linewidth=1, alpha=0.7)
-        
-        ax2.set_xlabel('Lag')
-        ax2.set_ylabel('Partial Autocorrelation')
-        ax2.set_title('Partial Autocorrelation Function (PACF)')
-        ax2.grid(True, alpha=0.3)
-        ax2.legend()
-        
-        plt.tight_layout()
-        
-        # Salva immagine combinata
-        image_path = os.path.join(self.images_folder, f'{file_id}_{prefix}_acf_pacf.png')
-        plt.savefig(image_path, dpi=150, bbox_inches='tight')
-        plt.close()
-        
-        # Crea anche immagini separate per maggiore chiarezza
-        # ACF separato
-        fig_acf, ax_acf = plt.subplots(figsize=(10, 4))
-        ax_acf.bar(lags, acf_values, width=0.3, alpha=0.7, color='steelblue')
-        ax_acf.axhline(y=0, color='black', linestyle='-', linewidth=0.5)
-        if acf_confint:
-            ci_lower = [ci[0] for ci in acf_confint]
-            ci_upper = [ci[1] for ci in acf_confint]
-            ax_acf.fill_between(lags, ci_lower, ci_upper, alpha=0.2, color='red', label='95% CI')
-            ax_acf.axhline(y=ci_upper[0] if ci_upper else 0, color='red', linestyle='--', linewidth=1, alpha=0.7)
-            ax_acf.axhline(y=ci_lower[0] if ci_lower else 0, color='red', linestyle='--', linewidth=1, alpha=0.7)
-        ax_acf.set_xlabel('Lag')
-        ax_acf.set_ylabel('Autocorrelation')
-        ax_acf.set_title('Autocorrelation Function (ACF)')
-        ax_acf.grid(True, alpha=0.3)
-        ax_acf.legend()
-        
-        acf_path = os.path.join(self.images_folder, f'{file_id}_{prefix}_acf.png')
-        fig_acf.savefig(acf_path, dpi=150, bbox_inches='tight')
-        plt.close(fig_acf)
-        
-        # PACF separato
-        fig_pacf, ax_pacf = plt.subplots(figsize=(10, 4))
-        ax_pacf.bar(lags, pacf_values, width=0.3, alpha=0.7, color='darkgreen')
-        ax_pacf.axhline(y=0, color='black', linestyle='-', linewidth=0.5)
-        if pacf_confint:
-            ci_lower = [ci[0] for ci in pacf_confint]
-            ci_upper = [ci[1] for ci in pacf_confint]
-            ax_pacf.fill_between(lags, ci_lower, ci_upper, alpha=0.2, color='red', label='95% CI')
-            ax_pacf.axhline(y=ci_upper[0] if ci_upper else 0, color='red', linestyle='--', linewidth=1, alpha=0.7)
-            ax_pacf.axhline(y=ci_lower[0] if ci_lower else 0, color='red', linestyle='--', linewidth=1, alpha=0.7)
-        ax_pacf.set_xlabel('Lag')
-        ax_pacf.set_ylabel('Partial Autocorrelation')
-        ax_pacf.set_title('Partial Autocorrelation Function (PACF)')
-        ax_pacf.grid(True, alpha=0.3)
-        ax_pacf.legend()
-        
-        pacf_path = os.path.join(self.images_folder, f'{file_id}_{prefix}_pacf.png')
-        fig_pacf.savefig(pacf_path, dpi=150, bbox_inches='tight')
-        plt.close(fig_pacf)
-        
-        return acf_path, pacf_path, image_path
+        values = np.asarray(series, dtype=np.float64)
+        return tuple(RenderService.correlogram(values, kind) for kind in ('acf', 'pacf', 'acf_pacf'))
     
-    def create_combined_acf_pacf_image(self, series, file_id, prefix='original'):
+    def create_combined_acf_pacf_image(self, series, file_id=None, prefix='original'):
         """
         Crea un'immagine combinata con ACF e PACF affiancati per maggiore compatibilità con Ollama
         
         Args:
             series: pandas Series o array con valori della serie
-            file_id: ID del file per naming
-            prefix: Prefisso per il nome file ('original' o 'smoothed')
+            file_id: ID del file (non usato, immagini indirizzate per contenuto)
+            prefix: Prefisso della serie (non usato)
         
         Returns:
             path all'immagine combinata
         """
-        # Calcola ACF/PACF
-        acf_pacf_data = calculate_acf_pacf(series)
-        
-        # Crea figura con due subplot affiancati
-        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(16, 6))
-        
-        # Plot ACF
-        lags = acf_pacf_data['lags']
-        acf_values = acf_pacf_data['acf']
-        acf_confint = acf_pacf_data['acf_confint']
-        
-        ax1.bar(lags, acf_values, width=0.3, alpha=0.7, color='steelblue')
-        ax1.axhline(y=0, color='black', linestyle='-', linewidth=0.5)
-        
-        if acf_confint:
-            ci_lower = [ci[0] for ci in acf_confint]
-            ci_upper = [ci[1] for ci in acf_confint]
-            ax1.fill_between(lags, ci_lower, ci_upper, alpha=0.2, color='red', label='95% CI')
-            ax1.axhline(y=ci_upper[0] if ci_upper else 0, color='red', linestyle='--', linewidth=1, alpha=0.7)
-            ax1.axhline(y=ci_lower[0] if ci_lower else 0, color='red', linestyle='--', linewidth=1, alpha=0.7)
-        
-        ax1.set_xlabel('Lag')
-        ax1.set_ylabel('Autocorrelation')
-        ax1.set_title('Autocorrelation Function (ACF)')
-        ax1.grid(True, alpha=0.3)
-        ax1.legend()
-        
-        # Plot PACF
-        pacf_values = acf_pacf_data['pacf']
-        pacf_confint = acf_pacf_data['pacf_confint']
-        
-        ax2.bar(lags, pacf_values, width=0.3, alpha=0.7, color='darkgreen')
-        ax2.axhline(y=0, color='black', linestyle='-', linewidth=0.5)
-        
-        if pacf_confint:
-            ci_lower = [ci[0] for ci in pacf_confint]
-            ci_upper = [ci[1] for ci in pacf_confint]
-            ax2.fill_between(lags, ci_lower, ci_upper, alpha=0.2, color='red', label='95% CI')
-            ax2.axhline(y=ci_upper[0] if ci_upper else 0, color='red', linestyle='--', linewidth=1, alpha=0.7)
-            ax2.axhline(y=ci_lower[0] if ci_lower else 0, color='red', linestyle='--', linewidth=1, alpha=0.7)
-        
-        ax2.set_xlabel('Lag')
-        ax2.set_ylabel('Partial Autocorrelation')
-        ax2.set_title('Partial Autocorrelation Function (PACF)')
-        ax2.grid(True, alpha=0.3)
-        ax2.legend()
-        
-        plt.tight_layout()
-        
-        # Salva immagine combinata
-        combined_path = os.path.join(self.images_folder, f'{file_id}_{prefix}_combined_acf_pacf.png')
-        plt.savefig(combined_path, dpi=150, bbox_inches='tight')
-        plt.close()
-        
-        return combined_path
+        return RenderService.correlogram(np.asarray(series, dtype=np.float64), 'combined')
     
     def analyze_acf_pacf_with_ollama(self, acf_pacf_data, series_info=None, retry_with_fallback=True):
         """
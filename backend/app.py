@@ -48,6 +48,9 @@ def create_app():
     # Crea cartelle necessarie (così chi clona il repo non deve crearle a mano)
     os.makedirs(Config.INSTANCE_DIR, exist_ok=True)      # database SQLite
     os.makedirs(Config.UPLOAD_FOLDER, exist_ok=True)
+    os.makedirs(Config.BLOB_FOLDER, exist_ok=True)
+    os.makedirs(Config.DERIVED_FOLDER, exist_ok=True)
+    os.makedirs(Config.SERIES_STORE_FOLDER, exist_ok=True)
     os.makedirs(Config.EXPORT_FOLDER, exist_ok=True)
     os.makedirs(Config.AI_IMAGES_FOLDER, exist_ok=True)
     
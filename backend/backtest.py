@@ -0,0 +1,259 @@
+"""
+Backtest walk-forward (rolling origin) dei modelli SARIMAX.
+
+Un solo split train/test giudica il modello su un unico periodo. Il backtest
+ripete la previsione da molte origini: per ogni origine t il modello vede
+solo i dati prima di t e prevede i successivi 'horizon' punti; gli errori
+vengono aggregati per passo di previsione (MAE, RMSE, MAPE per h = 1..H).
+
+Il modello non viene ristimato a ogni origine: i parametri vengono stimati
+una volta sola e lo stato del filtro di Kalman viene portato avanti con
+extend() (finestra crescente, costo proporzionale ai nuovi punti) o
+riapplicato alla finestra con apply() (finestra mobile). In modalità 'warm'
+i parametri vengono ristimati ogni refit_every origini partendo da quelli
+correnti (pochi passi dell'ottimizzatore).
+
+Le origini sono divise in blocchi contigui valutati in parallelo su un pool
+di processi, come in order_search. In modalità 'warm' i parametri di ogni
+origine dipendono dalle ristime precedenti: le origini restano in un solo
+blocco, così il risultato non dipende dal numero di processi.
+"""
+import math
+import multiprocessing
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+WINDOW_MODES = ('expanding', 'sliding')
+PARAM_MODES = ('fixed', 'warm')
+
+# Origini minime per processo: con parametri fissi un'origine costa pochi ms e
+# l'avvio di un processo (import di statsmodels) circa un secondo
+ORIGINS_PER_WORKER = 100
+
+
+def rolling_origins(n, initial, horizon, step=1, max_origins=None):
+    """
+    Origini del backtest: indici t in cui si prevedono i punti t .. t + horizon - 1
+
+    Args:
+        n: lunghezza della serie
+        initial: osservazioni disponibili alla prima origine
+        horizon: passi di previsione (ogni origine ha un orizzonte completo)
+        step: distanza tra origini consecutive
+        max_origins: se le origini sono di più, ne vengono tenute max_origins equispaziate
+
+    Returns:
+        array int64 crescente (vuoto se la serie è troppo corta)
+    """
+    origins = np.arange(initial, n - horizon + 1, max(1, step), dtype=np.int64)
+    if max_origins and len(origins) > max_origins:
+        origins = np.unique(origins[np.linspace(0, len(origins) - 1, max_origins).round().astype(np.int64)])
+    return origins
+
+
+def _window_start(origin, window, window_size):
+    """Primo indice dei dati visti dal modello all'origine"""
+    return max(0, origin - window_size) if window == 'sliding' else 0
+
+
+def evaluate_origins(values, origins, horizon, spec, params, window='expanding', window_size=None,
+                     param_mode='fixed', refit_every=10, maxiter=25, trend_base=0):
+    """
+    Previsioni da un blocco di origini crescenti (eseguita nei processi figli)
+
+    Args:
+        values: serie completa (float64)
+        origins: origini del blocco
+        horizon: passi di previsione
+        spec: kwargs di SARIMAX (order, seasonal_order, trend, enforce_*)
+        params: parametri stimati (array nell'ordine di param_names)
+        window: 'expanding' o 'sliding'
+        window_size: osservazioni della finestra mobile
+        param_mode: 'fixed' (parametri invariati) o 'warm' (ristima periodica a caldo)
+        refit_every: origini tra due ristime in modalità 'warm'
+        maxiter: iterazioni massime dell'ottimizzatore per ogni ristima
+        trend_base: indice del primo punto dei dati su cui sono stati stimati i
+            parametri: il trend temporale ('t', 'ct') deve continuare da lì
+
+    Returns:
+        dict con 'forecasts' (array len(origins) x horizon), 'refits', 'iterations'
+    """
+    from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+    forecasts = np.full((len(origins), horizon), np.nan)
+    refits = 0
+    iterations = 0
+    params = np.asarray(params, dtype=np.float64)
+    results = None
+    previous = None
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        for i, origin in enumerate(origins):
+            origin = int(origin)
+            start = _window_start(origin, window, window_size)
+            endog = values[start:origin]
+            # extend() non propaga trend_offset oltre la prima estensione: va sempre esplicitato
+            offset = start - trend_base + 1
+            refit = param_mode == 'warm' and i > 0 and refit_every > 0 and i % refit_every == 0
+
+            if refit:
+                results = SARIMAX(endog, trend_offset=offset, **spec).fit(
+                    start_params=params, disp=False, cov_type='none', maxiter=maxiter)
+                params = np.asarray(results.params, dtype=np.float64)
+                refits += 1
+                iterations += int(results.mle_retvals.get('iterations', 0) or 0)
+            elif results is None:
+                results = SARIMAX(endog, trend_offset=offset, **spec).filter(params)
+            elif window == 'expanding':
+                # Solo i nuovi punti passano nel filtro, partendo dallo stato precedente
+                results = results.extend(values[previous:origin], trend_offset=previous - trend_base + 1)
+            else:
+                results = results.apply(endog, trend_offset=offset)
+
+            forecasts[i] = np.asarray(results.forecast(steps=horizon), dtype=np.float64)
+            previous = origin
+
+    return {'forecasts': forecasts, 'refits': refits, 'iterations': iterations}
+
+
+def _finite_or_none(value):
+    value = float(value)
+    return value if math.isfinite(value) else None
+
+
+def horizon_metrics(actual, forecasts):
+    """
+    MAE, RMSE e MAPE per passo di previsione e complessivi
+
+    Args:
+        actual, forecasts: array (origini x horizon)
+
+    Returns:
+        dict con 'by_horizon' (lista per h = 1..H) e 'overall'
+    """
+    errors = actual - forecasts
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # I punti con valore reale nullo non entrano nel MAPE
+        ape = np.where(actual != 0, np.abs(errors / actual), np.nan) * 100
+
+    def summarize(err, pct):
+        mape = np.nanmean(pct) if np.isfinite(pct).any() else np.nan
+        return {
+            'mae': _finite_or_none(np.mean(np.abs(err))),
+            'rmse': _finite_or_none(np.sqrt(np.mean(err ** 2))),
+            'mape': _finite_or_none(mape)
+        }
+
+    by_horizon = []
+    for h in range(errors.shape[1]):
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            by_horizon.append({'horizon': h + 1, **summarize(errors[:, h], ape[:, h])})
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        overall = summarize(errors.ravel(), ape.ravel())
+    return {'by_horizon': by_horizon, 'overall': overall}
+
+
+class Backtest:
+    """Backtest rolling origin di una specifica SARIMAX su una serie"""
+
+    def __init__(self, values, spec, horizon=1, initial=None, step=1, max_origins=200,
+                 window='expanding', window_size=None, param_mode='fixed', refit_every=10,
+                 n_jobs=1, mp_context='spawn'):
+        if window not in WINDOW_MODES:
+            raise ValueError(f"window deve essere uno tra {WINDOW_MODES}")
+        if param_mode not in PARAM_MODES:
+            raise ValueError(f"params deve essere uno tra {PARAM_MODES}")
+        self.values = np.ascontiguousarray(values, dtype=np.float64)
+        self.spec = spec
+        self.horizon = int(horizon)
+        self.initial = int(initial if initial is not None else len(self.values) * 0.8)
+        self.window = window
+        self.window_size = int(window_size or self.initial)
+        self.param_mode = param_mode
+        self.refit_every = int(refit_every)
+        self.n_jobs = max(1, int(n_jobs))
+        self.mp_context = mp_context
+        if self.horizon < 1:
+            raise ValueError('horizon deve essere >= 1')
+        self.origins = rolling_origins(len(self.values), self.initial, self.horizon, step, max_origins)
+        if len(self.origins) == 0:
+            raise ValueError('Serie troppo corta per il backtest con initial e horizon richiesti')
+        self.trend_base = _window_start(int(self.origins[0]), self.window, self.window_size)
+
+    def estimate_params(self, saved_params=None):
+        """
+        Parametri iniziali: quelli del modello già stimato se compatibili, altrimenti un fit
+
+        Args:
+            saved_params: dict nome -> valore (Model.estimated_params), stimati
+                sulle prime 'initial' osservazioni (usati solo con finestra crescente)
+
+        Returns:
+            (array parametri, True se è stato necessario un fit)
+        """
+        from statsmodels.tsa.statespace.sarimax import SARIMAX
+        first = self.values[self.trend_base:int(self.origins[0])]
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            model = SARIMAX(first, **self.spec)
+            if saved_params and self.window == 'expanding' and list(saved_params) == list(model.param_names):
+                return np.array([saved_params[name] for name in model.param_names], dtype=np.float64), False
+            return np.asarray(model.fit(disp=False, cov_type='none').params, dtype=np.float64), True
+
+    def run(self, saved_params=None):
+        """
+        Esegue il backtest
+
+        Returns:
+            dict JSON-serializzabile con configurazione, metriche per orizzonte e tempi
+        """
+        started = time.time()
+        params, fitted = self.estimate_params(saved_params)
+        kwargs = {
+            'window': self.window,
+            'window_size': self.window_size,
+            'param_mode': self.param_mode,
+            'refit_every': self.refit_every,
+            'trend_base': self.trend_base
+        }
+
+        # Blocchi contigui: ogni processo filtra fino alla sua prima origine, poi avanza con extend().
+        # Con ristime a caldo la sequenza dei parametri è sequenziale: un solo blocco
+        n_blocks = max(1, min(self.n_jobs, len(self.origins) // ORIGINS_PER_WORKER))
+        if self.param_mode == 'warm':
+            n_blocks = 1
+        blocks = np.array_split(self.origins, n_blocks)
+        if n_blocks == 1:
+            outputs = [evaluate_origins(self.values, blocks[0], self.horizon, self.spec, params, **kwargs)]
+        else:
+            with ProcessPoolExecutor(max_workers=n_blocks,
+                                     mp_context=multiprocessing.get_context(self.mp_context)) as executor:
+                futures = [executor.submit(evaluate_origins, self.values, block, self.horizon,
+                                           self.spec, params, **kwargs) for block in blocks]
+                outputs = [future.result() for future in futures]
+
+        forecasts = np.vstack([out['forecasts'] for out in outputs])
+        actual = self.values[self.origins[:, None] + np.arange(self.horizon)]
+        return {
+            'horizon': self.horizon,
+            'initial': self.initial,
+            'window': self.window,
+            'window_size': self.window_size if self.window == 'sliding' else None,
+            'params': self.param_mode,
+            'refit_every': self.refit_every if self.param_mode == 'warm' else None,
+            'n_origins': int(len(self.origins)),
+            'first_origin': int(self.origins[0]),
+            'last_origin': int(self.origins[-1]),
+            'initial_fit': fitted,
+            'refits': sum(out['refits'] for out in outputs),
+            'optimizer_iterations': sum(out['iterations'] for out in outputs),
+            'n_jobs': n_blocks,
+            'metrics': horizon_metrics(actual, forecasts),
+            'seconds': time.time() - started
+        }
@@ -0,0 +1,90 @@
+"""
+Benchmark dei kernel di trasformazione (utils) contro il vecchio percorso pandas.
+
+Uso (dalla radice del repository):
+    python backend/benchmarks/transforms.py [--sizes 10000 1000000] [--window 7] [--order 2] [--repeat 5]
+
+Per ogni dimensione stampa il migliore di --repeat tempi (ms) di smoothing,
+differenziazione e logaritmo su una random walk positiva, e l'errore massimo
+della media mobile rispetto a pandas rolling().mean().
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import moving_average, difference, log_values  # noqa: E402
+
+
+def pandas_smoothing(df, window):
+    """Media mobile come in apply_smoothing prima dei kernel"""
+    out = df.copy()
+    out['y'] = out['y'].rolling(window=window, min_periods=window).mean()
+    return out.dropna(subset=['y']).reset_index(drop=True)
+
+
+def pandas_differencing(df, order):
+    """Differenziazione come in apply_differencing prima dei kernel"""
+    out = df.copy()
+    for _ in range(order):
+        out['y'] = out['y'].diff()
+    return out.dropna(subset=['y']).reset_index(drop=True)
+
+
+def pandas_log(df):
+    """Logaritmo come in apply_log_transform prima dei kernel"""
+    out = df.copy()
+    if (out['y'] <= 0).any():
+        raise ValueError('valori <= 0')
+    out['y'] = np.log(out['y'])
+    return out
+
+
+def best_ms(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 1_000_000, 10_000_000])
+    parser.add_argument('--window', type=int, default=7)
+    parser.add_argument('--order', type=int, default=2)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f'{"n":>10}  {"passo":<7} {"pandas ms":>10} {"kernel ms":>10}')
+    for n in args.sizes:
+        values = 80_000 + np.cumsum(rng.normal(size=n))
+        df = pd.DataFrame({'data': pd.date_range('2000-01-01', periods=n, freq='min'), 'y': values})
+        buffer = np.empty_like(values)
+
+        def log_in_place():
+            buffer[:] = values
+            log_values(buffer, out=buffer)
+
+        rows = [
+            ('smooth', lambda: pandas_smoothing(df, args.window), lambda: moving_average(values, args.window)),
+            ('diff', lambda: pandas_differencing(df, args.order), lambda: difference(values, args.order)),
+            ('log', lambda: pandas_log(df), log_in_place),
+        ]
+        for name, old, new in rows:
+            print(f'{n:>10}  {name:<7} {best_ms(old, args.repeat):>10.2f} {best_ms(new, args.repeat):>10.2f}')
+
+        expected = pd.Series(values).rolling(args.window).mean().to_numpy()[args.window - 1:]
+        error = np.max(np.abs(moving_average(values, args.window) - expected))
+        print(f'{n:>10}  max |moving_average - rolling().mean()| = {error:.2e}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+"""
+Deduplicazione dei file caricati per contenuto (SHA-256).
+
+Ogni upload viene letto a blocchi, calcolando l'hash mentre viene scritto su
+un file temporaneo. Se il contenuto è già presente il temporaneo viene
+scartato e il File punta al blob esistente, altrimenti il blob viene
+archiviato in BLOB_FOLDER/<hh>/<hash>.csv. La tabella blob conta i File che
+lo usano (ref_count); i blob non più referenziati vengono rimossi da
+collect_garbage() insieme ai loro artefatti, anche dopo il commit che
+elimina l'ultimo File che li usava.
+
+Gli artefatti derivati dal contenuto (statistiche e ACF/PACF della serie
+originale) stanno in DERIVED_FOLDER/<hash>/ e sono condivisi da tutti i File
+con lo stesso contenuto: un nuovo upload dello stesso CSV non ricalcola nulla.
+Le serie trasformate non vengono salvate, le calcola TransformService; le
+immagini sono indirizzate per contenuto da RenderService.
+"""
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+from sqlalchemy import event, update, delete, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, object_session
+from database import db
+from models import Blob, File
+from series_store import SeriesStore
+from series_pyramid import PyramidStore
+from config import Config
+
+# Dimensione dei blocchi letti dallo stream di upload
+CHUNK_SIZE = 1024 * 1024
+
+
+class BlobStore:
+    """Archivio dei contenuti caricati e dei loro artefatti derivati"""
+
+    @staticmethod
+    def blob_path(content_hash):
+        return os.path.join(Config.BLOB_FOLDER, content_hash[:2], f'{content_hash}.csv')
+
+    @staticmethod
+    def derived_dir(content_hash):
+        return os.path.join(Config.DERIVED_FOLDER, content_hash)
+
+    @staticmethod
+    def store_upload(file_storage):
+        """
+        Salva uno upload (werkzeug FileStorage) deduplicandolo per contenuto
+
+        Il ref_count viene incrementato subito: se la validazione del contenuto
+        fallisce il chiamante deve invocare release().
+
+        Returns:
+            (Blob, is_new): is_new è False se il contenuto era già archiviato
+        """
+        os.makedirs(Config.BLOB_FOLDER, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=Config.BLOB_FOLDER, suffix='.upload')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                while True:
+                    chunk = file_storage.stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+            content_hash = digest.hexdigest()
+            path = BlobStore.blob_path(content_hash)
+
+            blob = db.session.get(Blob, content_hash)
+            is_new = blob is None
+            if is_new:
+                blob = Blob(content_hash=content_hash, path=path, size=size, ref_count=1)
+                db.session.add(blob)
+                try:
+                    db.session.commit()
+                except IntegrityError:
+                    # Stesso contenuto caricato in contemporanea da un'altra richiesta
+                    db.session.rollback()
+                    is_new = False
+            if not is_new:
+                BlobStore._add_ref(content_hash, 1)
+                db.session.commit()
+                blob = db.session.get(Blob, content_hash)
+            if not os.path.exists(path):
+                # Contenuto nuovo (o blob rimosso dal disco): archivia il temporaneo.
+                # Solo dopo il commit del riferimento, così collect_garbage non lo rimuove
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+            return blob, is_new
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    @staticmethod
+    def _add_ref(content_hash, delta, connection=None):
+        """Aggiorna ref_count in modo atomico (UPDATE ... SET ref_count = ref_count + delta)"""
+        stmt = update(Blob).where(Blob.content_hash == content_hash).values(ref_count=Blob.ref_count + delta)
+        (connection or db.session).execute(stmt)
+
+    @staticmethod
+    def release(content_hash):
+        """Rilascia un riferimento (es. upload non valido) e rimuove il blob se non più usato"""
+        BlobStore._add_ref(content_hash, -1)
+        db.session.commit()
+        return BlobStore.collect_garbage([content_hash])
+
+    @staticmethod
+    def collect_garbage(content_hashes=None):
+        """
+        Rimuove i blob con ref_count <= 0: file, archivio binario, piramidi e artefatti derivati
+
+        La condizione ref_count <= 0 viene ricontrollata nella DELETE di ogni blob:
+        se nel frattempo un upload dello stesso contenuto ha ripreso il blob,
+        la riga e i file restano.
+
+        Args:
+            content_hashes: limita la raccolta a questi hash (None = tutti i blob)
+
+        Returns:
+            int: numero di blob rimossi
+        """
+        query = select(Blob.content_hash, Blob.path).where(Blob.ref_count <= 0)
+        if content_hashes is not None:
+            query = query.where(Blob.content_hash.in_(list(content_hashes)))
+        # Connessioni proprie: la raccolta può girare subito dopo il commit della sessione
+        with db.engine.connect() as connection:
+            orphans = connection.execute(query).all()
+
+        removed = 0
+        for content_hash, path in orphans:
+            with db.engine.begin() as connection:
+                deleted = connection.execute(
+                    delete(Blob).where(Blob.content_hash == content_hash, Blob.ref_count <= 0)
+                ).rowcount
+            if not deleted:
+                continue
+            SeriesStore.remove(path)
+            PyramidStore.remove(path)
+            if os.path.exists(path):
+                os.remove(path)
+            shutil.rmtree(BlobStore.derived_dir(content_hash), ignore_errors=True)
+            removed += 1
+        return removed
+
+    # ----- artefatti derivati -----
+    @staticmethod
+    def load_summary(content_hash):
+        """Statistiche e ACF/PACF della serie originale già calcolate (None se assenti)"""
+        try:
+            with open(os.path.join(BlobStore.derived_dir(content_hash), 'summary.json')) as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def save_summary(content_hash, summary):
+        """Salva in modo atomico statistiche e ACF/PACF della serie originale"""
+        directory = BlobStore.derived_dir(content_hash)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, 'summary.json')
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as fh:
+            json.dump(summary, fh)
+        os.replace(tmp_path, path)
+
+
+@event.listens_for(File, 'after_delete')
+def _release_blob_on_delete(mapper, connection, target):
+    """Eliminando un File deduplicato si rilascia il riferimento al suo blob"""
+    if target.content_hash:
+        BlobStore._add_ref(target.content_hash, -1, connection=connection)
+        session = object_session(target)
+        if session is not None:
+            session.info.setdefault('released_blobs', set()).add(target.content_hash)
+
+
+@event.listens_for(Session, 'after_commit')
+def _collect_released_blobs(session):
+    """Dopo il commit che elimina dei File, rimuove i blob rimasti senza riferimenti"""
+    released = session.info.pop('released_blobs', None)
+    if released:
+        BlobStore.collect_garbage(released)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_released_blobs(session):
+    session.info.pop('released_blobs', None)
@@ -0,0 +1,115 @@
+"""
+Cache in memoria condivise dal processo (una per worker).
+
+LRUCache è una cache LRU thread-safe limitata da un budget in byte, con
+contatori di hit/miss/evictions per dimensionarla in base al carico reale.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Tutte le cache create nel processo, per esporne le statistiche
+_registry = []
+
+
+def _default_sizeof(value):
+    """Stima della dimensione in byte di un valore (array numpy o tuple di array)"""
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, (tuple, list)):
+        return sum(_default_sizeof(v) for v in value)
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(_default_sizeof(v) for v in value.values())
+    return 64
+
+
+class LRUCache:
+    """Cache LRU thread-safe con eviction basata sul budget in byte"""
+
+    def __init__(self, name, max_bytes, sizeof=None):
+        """
+        Args:
+            name: nome della cache (usato nelle statistiche)
+            max_bytes: budget massimo in byte; 0 disabilita la cache
+            sizeof: funzione che stima i byte occupati da un valore
+        """
+        self.name = name
+        self.max_bytes = int(max_bytes)
+        self._sizeof = sizeof or _default_sizeof
+        self._lock = threading.Lock()
+        self._data = OrderedDict()  # key -> (value, nbytes)
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        _registry.append(self)
+
+    def get(self, key, default=None):
+        """Restituisce il valore e lo marca come usato di recente"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, nbytes=None):
+        """Inserisce un valore, espellendo i meno usati se si supera il budget"""
+        if nbytes is None:
+            nbytes = self._sizeof(value)
+        with self._lock:
+            if key in self._data:
+                self._bytes -= self._data.pop(key)[1]
+            # Valori più grandi dell'intero budget non vengono memorizzati
+            if nbytes > self.max_bytes:
+                return value
+            self._data[key] = (value, nbytes)
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes and self._data:
+                _, (_, evicted_bytes) = self._data.popitem(last=False)
+                self._bytes -= evicted_bytes
+                self.evictions += 1
+        return value
+
+    def pop(self, key):
+        """Rimuove una voce (invalidazione esplicita)"""
+        with self._lock:
+            entry = self._data.pop(key, None)
+            if entry is None:
+                return None
+            self._bytes -= entry[1]
+            self.invalidations += 1
+            return entry[0]
+
+    def clear(self):
+        """Svuota la cache mantenendo i contatori"""
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Contatori e occupazione corrente"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'name': self.name,
+                'entries': len(self._data),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / total) if total else None,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
+
+
+def all_cache_stats():
+    """Statistiche di tutte le cache del processo"""
+    return {cache.name: cache.stats() for cache in _registry}
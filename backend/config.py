@@ -14,16 +14,75 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', f'sqlite:///{os.path.join(BASE_DIR, "instance", "dash.db")}')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # SQLite: journal WAL per letture concorrenti durante le scritture dei job
+    SQLITE_JOURNAL_MODE = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    
     # File Upload - percorso assoluto
     UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', os.path.join(BASE_DIR, 'data', 'uploads'))
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
+    # Contenuti deduplicati per hash e artefatti derivati condivisi (serie trasformate, statistiche, immagini)
+    BLOB_FOLDER = os.getenv('BLOB_FOLDER', os.path.join(UPLOAD_FOLDER, 'blobs'))
+    DERIVED_FOLDER = os.getenv('DERIVED_FOLDER', os.path.join(UPLOAD_FOLDER, 'derived'))
+    
+    # Archivio binario delle serie validate (date int64 + valori float64)
+    SERIES_STORE_FOLDER = os.getenv('SERIES_STORE_FOLDER', os.path.join(BASE_DIR, 'data', 'series'))
+    # Budget in byte della cache in memoria delle serie (per worker)
+    SERIES_CACHE_MAX_BYTES = int(os.getenv('SERIES_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+    # Serie archiviate da almeno questi byte vengono lette memory-mapped (pagine condivise
+    # tra worker e lette dal sistema operativo solo quando servono)
+    SERIES_MMAP_MIN_BYTES = int(os.getenv('SERIES_MMAP_MIN_BYTES', 8 * 1024 * 1024))
+    # Budget in byte della cache delle serie trasformate per ricetta (per worker)
+    TRANSFORM_CACHE_MAX_BYTES = int(os.getenv('TRANSFORM_CACHE_MAX_BYTES', 128 * 1024 * 1024))
+    # Budget in byte della cache dei risultati ACF/PACF per (serie, nlags, alpha) (per worker)
+    ACF_CACHE_MAX_BYTES = int(os.getenv('ACF_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+    
+    # Modelli stimati (model_store): 'compact' = parametri + stato finale del filtro,
+    # 'full' = anche i risultati completi di statsmodels
+    MODEL_ARTIFACTS_FOLDER = os.getenv('MODEL_ARTIFACTS_FOLDER', os.path.join(BASE_DIR, 'data', 'models'))
+    MODEL_ARTIFACT_MODE = os.getenv('MODEL_ARTIFACT_MODE', 'compact')
+    MODEL_CACHE_MAX_BYTES = int(os.getenv('MODEL_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    # Punti minimi per precalcolare la piramide multi-risoluzione di una serie (sotto si decima al volo)
+    PYRAMID_MIN_POINTS = int(os.getenv('PYRAMID_MIN_POINTS', 50000))
+    
+    # Serie fitted/forecast per modello: compressione delle colonne binarie ('zlib' o 'none')
+    FORECAST_SERIES_COMPRESSION = os.getenv('FORECAST_SERIES_COMPRESSION', 'zlib')
+    # Previsioni future (POST /api/model/<id>/forecast): orizzonte massimo
+    FORECAST_MAX_STEPS = int(os.getenv('FORECAST_MAX_STEPS', 1000))
+    
+    # Budget query SQL per endpoint (query_budget): se true il superamento solleva un'eccezione
+    # invece di essere solo loggato (sempre attivo con TESTING)
+    QUERY_BUDGET_STRICT = os.getenv('QUERY_BUDGET_STRICT', 'False').lower() == 'true'
     
-    # AI Images - percorso assoluto
+    # Immagini ACF/PACF e grafici (cache indirizzata per contenuto) - percorso assoluto
     AI_IMAGES_FOLDER = os.getenv('AI_IMAGES_FOLDER', os.path.join(BASE_DIR, 'data', 'ai_images'))
+    # Dimensione massima in byte della cartella immagini (espulse le meno usate di recente)
+    RENDER_CACHE_MAX_BYTES = int(os.getenv('RENDER_CACHE_MAX_BYTES', 64 * 1024 * 1024))
     
     # Export PDF - percorso assoluto
     EXPORT_FOLDER = os.getenv('EXPORT_FOLDER', os.path.join(BASE_DIR, 'data', 'exports'))
     
+    # Job asincroni (fit SARIMAX): thread nel pool, job in coda ammessi, job terminati conservati
+    JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))
+    JOB_MAX_QUEUED = int(os.getenv('JOB_MAX_QUEUED', 20))
+    JOB_HISTORY = int(os.getenv('JOB_HISTORY', 500))
+    
+    # Selezione automatica ordine SARIMAX (pool di processi)
+    AUTO_SELECT_WORKERS = int(os.getenv('AUTO_SELECT_WORKERS', max(1, (os.cpu_count() or 2) - 1)))
+    AUTO_SELECT_MP_CONTEXT = os.getenv('AUTO_SELECT_MP_CONTEXT', 'spawn')
+    AUTO_SELECT_MAX_CANDIDATES = int(os.getenv('AUTO_SELECT_MAX_CANDIDATES', 200))
+    AUTO_SELECT_CANDIDATE_TIMEOUT = float(os.getenv('AUTO_SELECT_CANDIDATE_TIMEOUT', 30))
+    AUTO_SELECT_TIME_BUDGET = float(os.getenv('AUTO_SELECT_TIME_BUDGET', 300))
+    
+    # Warm start dei fit dai parametri del modello più simile già stimato sullo stesso file
+    FIT_WARM_START = os.getenv('FIT_WARM_START', 'True').lower() == 'true'
+    FIT_WARM_START_CANDIDATES = int(os.getenv('FIT_WARM_START_CANDIDATES', 50))
+    
+    # Backtest walk-forward: processi per i blocchi di origini (stesso contesto della selezione automatica)
+    BACKTEST_WORKERS = int(os.getenv('BACKTEST_WORKERS', max(1, (os.cpu_count() or 2) - 1)))
+    BACKTEST_MAX_ORIGINS = int(os.getenv('BACKTEST_MAX_ORIGINS', 500))
+    BACKTEST_MAX_HORIZON = int(os.getenv('BACKTEST_MAX_HORIZON', 365))
+    
     # Ollama Configuration
     OLLAMA_URL = os.getenv('OLLAMA_URL', 'http://localhost:11434')
     OLLAMA_MODEL = os.getenv('OLLAMA_MODEL', 'llava')
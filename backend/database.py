@@ -1,9 +1,18 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import inspect
 
 db = SQLAlchemy()
 
 def init_db(app):
     db.init_app(app)
     with app.app_context():
+        from migrations import register_sqlite_pragmas, run_migrations
+        register_sqlite_pragmas(
+            db.engine,
+            journal_mode=app.config.get('SQLITE_JOURNAL_MODE'),
+            busy_timeout_ms=app.config.get('SQLITE_BUSY_TIMEOUT_MS', 5000)
+        )
+        # Database nuovo: create_all crea lo schema completo, le migrazioni vengono solo marcate
+        fresh = not inspect(db.engine).get_table_names()
         db.create_all()
-
+        run_migrations(db.engine, fresh=fresh, logger=app.logger)
@@ -0,0 +1,118 @@
+"""
+Decimazione delle serie per i grafici.
+
+Restituire un punto ogni 'step' perde picchi e minimi locali. Qui le serie
+vengono ridotte scegliendo i punti visivamente più rilevanti:
+
+- LTTB (Largest-Triangle-Three-Buckets): divide la serie in bucket e da
+  ognuno tiene il punto che forma il triangolo di area massima con il punto
+  scelto nel bucket precedente e la media del successivo. Conserva la forma
+  della curva con un numero fisso di punti.
+- min/max: per ogni bucket tiene il minimo e il massimo (inviluppo), utile
+  per serie molto rumorose dove contano gli estremi.
+
+Le funzioni restituiscono indici ordinati, da applicare a tutte le colonne
+della serie (date, valori, intervalli di confidenza, ...). Primo e ultimo
+punto sono sempre inclusi.
+"""
+import numpy as np
+
+METHODS = ('lttb', 'minmax')
+
+
+def _fill_nan(y):
+    """Sostituisce i NaN con la media (i NaN non devono vincere argmax/argmin)"""
+    missing = np.isnan(y)
+    if not missing.any():
+        return y
+    fill = np.nanmean(y) if not missing.all() else 0.0
+    return np.where(missing, fill, y)
+
+
+def lttb_indices(x, y, n_out):
+    """
+    Indici scelti da Largest-Triangle-Three-Buckets
+
+    Args:
+        x: ascisse crescenti (es. date int64)
+        y: valori
+        n_out: punti da restituire (>= 3)
+
+    Returns:
+        array int64 di min(n_out, len(y)) indici crescenti
+    """
+    n = len(y)
+    if n_out >= n:
+        return np.arange(n)
+    if n_out < 3:
+        return np.array([0, n - 1])[:max(n_out, 0)]
+
+    x = np.asarray(x, dtype=np.int64)
+    x = (x - x[0]).astype(np.float64)
+    y = _fill_nan(np.asarray(y, dtype=np.float64))
+
+    # n_out - 2 bucket centrali su [1, n - 1): primo e ultimo punto fissi
+    n_buckets = n_out - 2
+    edges = np.linspace(1, n - 1, n_buckets + 1).astype(np.int64)
+    counts = np.diff(edges)
+    avg_x = np.add.reduceat(x[:n - 1], edges[:-1]) / counts
+    avg_y = np.add.reduceat(y[:n - 1], edges[:-1]) / counts
+    # Per ogni bucket il terzo vertice è la media del bucket successivo (l'ultimo punto per l'ultimo)
+    next_x = np.append(avg_x[1:], x[n - 1])
+    next_y = np.append(avg_y[1:], y[n - 1])
+
+    out = np.empty(n_out, dtype=np.int64)
+    out[0] = 0
+    out[-1] = n - 1
+    a = 0
+    for i in range(n_buckets):
+        start, stop = edges[i], edges[i + 1]
+        ax, ay = x[a], y[a]
+        # Area (a meno del fattore 1/2) del triangolo a - candidato - media successiva
+        area = np.abs((ax - next_x[i]) * (y[start:stop] - ay) - (ax - x[start:stop]) * (next_y[i] - ay))
+        a = start + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+
+def minmax_indices(y, n_out):
+    """
+    Indici dell'inviluppo min/max: minimo e massimo di ogni bucket
+
+    Returns:
+        array int64 di al più n_out indici crescenti
+    """
+    n = len(y)
+    if n_out >= n:
+        return np.arange(n)
+    n_buckets = max(1, (n_out - 2) // 2)
+    y = _fill_nan(np.asarray(y, dtype=np.float64))
+
+    # Bucket di uguale dimensione; il padding finale non può essere scelto
+    size = -(-n // n_buckets)
+    n_buckets = -(-n // size)
+    padded_min = np.full(n_buckets * size, np.inf)
+    padded_max = np.full(n_buckets * size, -np.inf)
+    padded_min[:n] = y
+    padded_max[:n] = y
+    offsets = np.arange(n_buckets) * size
+    lows = padded_min.reshape(n_buckets, size).argmin(axis=1) + offsets
+    highs = padded_max.reshape(n_buckets, size).argmax(axis=1) + offsets
+    return np.unique(np.concatenate(([0, n - 1], lows, highs)))
+
+
+def decimate_indices(x, y, max_points, method='lttb'):
+    """
+    Indici dei punti da tenere per mostrare al più max_points punti
+
+    Args:
+        x: ascisse (date)
+        y: valori usati per scegliere i punti
+        max_points: punti massimi
+        method: 'lttb' o 'minmax'
+    """
+    if method == 'minmax':
+        return minmax_indices(y, max_points)
+    if method == 'lttb':
+        return lttb_indices(x, y, max_points)
+    raise ValueError(f"Metodo di decimazione non valido: {method}")
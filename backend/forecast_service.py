@@ -0,0 +1,218 @@
+"""
+Previsioni oltre il test set (categoria 'future') da un modello già stimato.
+
+Il modello non viene ristimato: se l'archivio dei modelli (model_store) ha lo
+stato finale del fit, il filtro prosegue da lì sulle sole osservazioni del
+test; altrimenti i parametri salvati (Model.estimated_params) vengono
+applicati con filter() all'intera serie trasformata (train + test). In
+entrambi i casi la previsione parte dall'ultima osservazione. Tutti i livelli degli intervalli
+vengono calcolati in un solo passaggio dalla varianza della previsione.
+
+Ritorno alla scala originale:
+- differenziazione: il modello viene filtrato sulla serie prima della
+  differenziazione con ordine d aumentato degli stessi passi. Il modello di
+  stato integrato è equivalente a quello stimato sulle differenze: medie e
+  varianze della previsione sono esatte sulla scala dei livelli, senza
+  approssimare la somma cumulata degli errori;
+- logaritmo: exp() di previsione e limiti (la previsione diventa la mediana,
+  gli intervalli restano esatti);
+- smoothing: la media mobile non è invertibile, la previsione resta sulla
+  serie smussata ('scale': 'smoothed').
+"""
+import json
+import warnings
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+from database import db
+from models import *
+from forecast_store import ForecastSeriesStore, CATEGORY_CODES
+from transform_service import TransformService, TransformRecipe
+from model_store import ModelArtifactStore, endog_hash
+
+
+def parse_levels(levels):
+    """
+    Livelli degli intervalli in percentuale ('80,95' o lista) come frazioni ordinate
+
+    Raises:
+        ValueError: livello non numerico o fuori da (0, 100)
+    """
+    if isinstance(levels, str):
+        levels = [item for item in levels.split(',') if item.strip()]
+    parsed = sorted({float(level) for level in levels})
+    if not parsed or any(not 0 < level < 100 for level in parsed):
+        raise ValueError('levels deve contenere percentuali tra 0 e 100 (es. 80,95)')
+    return [level / 100 for level in parsed]
+
+
+def future_dates(dates, steps):
+    """
+    Date delle previsioni dopo l'ultima osservazione
+
+    La frequenza viene dedotta dalle ultime date (pd.infer_freq, che riconosce
+    anche mesi, giorni lavorativi, ...). Se le date sono irregolari (es. festività
+    in una serie di borsa) si usa il passo più frequente: un passo di un giorno
+    con tutte le date da lunedì a venerdì diventa la frequenza 'B' (giorni
+    lavorativi), così le previsioni non cadono nel fine settimana.
+
+    Args:
+        dates: date della serie (int64 epoch-ns)
+        steps: numero di date
+
+    Returns:
+        array datetime64[ns]
+    """
+    index = pd.DatetimeIndex(np.asarray(dates[-min(len(dates), 60):], dtype=np.int64).view('datetime64[ns]'))
+    freq = pd.infer_freq(index) if len(index) >= 3 else None
+    if freq is None and len(index) > 1:
+        steps_ns, counts = np.unique(np.diff(index.asi8), return_counts=True)
+        step = pd.Timedelta(int(steps_ns[np.argmax(counts)]))
+        if step == pd.Timedelta(days=1) and (index.dayofweek < 5).all():
+            freq = 'B'
+        else:
+            freq = pd.tseries.frequencies.to_offset(step)
+    if freq is None:
+        freq = 'D'
+    return pd.date_range(index[-1], periods=steps + 1, freq=freq)[1:].values
+
+
+def interval_bounds(mean, variance, levels):
+    """
+    Limiti degli intervalli gaussiani per più livelli in un solo passaggio
+
+    Returns:
+        (lower, upper): array (len(levels) x len(mean))
+    """
+    z = norm.ppf(0.5 + np.asarray(levels) / 2)[:, None]
+    se = np.sqrt(np.maximum(variance, 0))[None, :]
+    return mean[None, :] - z * se, mean[None, :] + z * se
+
+
+class ForecastService:
+    """Previsioni future dai parametri salvati di un modello"""
+
+    @staticmethod
+    def latest_run(model):
+        """ModelRun più recente del modello (contiene ricetta e specifica del fit)"""
+        return (ModelRun.query.filter_by(model_id=model.model_id)
+                .order_by(ModelRun.created_at.desc(), ModelRun.run_id.desc()).first())
+
+    @staticmethod
+    def forecast(model, steps, levels=(0.8, 0.95), original_scale=True):
+        """
+        Previsione di 'steps' punti dopo la fine della serie
+
+        Args:
+            model: Model completato
+            steps: orizzonte
+            levels: livelli degli intervalli (frazioni)
+            original_scale: riporta previsioni e intervalli sulla scala dei dati
+
+        Returns:
+            dict con 'dates', 'forecast', 'intervals' {livello: {'lower', 'upper'}},
+            'scale' e, per la persistenza, 'transformed' (stessa scala di train/test)
+
+        Raises:
+            ValueError: modello senza parametri/configurazione o specifica non supportata
+        """
+        from services import SarimaxService
+        from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+        model_run = ForecastService.latest_run(model)
+        if model_run is None or not model.estimated_params:
+            raise ValueError('Parametri del modello non disponibili')
+        configuration = json.loads(model_run.configuration) if model_run.configuration else {}
+        spec = SarimaxService.model_spec(model, configuration)
+        recipe = TransformRecipe.from_config(configuration)
+        saved = json.loads(model.estimated_params)
+
+        dates, values = TransformService.series(model.file, recipe)
+
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            sarimax = SARIMAX(values, **spec)
+            if list(saved) != list(sarimax.param_names):
+                raise ValueError('I parametri salvati non corrispondono alla specifica del modello')
+            params = np.array([saved[name] for name in sarimax.param_names], dtype=np.float64)
+            fitted = ModelArtifactStore.load(model)
+            if fitted is not None and fitted.train_hash == endog_hash(values[:fitted.nobs]):
+                # Il filtro riparte dallo stato salvato a fine train: solo il test viene filtrato
+                prediction = fitted.get_forecast(steps, values[fitted.nobs:])
+            else:
+                prediction = sarimax.filter(params).get_forecast(steps=steps)
+            transformed = np.asarray(prediction.predicted_mean, dtype=np.float64)
+            transformed_var = np.asarray(prediction.var_pred_mean, dtype=np.float64)
+
+            mean, variance, scale = transformed, transformed_var, 'transformed'
+            k = recipe.differencing_order
+            if original_scale and k > 0:
+                # Stesso modello con l'integrazione nello stato, sulla serie prima delle differenze
+                level_values = TransformService.series(
+                    model.file, TransformRecipe(recipe.smoothing_window, recipe.log_transform, 0))[1]
+                p, d, q = spec['order']
+                integrated = SARIMAX(level_values, trend_offset=1 - k, **dict(spec, order=(p, d + k, q)))
+                prediction = integrated.filter(params).get_forecast(steps=steps)
+                mean = np.asarray(prediction.predicted_mean, dtype=np.float64)
+                variance = np.asarray(prediction.var_pred_mean, dtype=np.float64)
+
+        lower, upper = interval_bounds(mean, variance, levels)
+        # Intervallo al 95% sulla scala trasformata per le righe 'future' salvate
+        t_lower, t_upper = interval_bounds(transformed, transformed_var, [0.95])
+        if original_scale:
+            if recipe.log_transform:
+                mean, lower, upper = np.exp(mean), np.exp(lower), np.exp(upper)
+            scale = 'smoothed' if recipe.smoothing_window > 1 else 'original'
+
+        return {
+            'model_id': model.model_id,
+            'run_id': model_run.run_id,
+            'dates': future_dates(dates, steps),
+            'forecast': mean,
+            'intervals': {
+                f'{level * 100:g}': {'lower': lower[i], 'upper': upper[i]}
+                for i, level in enumerate(levels)
+            },
+            'scale': scale,
+            'recipe': recipe.as_dict(),
+            'transformed': {'forecast': transformed, 'ci_lower': t_lower[0], 'ci_upper': t_upper[0]}
+        }
+
+    @staticmethod
+    def save_future(model_id, dates, forecast, ci_lower, ci_upper, confidence_level=0.95):
+        """
+        Sostituisce le previsioni 'future' del modello (righe Forecast e serie colonnare)
+
+        I valori sono sulla scala trasformata, come train e test.
+        """
+        from services import SarimaxService
+        Forecast.query.filter_by(model_id=model_id, category='future').delete(synchronize_session=False)
+        SarimaxService._bulk_insert_forecasts([
+            {
+                'model_id': model_id,
+                'forecast_date': date,
+                'forecasted_value': value,
+                'ci_lower': lower,
+                'ci_upper': upper,
+                'confidence_level': confidence_level,
+                'category': 'future'
+            }
+            for date, value, lower, upper in zip(
+                pd.DatetimeIndex(dates).to_pydatetime(), forecast.tolist(), ci_lower.tolist(), ci_upper.tolist())
+        ])
+
+        series = ForecastSeriesStore.load(model_id)
+        if series is not None:
+            keep = series['category'] != CATEGORY_CODES['future']
+            n_future = len(dates)
+            ForecastSeriesStore.save(
+                model_id,
+                np.concatenate([series['dates'][keep], np.asarray(dates, dtype='datetime64[ns]')]),
+                np.concatenate([series['forecasted'][keep], forecast]),
+                np.concatenate([series['actual'][keep], np.full(n_future, np.nan)]),
+                np.concatenate([series['ci_lower'][keep], ci_lower]),
+                np.concatenate([series['ci_upper'][keep], ci_upper]),
+                np.concatenate([series['category'][keep], np.full(n_future, CATEGORY_CODES['future'], dtype=np.uint8)]),
+                confidence_level=series['confidence_level']
+            )
+        db.session.commit()
@@ -0,0 +1,219 @@
+"""
+Previsioni fitted/test di un modello in forma colonnare (tabella forecast_series).
+
+Al posto di una riga SQL per punto, ogni modello ha un'unica riga con le
+colonne (date, previsto, osservato, intervallo di confidenza, categoria)
+salvate come array numpy impacchettati. Gli endpoint dei grafici leggono così
+l'intera serie con un solo fetch. La tabella forecast resta popolata per le
+query di compatibilità; i modelli creati prima di questa tabella vengono
+convertiti alla prima lettura oppure in blocco con:
+
+    python forecast_store.py
+"""
+import zlib
+import numpy as np
+from database import db
+from models import Forecast, ForecastSeries
+from config import Config
+from serializers import series_columns
+
+# Incrementare se cambia il formato delle colonne binarie
+FORMAT_VERSION = 1
+
+CATEGORY_CODES = {'train': 0, 'test': 1, 'future': 2}
+CATEGORY_NAMES = {code: name for name, code in CATEGORY_CODES.items()}
+
+VALUE_COLUMNS = ('forecasted', 'actual', 'ci_lower', 'ci_upper')
+
+
+class ForecastSeriesStore:
+    """Scrittura/lettura delle serie di previsione colonnari"""
+
+    @staticmethod
+    def _pack(array, compression):
+        data = np.ascontiguousarray(array).tobytes()
+        if compression == 'zlib':
+            # Livello 1: i float64 si comprimono poco, conta soprattutto la velocità
+            return zlib.compress(data, 1)
+        return data
+
+    @staticmethod
+    def _unpack(blob, dtype, compression):
+        if compression == 'zlib':
+            blob = zlib.decompress(blob)
+        return np.frombuffer(blob, dtype=dtype)
+
+    @staticmethod
+    def save(model_id, dates, forecasted, actual, ci_lower, ci_upper, categories, confidence_level=0.95):
+        """
+        Crea (o sostituisce) la serie di un modello; il commit è a carico del chiamante
+
+        Args:
+            model_id: id del Model
+            dates: date come datetime64 o int64 (ns epoch)
+            forecasted, actual, ci_lower, ci_upper: valori (NaN dove assenti)
+            categories: nomi ('train', 'test', 'future') o codici uint8
+
+        Returns:
+            ForecastSeries: record aggiunto alla sessione
+        """
+        dates = np.asarray(dates)
+        if dates.dtype.kind == 'M':
+            dates = dates.astype('datetime64[ns]').view('int64')
+        dates = dates.astype(np.int64, copy=False)
+
+        categories = np.asarray(categories)
+        if categories.dtype.kind in ('U', 'S', 'O'):
+            categories = np.array([CATEGORY_CODES[c] for c in categories.tolist()], dtype=np.uint8)
+        categories = categories.astype(np.uint8, copy=False)
+
+        columns = {
+            name: np.asarray(values, dtype=np.float64)
+            for name, values in zip(VALUE_COLUMNS, (forecasted, actual, ci_lower, ci_upper))
+        }
+        n_points = len(dates)
+        if len(categories) != n_points or any(len(v) != n_points for v in columns.values()):
+            raise ValueError('Le colonne della serie di previsione devono avere la stessa lunghezza')
+
+        # Ordine per data (stabile: a parità di data train precede test)
+        order = np.argsort(dates, kind='stable')
+        compression = Config.FORECAST_SERIES_COMPRESSION if Config.FORECAST_SERIES_COMPRESSION in ('zlib', 'none') else 'none'
+        pack = lambda array: ForecastSeriesStore._pack(array[order], compression)
+
+        series = ForecastSeries.query.filter_by(model_id=model_id).first()
+        if series is None:
+            series = ForecastSeries(model_id=model_id)
+            db.session.add(series)
+        series.format_version = FORMAT_VERSION
+        series.compression = compression
+        series.n_points = int(n_points)
+        series.confidence_level = confidence_level
+        series.dates = pack(dates)
+        series.category = pack(categories)
+        for name, values in columns.items():
+            setattr(series, name, pack(values))
+        return series
+
+    @staticmethod
+    def backfill(model_id):
+        """
+        Costruisce la serie colonnare dalle righe Forecast esistenti
+
+        Returns:
+            ForecastSeries oppure None se il modello non ha previsioni
+        """
+        rows = db.session.query(
+            Forecast.forecast_date, Forecast.forecasted_value, Forecast.actual_value,
+            Forecast.ci_lower, Forecast.ci_upper, Forecast.category, Forecast.confidence_level
+        ).filter(Forecast.model_id == model_id).order_by(Forecast.forecast_date, Forecast.forecast_id).all()
+        if not rows:
+            return None
+
+        dates, forecasted, actual, ci_lower, ci_upper, categories, levels = zip(*rows)
+        to_float = lambda values: np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+        return ForecastSeriesStore.save(
+            model_id,
+            np.array(dates, dtype='datetime64[ns]'),
+            to_float(forecasted), to_float(actual), to_float(ci_lower), to_float(ci_upper),
+            np.array([CATEGORY_CODES.get(c, CATEGORY_CODES['future']) for c in categories], dtype=np.uint8),
+            confidence_level=levels[0] if levels[0] is not None else 0.95
+        )
+
+    @staticmethod
+    def load(model_id, backfill=True):
+        """
+        Legge la serie di un modello con un unico fetch
+
+        Args:
+            backfill: se la serie manca, la costruisce dalle righe Forecast e la salva
+
+        Returns:
+            dict con 'dates' (datetime64[ns]), le colonne di VALUE_COLUMNS (float64),
+            'category' (uint8) e 'confidence_level'; None se non ci sono previsioni
+        """
+        series = ForecastSeries.query.filter_by(model_id=model_id).first()
+        if series is None or series.format_version != FORMAT_VERSION:
+            if not backfill:
+                return None
+            series = ForecastSeriesStore.backfill(model_id)
+            if series is None:
+                return None
+            try:
+                db.session.commit()
+            except Exception:
+                # Un'altra richiesta può aver convertito lo stesso modello
+                db.session.rollback()
+
+        unpack = lambda blob, dtype: ForecastSeriesStore._unpack(blob, dtype, series.compression)
+        data = {
+            'dates': unpack(series.dates, np.int64).view('datetime64[ns]'),
+            'category': unpack(series.category, np.uint8),
+            'confidence_level': series.confidence_level
+        }
+        for name in VALUE_COLUMNS:
+            data[name] = unpack(getattr(series, name), np.float64)
+        return data
+
+    @staticmethod
+    def count(model_id):
+        """Numero di punti di previsione del modello senza leggere le colonne"""
+        n_points = db.session.query(ForecastSeries.n_points).filter_by(model_id=model_id).scalar()
+        if n_points is not None:
+            return n_points
+        return Forecast.query.filter_by(model_id=model_id).count()
+
+    @staticmethod
+    def to_columns(data, category=None, fields=VALUE_COLUMNS, include_category=False):
+        """
+        Converte la serie nel formato colonnare usato dalle risposte JSON
+
+        Args:
+            data: dict restituito da load() (o None)
+            category: 'train', 'test' o 'future' per filtrare; None per tutte
+            fields: colonne di valori da includere
+            include_category: aggiunge la colonna 'category'
+
+        Returns:
+            dict {'dates': datetime64[s], <campo>: float64, ...}: gli array vengono
+            serializzati in blocco da serializers.json_response (NaN -> null);
+            serializers.columns_to_rows ricostruisce il formato a righe
+            [{'date': ..., <campo>: ...}, ...]
+        """
+        if data is None:
+            data = {'dates': np.empty(0, dtype='datetime64[ns]'), 'category': np.empty(0, dtype=np.uint8)}
+            data.update({name: np.empty(0, dtype=np.float64) for name in fields})
+        mask = slice(None) if category is None else data['category'] == CATEGORY_CODES[category]
+
+        columns = series_columns(data['dates'][mask], **{name: data[name][mask] for name in fields})
+        if include_category:
+            names = np.array([CATEGORY_NAMES.get(code) for code in range(max(CATEGORY_NAMES) + 1)], dtype=object)
+            columns['category'] = names[data['category'][mask]]
+        return columns
+
+    @staticmethod
+    def migrate_all():
+        """
+        Converte tutti i modelli che hanno righe Forecast ma non la serie colonnare
+
+        Returns:
+            int: numero di modelli convertiti
+        """
+        existing = db.session.query(ForecastSeries.model_id)
+        model_ids = [
+            row[0] for row in db.session.query(Forecast.model_id)
+            .filter(~Forecast.model_id.in_(existing))
+            .distinct().all()
+        ]
+        for model_id in model_ids:
+            ForecastSeriesStore.backfill(model_id)
+            db.session.commit()
+        return len(model_ids)
+
+
+if __name__ == '__main__':
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        migrated = ForecastSeriesStore.migrate_all()
+        print(f'Serie di previsione convertite: {migrated} modelli')
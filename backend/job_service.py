@@ -0,0 +1,132 @@
+"""
+Job asincroni eseguiti fuori dalla richiesta HTTP (fit SARIMAX e simili).
+
+I job girano su un pool di thread limitato (Config.JOB_WORKERS) dentro un
+app context dedicato; lo stato (queued, running, completed, failed) e i
+tempi sono consultabili tramite GET /api/jobs/<job_id>.
+"""
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from flask import current_app
+from config import Config
+
+
+class JobQueueFullError(Exception):
+    """Troppi job in coda: la richiesta va ritentata più tardi"""
+
+
+class JobService:
+    """Registro in memoria dei job e pool di esecuzione (uno per processo)"""
+
+    _executor = None
+    _jobs = OrderedDict()  # job_id -> dict con stato e tempi
+    _lock = threading.Lock()
+
+    @classmethod
+    def _get_executor(cls):
+        with cls._lock:
+            if cls._executor is None:
+                cls._executor = ThreadPoolExecutor(
+                    max_workers=Config.JOB_WORKERS,
+                    thread_name_prefix='job-worker'
+                )
+            return cls._executor
+
+    @classmethod
+    def submit(cls, kind, fn, *args, user_id=None, model_id=None, **kwargs):
+        """
+        Accoda una funzione da eseguire nel pool
+
+        La funzione viene eseguita dentro un app context e il suo valore di
+        ritorno (JSON-serializzabile) diventa il 'result' del job.
+
+        Args:
+            kind: tipo di job (es. 'fit_sarimax')
+            fn: funzione da eseguire
+            user_id: proprietario del job (per il controllo accessi)
+            model_id: Model associato, se presente
+
+        Returns:
+            dict: snapshot del job appena creato
+
+        Raises:
+            JobQueueFullError: se i job in attesa superano Config.JOB_MAX_QUEUED
+        """
+        app = current_app._get_current_object()
+        job_id = uuid.uuid4().hex
+        job = {
+            'job_id': job_id,
+            'kind': kind,
+            'status': 'queued',
+            'user_id': user_id,
+            'model_id': model_id,
+            'created_at': datetime.utcnow().isoformat(),
+            'started_at': None,
+            'finished_at': None,
+            'queue_seconds': None,
+            'run_seconds': None,
+            'result': None,
+            'error': None,
+            '_queued_monotonic': time.monotonic()
+        }
+
+        with cls._lock:
+            queued = sum(1 for j in cls._jobs.values() if j['status'] == 'queued')
+            if queued >= Config.JOB_MAX_QUEUED:
+                raise JobQueueFullError(f'Troppi job in coda ({queued}), riprova più tardi')
+            cls._jobs[job_id] = job
+            cls._prune_locked()
+
+        cls._get_executor().submit(cls._run, app, job_id, fn, args, kwargs)
+        return cls.get(job_id)
+
+    @classmethod
+    def _run(cls, app, job_id, fn, args, kwargs):
+        """Esegue il job nel worker aggiornandone stato e tempi"""
+        started = time.monotonic()
+        with cls._lock:
+            job = cls._jobs.get(job_id)
+            if job is None:
+                return
+            job['status'] = 'running'
+            job['started_at'] = datetime.utcnow().isoformat()
+            job['queue_seconds'] = started - job['_queued_monotonic']
+
+        with app.app_context():
+            try:
+                result = fn(*args, **kwargs)
+                status, error = 'completed', None
+            except Exception as e:
+                app.logger.error(f'Job {job_id} fallito: {traceback.format_exc()}')
+                result, status, error = None, 'failed', str(e)
+
+        with cls._lock:
+            job['status'] = status
+            job['result'] = result
+            job['error'] = error
+            job['finished_at'] = datetime.utcnow().isoformat()
+            job['run_seconds'] = time.monotonic() - started
+            if isinstance(result, dict) and result.get('model_id') is not None:
+                job['model_id'] = result['model_id']
+
+    @classmethod
+    def _prune_locked(cls):
+        """Mantiene al massimo Config.JOB_HISTORY job terminati nel registro"""
+        finished = [jid for jid, j in cls._jobs.items() if j['status'] in ('completed', 'failed')]
+        for jid in finished[:max(0, len(finished) - Config.JOB_HISTORY)]:
+            del cls._jobs[jid]
+
+    @classmethod
+    def get(cls, job_id):
+        """Snapshot pubblico del job (None se sconosciuto)"""
+        with cls._lock:
+            job = cls._jobs.get(job_id)
+            if job is None:
+                return None
+            return {k: v for k, v in job.items() if not k.startswith('_')}
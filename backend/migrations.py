@@ -0,0 +1,173 @@
+"""
+Migrazioni versionate dello schema SQLite.
+
+db.create_all() crea solo le tabelle mancanti: colonne e indici aggiunti ai
+modelli dopo la creazione del database vanno applicati qui. La versione dello
+schema è salvata in PRAGMA user_version; all'avvio (init_db) vengono eseguite,
+in ordine e ciascuna nella propria transazione, le migrazioni con versione
+maggiore di quella registrata.
+
+Per aggiungere una migrazione: scrivere una funzione che riceve la connessione
+e aggiungerla in fondo a MIGRATIONS con la versione successiva. Le funzioni
+devono essere idempotenti (i database nuovi hanno già lo schema completo da
+create_all e vengono solo marcati all'ultima versione).
+"""
+from sqlalchemy import event, inspect, text
+
+
+def _column_exists(conn, table, column):
+    return any(col['name'] == column for col in inspect(conn).get_columns(table))
+
+
+def _add_column(conn, table, column, ddl_type):
+    if not _column_exists(conn, table, column):
+        conn.execute(text(f'ALTER TABLE "{table}" ADD COLUMN "{column}" {ddl_type}'))
+
+
+def _create_index(conn, name, table, columns, unique=False):
+    cols = ', '.join(f'"{c}"' for c in columns)
+    kind = 'UNIQUE INDEX' if unique else 'INDEX'
+    conn.execute(text(f'CREATE {kind} IF NOT EXISTS "{name}" ON "{table}" ({cols})'))
+
+
+def _v1_model_run_total_obs(conn):
+    """Osservazioni trasformate salvate sul ModelRun"""
+    _add_column(conn, 'model_run', 'total_obs', 'INTEGER')
+
+
+def _v2_listing_indexes(conn):
+    """Indici delle liste file/run paginate"""
+    _create_index(conn, 'ix_file_user_uploaded', 'file', ['user_id', 'uploaded_at', 'file_id'])
+    _create_index(conn, 'ix_model_file_id', 'model', ['file_id'])
+    _create_index(conn, 'ix_model_run_user_created', 'model_run', ['user_id', 'created_at', 'run_id'])
+    _create_index(conn, 'ix_model_run_file_created', 'model_run', ['file_id', 'user_id', 'created_at', 'run_id'])
+    _create_index(conn, 'ix_model_run_model_id', 'model_run', ['model_id'])
+
+
+def _v3_foreign_key_indexes(conn):
+    """Indici sulle chiavi esterne usate da grafici, metriche e cascate di delete"""
+    _create_index(conn, 'ix_forecast_model_category_date', 'forecast', ['model_id', 'category', 'forecast_date'])
+    _create_index(conn, 'ix_metrics_model_type', 'metrics', ['model_id', 'metric_type'])
+    _create_index(conn, 'ix_statistics_file_id', 'statistics', ['file_id'])
+    _create_index(conn, 'ix_residuals_model_id', 'residuals', ['model_id'])
+
+
+def _v4_file_content_hash(conn):
+    """Deduplicazione degli upload: hash del contenuto sul File (la tabella blob la crea create_all)"""
+    _add_column(conn, 'file', 'content_hash', 'VARCHAR(64) REFERENCES blob (content_hash)')
+    _create_index(conn, 'ix_file_content_hash', 'file', ['content_hash'])
+
+
+def _v5_model_fit_fingerprint(conn):
+    """Memoizzazione dei fit: impronta del fit e modello di origine delle copie"""
+    _add_column(conn, 'model', 'fit_fingerprint', 'VARCHAR(64)')
+    _add_column(conn, 'model', 'cloned_from_model_id', 'INTEGER')
+    _create_index(conn, 'ix_model_fit_fingerprint', 'model', ['fit_fingerprint'])
+
+
+def _v6_model_warm_start(conn):
+    """Warm start dei fit: iterazioni dell'ottimizzatore e modello di partenza"""
+    _add_column(conn, 'model', 'optimizer_iterations', 'INTEGER')
+    _add_column(conn, 'model', 'warm_start_model_id', 'INTEGER')
+    _add_column(conn, 'model', 'iterations_saved_estimate', 'INTEGER')
+
+
+def _v7_model_fit_mode(conn):
+    """Fit in due fasi: modalità del fit e durata di fit e diagnostica"""
+    _add_column(conn, 'model', 'fit_mode', "VARCHAR(10) DEFAULT 'full'")
+    _add_column(conn, 'model', 'fit_seconds', 'FLOAT')
+    _add_column(conn, 'model', 'diagnostics_seconds', 'FLOAT')
+
+
+def _v8_residual_diagnostics(conn):
+    """Diagnostica dei residui: momenti, Ljung-Box per più lag e ACF dei residui"""
+    _add_column(conn, 'residuals', 'n_obs', 'INTEGER')
+    _add_column(conn, 'residuals', 'skewness', 'FLOAT')
+    _add_column(conn, 'residuals', 'kurtosis', 'FLOAT')
+    _add_column(conn, 'residuals', 'ljung_box_lags', 'TEXT')
+    _add_column(conn, 'residuals', 'residual_acf', 'TEXT')
+    _add_column(conn, 'residuals', 'computed_at', 'DATETIME')
+
+
+# (versione, descrizione, funzione) in ordine crescente di versione
+MIGRATIONS = [
+    (1, 'model_run.total_obs', _v1_model_run_total_obs),
+    (2, 'indici liste file/run', _v2_listing_indexes),
+    (3, 'indici chiavi esterne', _v3_foreign_key_indexes),
+    (4, 'file.content_hash', _v4_file_content_hash),
+    (5, 'model.fit_fingerprint', _v5_model_fit_fingerprint),
+    (6, 'model.optimizer_iterations', _v6_model_warm_start),
+    (7, 'model.fit_mode', _v7_model_fit_mode),
+    (8, 'residuals.ljung_box_lags', _v8_residual_diagnostics),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn):
+    return conn.execute(text('PRAGMA user_version')).scalar() or 0
+
+
+def _set_schema_version(conn, version):
+    # PRAGMA non accetta parametri: la versione è sempre un intero nostro
+    conn.execute(text(f'PRAGMA user_version = {int(version)}'))
+
+
+def run_migrations(engine, fresh=False, logger=None):
+    """
+    Porta lo schema all'ultima versione
+
+    Args:
+        engine: engine SQLAlchemy (solo SQLite; per altri database non fa nulla)
+        fresh: True se il database è stato appena creato da create_all
+        logger: logger opzionale per le migrazioni applicate
+
+    Returns:
+        list: versioni applicate
+    """
+    if engine.dialect.name != 'sqlite':
+        return []
+
+    with engine.begin() as conn:
+        current = get_schema_version(conn)
+        if fresh and current == 0:
+            _set_schema_version(conn, LATEST_VERSION)
+            return []
+
+    applied = []
+    for version, description, migrate in MIGRATIONS:
+        if version <= current:
+            continue
+        with engine.begin() as conn:
+            migrate(conn)
+            _set_schema_version(conn, version)
+        applied.append(version)
+        if logger:
+            logger.info(f'Migrazione schema {version} applicata: {description}')
+    return applied
+
+
+def register_sqlite_pragmas(engine, journal_mode='WAL', busy_timeout_ms=5000):
+    """
+    Imposta i PRAGMA a ogni nuova connessione SQLite
+
+    WAL permette letture concorrenti durante una scrittura (le richieste
+    HTTP leggono mentre i job salvano i fit); con WAL synchronous=NORMAL è
+    sicuro e riduce i fsync. busy_timeout evita errori 'database is locked'
+    immediati quando due scritture si sovrappongono.
+    """
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            if journal_mode:
+                cursor.execute(f'PRAGMA journal_mode = {journal_mode}')
+            cursor.execute('PRAGMA synchronous = NORMAL')
+            cursor.execute(f'PRAGMA busy_timeout = {int(busy_timeout_ms)}')
+            cursor.execute('PRAGMA temp_store = MEMORY')
+            cursor.execute('PRAGMA cache_size = -20000')  # ~20 MB per connessione
+        finally:
+            cursor.close()
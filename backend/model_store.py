@@ -0,0 +1,280 @@
+"""
+Archivio dei modelli stimati (risultati SARIMAX) per model_id.
+
+Dopo il fit i risultati venivano ridotti a parametri JSON e summary testuale:
+ogni uso successivo del modello (nuovi orizzonti, diagnostica, grafici)
+avrebbe richiesto una nuova stima. L'archivio salva per ogni modello:
+
+- compact (default): parametri, specifica SARIMAX e stato finale del filtro
+  di Kalman (stato previsto e covarianza dopo l'ultima osservazione del
+  train), in un .npz di pochi KB. Un modello SARIMAX inizializzato con quello
+  stato prosegue esattamente il filtro originale: previsioni, varianze ed
+  estensione con nuovi dati (es. il test set) coincidono con quelle dei
+  risultati completi;
+- full: in aggiunta i risultati completi (pickle di statsmodels, con l'output
+  del filtro), caricati solo se servono e solo con la stessa versione di
+  statsmodels.
+
+Il formato è versionato (ARTIFACT_VERSION): artefatti di versioni diverse, o
+che non corrispondono ai parametri salvati nel Model, vengono ignorati. I
+modelli letti restano in una cache LRU in memoria limitata in byte. Gli
+artefatti vengono rimossi dopo il commit che elimina il loro Model.
+"""
+import os
+import json
+import shutil
+import hashlib
+import pickle
+import threading
+import warnings
+import numpy as np
+import statsmodels
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from cache import LRUCache
+from config import Config
+from models import Model
+
+# Incrementare se cambia il formato degli artefatti (invalida quelli esistenti)
+ARTIFACT_VERSION = 1
+
+MODES = ('compact', 'full')
+
+model_cache = LRUCache('models', Config.MODEL_CACHE_MAX_BYTES, sizeof=lambda fitted: fitted.nbytes)
+
+
+def endog_hash(values):
+    """Hash delle osservazioni su cui il modello è stato filtrato"""
+    return hashlib.sha1(memoryview(np.ascontiguousarray(values, dtype=np.float64))).hexdigest()
+
+
+class FittedModel:
+    """Modello stimato ricostruito dall'archivio: parametri più stato finale del filtro"""
+
+    def __init__(self, params, param_names, spec, nobs, state, state_cov, trend_offset=1,
+                 train_hash=None, results_path=None):
+        self.params = np.asarray(params, dtype=np.float64)
+        self.param_names = list(param_names)
+        self.spec = spec
+        self.nobs = int(nobs)
+        self.state = np.asarray(state, dtype=np.float64)
+        self.state_cov = np.asarray(state_cov, dtype=np.float64)
+        self.trend_offset = int(trend_offset)
+        self.train_hash = train_hash
+        self.results_path = results_path
+        self._results = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_results(cls, results, spec):
+        """Estrae parametri e stato finale da SARIMAXResults"""
+        filter_results = results.filter_results
+        return cls(
+            results.params, results.model.param_names, spec, results.nobs,
+            filter_results.predicted_state[:, -1].copy(),
+            filter_results.predicted_state_cov[:, :, -1].copy(),
+            trend_offset=results.model.trend_offset,
+            train_hash=endog_hash(results.model.endog[:, 0])
+        )
+
+    @property
+    def nbytes(self):
+        size = self.params.nbytes + self.state.nbytes + self.state_cov.nbytes + 1024
+        if self._results is not None and self.results_path:
+            try:
+                size += os.path.getsize(self.results_path)
+            except OSError:
+                # Artefatto rimosso mentre il modello è ancora in cache
+                pass
+        return size
+
+    @property
+    def results(self):
+        """SARIMAXResults completi (solo modalità 'full'; None se non disponibili)"""
+        if self._results is None and self.results_path:
+            with self._lock:
+                if self._results is None:
+                    try:
+                        with open(self.results_path, 'rb') as fh:
+                            self._results = pickle.load(fh)
+                    except (OSError, pickle.UnpicklingError, AttributeError, ImportError, EOFError):
+                        self.results_path = None
+        return self._results
+
+    def extend(self, endog):
+        """
+        Prosegue il filtro sulle osservazioni successive al train (nessuna stima)
+
+        Args:
+            endog: nuove osservazioni; vuoto per ripartire dalla fine del train
+
+        Returns:
+            SARIMAXResults filtrati sulle sole nuove osservazioni
+        """
+        from statsmodels.tsa.statespace.sarimax import SARIMAX
+        endog = np.asarray(endog, dtype=np.float64)
+        if len(endog) == 0:
+            # Un'osservazione mancante: lo stato iniziale resta quello previsto
+            endog = np.full(1, np.nan)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            model = SARIMAX(endog, trend_offset=self.nobs + self.trend_offset, **self.spec)
+            model.ssm.initialize_known(self.state, self.state_cov)
+            return model.filter(self.params)
+
+    def get_forecast(self, steps, endog=None):
+        """
+        Previsione di 'steps' punti dopo la fine del train (o dopo endog, se passato)
+
+        Returns:
+            PredictionResults di statsmodels (predicted_mean, var_pred_mean, conf_int())
+        """
+        if endog is not None and len(endog):
+            return self.extend(endog).get_forecast(steps=steps)
+        # Con un solo punto mancante la previsione "in-sample" da 0 è già fuori campione
+        return self.extend([]).get_prediction(start=0, end=steps - 1)
+
+
+class ModelArtifactStore:
+    """Lettura/scrittura degli artefatti dei modelli stimati"""
+
+    @staticmethod
+    def _paths(model_id):
+        base = os.path.join(Config.MODEL_ARTIFACTS_FOLDER, f'model_{model_id}')
+        return f'{base}.npz', f'{base}.pkl'
+
+    @staticmethod
+    def save(model_id, results, spec, mode=None):
+        """
+        Salva il modello stimato (sostituisce un eventuale artefatto precedente)
+
+        Args:
+            results: SARIMAXResults del fit
+            spec: kwargs di SARIMAX usati per il fit (order, seasonal_order, trend, enforce_*)
+            mode: 'compact' o 'full' (default Config.MODEL_ARTIFACT_MODE)
+
+        Returns:
+            FittedModel (anche messo in cache)
+        """
+        mode = mode or Config.MODEL_ARTIFACT_MODE
+        if mode not in MODES:
+            mode = 'compact'
+        fitted = FittedModel.from_results(results, spec)
+        npz_path, pkl_path = ModelArtifactStore._paths(model_id)
+        os.makedirs(Config.MODEL_ARTIFACTS_FOLDER, exist_ok=True)
+
+        if mode == 'full':
+            with open(f'{pkl_path}.tmp', 'wb') as fh:
+                pickle.dump(results, fh, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(f'{pkl_path}.tmp', pkl_path)
+            fitted.results_path = pkl_path
+        elif os.path.exists(pkl_path):
+            os.remove(pkl_path)
+
+        meta = {
+            'version': ARTIFACT_VERSION,
+            'mode': mode,
+            'statsmodels': statsmodels.__version__,
+            'param_names': fitted.param_names,
+            'spec': spec,
+            'nobs': fitted.nobs,
+            'trend_offset': fitted.trend_offset,
+            'train_hash': fitted.train_hash
+        }
+        # Il .npz è scritto per ultimo: senza .npz l'artefatto non esiste
+        with open(f'{npz_path}.tmp', 'wb') as fh:
+            np.savez(fh, meta=np.array(json.dumps(meta, default=int)), params=fitted.params,
+                     state=fitted.state, state_cov=fitted.state_cov)
+        os.replace(f'{npz_path}.tmp', npz_path)
+        return model_cache.put(model_id, fitted)
+
+    @staticmethod
+    def remove(model_id):
+        """Rimuove gli artefatti di un modello (anche i temporanei) e la sua voce in cache"""
+        model_cache.pop(model_id)
+        for path in ModelArtifactStore._paths(model_id):
+            for candidate in (path, f'{path}.tmp'):
+                if os.path.exists(candidate):
+                    os.remove(candidate)
+
+    @staticmethod
+    def load(model):
+        """
+        Modello stimato di un Model (dalla cache o dal disco)
+
+        L'artefatto viene usato solo se i suoi parametri coincidono con quelli
+        salvati nel Model (un artefatto di un database precedente con lo
+        stesso model_id viene ignorato).
+
+        Returns:
+            FittedModel o None se assente, di un'altra versione o non corrispondente
+        """
+        if not model.estimated_params:
+            return None
+        fitted = model_cache.get(model.model_id)
+        if fitted is None:
+            fitted = ModelArtifactStore._read(model.model_id)
+            if fitted is None:
+                return None
+            model_cache.put(model.model_id, fitted)
+
+        saved = json.loads(model.estimated_params)
+        if list(saved) != fitted.param_names or not np.allclose(
+                [saved[name] for name in fitted.param_names], fitted.params, rtol=1e-12, atol=0):
+            model_cache.pop(model.model_id)
+            return None
+        return fitted
+
+    @staticmethod
+    def _read(model_id):
+        npz_path, pkl_path = ModelArtifactStore._paths(model_id)
+        try:
+            with np.load(npz_path, allow_pickle=False) as data:
+                meta = json.loads(str(data['meta']))
+                if meta.get('version') != ARTIFACT_VERSION:
+                    return None
+                # I pickle di statsmodels valgono solo per la versione che li ha scritti
+                full = meta['mode'] == 'full' and meta['statsmodels'] == statsmodels.__version__
+                return FittedModel(
+                    data['params'], meta['param_names'], ModelArtifactStore._spec(meta['spec']),
+                    meta['nobs'], data['state'], data['state_cov'],
+                    trend_offset=meta['trend_offset'], train_hash=meta['train_hash'],
+                    results_path=pkl_path if full and os.path.exists(pkl_path) else None
+                )
+        except (OSError, ValueError, KeyError):
+            return None
+
+    @staticmethod
+    def _spec(spec):
+        """Ripristina le tuple degli ordini dopo il passaggio per JSON"""
+        spec = dict(spec)
+        spec['order'] = tuple(spec['order'])
+        spec['seasonal_order'] = tuple(spec['seasonal_order'])
+        return spec
+
+    @staticmethod
+    def copy(source_id, target_id):
+        """Copia l'artefatto di un modello su un altro model_id (fit identico già stimato)"""
+        for source, target in zip(ModelArtifactStore._paths(source_id), ModelArtifactStore._paths(target_id)):
+            if os.path.exists(source):
+                shutil.copyfile(source, f'{target}.tmp')
+                os.replace(f'{target}.tmp', target)
+
+
+@event.listens_for(Model, 'after_delete')
+def _forget_model_on_delete(mapper, connection, target):
+    """Annota il Model eliminato: gli artefatti si rimuovono solo dopo il commit"""
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('deleted_models', set()).add(target.model_id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _remove_deleted_model_artifacts(session):
+    for model_id in session.info.pop('deleted_models', ()):
+        ModelArtifactStore.remove(model_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _keep_model_artifacts(session):
+    session.info.pop('deleted_models', None)
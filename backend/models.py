@@ -24,9 +24,23 @@ class User(UserMixin, db.Model):
     def check_password(self, password):
         return check_password_hash(self.password, password)
 
+class Blob(db.Model):
+    """Contenuto di un file caricato, condiviso da tutti i File con lo stesso hash"""
+    __tablename__ = 'blob'
+    content_hash = db.Column(db.String(64), primary_key=True)  # SHA-256 esadecimale
+    path = db.Column(db.String(500), nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)  # File che usano il blob
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 class File(db.Model):
     """File caricato - formato fisso: colonne 'data' e 'y'"""
     __tablename__ = 'file'
+    __table_args__ = (
+        # Lista file dell'utente (paginazione keyset per data di caricamento)
+        db.Index('ix_file_user_uploaded', 'user_id', 'uploaded_at', 'file_id'),
+        db.Index('ix_file_content_hash', 'content_hash'),
+    )
     file_id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.user_id'), nullable=False)
     file_name = db.Column(db.String(255), nullable=False)
@@ -34,6 +48,9 @@ class File(db.Model):
     n_observations = db.Column(db.Integer)
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # SHA-256 del contenuto (Blob condiviso); None per i file caricati prima della deduplicazione
+    content_hash = db.Column(db.String(64), db.ForeignKey('blob.content_hash'), nullable=True)
+    
     # Trasformazioni (opzionali, prima dello split) - ordine: smoothing -> log -> diff
     smoothing_window = db.Column(db.Integer, default=1, nullable=False)  # 1 = nessuno smoothing
     smoothed_file_path = db.Column(db.String(500), nullable=True)  # Path file smussato se applicato
@@ -60,6 +77,9 @@ class File(db.Model):
 class Statistics(db.Model):
     """Statistiche descrittive"""
     __tablename__ = 'statistics'
+    __table_args__ = (
+        db.Index('ix_statistics_file_id', 'file_id'),
+    )
     stat_id = db.Column(db.Integer, primary_key=True)
     file_id = db.Column(db.Integer, db.ForeignKey('file.file_id'), nullable=False)
     
@@ -81,7 +101,7 @@ class Model(db.Model):
     """Modello ARIMA ottimale (auto-generato, non configurabile)"""
     __tablename__ = 'model'
     model_id = db.Column(db.Integer, primary_key=True)
-    file_id = db.Column(db.Integer, db.ForeignKey('file.file_id'), nullable=False)
+    file_id = db.Column(db.Integer, db.ForeignKey('file.file_id'), nullable=False, index=True)
     
     # Parametri modello (auto-determinati)
     p = db.Column(db.Integer)
@@ -119,14 +139,36 @@ class Model(db.Model):
     status = db.Column(db.String(50), default='pending')  # pending, running, completed, failed
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Impronta di dati e specifica del fit (SarimaxService.fit_fingerprint): un fit
+    # identico già completato viene copiato invece di essere ristimato
+    fit_fingerprint = db.Column(db.String(64), index=True)
+    cloned_from_model_id = db.Column(db.Integer, nullable=True)  # Modello da cui sono stati copiati i risultati
+    
+    # Ottimizzatore: iterazioni del fit e modello usato per il warm start.
+    # iterations_saved_estimate è solo una stima: iterazioni a freddo del modello di
+    # partenza (un'altra specifica) meno quelle del fit a caldo, non una misura sul nuovo modello
+    optimizer_iterations = db.Column(db.Integer)
+    warm_start_model_id = db.Column(db.Integer, nullable=True)
+    iterations_saved_estimate = db.Column(db.Integer, nullable=True)
+    
+    # Fit in due fasi: 'fast' (solo stime puntuali) o 'full' (con errori standard e
+    # summary, subito o dopo POST /model/<id>/diagnostics); durata di ciascuna fase
+    fit_mode = db.Column(db.String(10), default='full')
+    fit_seconds = db.Column(db.Float)
+    diagnostics_seconds = db.Column(db.Float)
+    
     # Relazioni
     residuals = db.relationship('Residuals', backref='model', uselist=False, lazy=True, cascade='all, delete-orphan')
     forecasts = db.relationship('Forecast', backref='model', lazy=True, cascade='all, delete-orphan')
+    forecast_series = db.relationship('ForecastSeries', backref='model', uselist=False, lazy=True, cascade='all, delete-orphan')
     metrics = db.relationship('Metrics', backref='model', lazy=True, cascade='all, delete-orphan')
 
 class Residuals(db.Model):
     """Residui del modello"""
     __tablename__ = 'residuals'
+    __table_args__ = (
+        db.Index('ix_residuals_model_id', 'model_id'),
+    )
     residual_id = db.Column(db.Integer, primary_key=True)
     model_id = db.Column(db.Integer, db.ForeignKey('model.model_id'), nullable=False)
     
@@ -142,11 +184,24 @@ class Residuals(db.Model):
     jarque_bera_pvalue = db.Column(db.Float)
     normality_passed = db.Column(db.Boolean)
     
+    # Diagnostica completa (ResidualService.compute): ljung_box_* sono al lag 10
+    # (o al più alto disponibile), gli altri lag e l'ACF dei residui sono in JSON
+    n_obs = db.Column(db.Integer)
+    skewness = db.Column(db.Float)
+    kurtosis = db.Column(db.Float)
+    ljung_box_lags = db.Column(db.Text)  # JSON: [{'lag', 'stat', 'pvalue', 'passed'}, ...]
+    residual_acf = db.Column(db.Text)  # JSON: {'lags', 'values', 'confint'}
+    computed_at = db.Column(db.DateTime)
+    
     model_summary = db.Column(db.Text)
 
 class Forecast(db.Model):
     """Previsioni"""
     __tablename__ = 'forecast'
+    __table_args__ = (
+        # Previsioni di un modello per categoria, in ordine di data
+        db.Index('ix_forecast_model_category_date', 'model_id', 'category', 'forecast_date'),
+    )
     forecast_id = db.Column(db.Integer, primary_key=True)
     model_id = db.Column(db.Integer, db.ForeignKey('model.model_id'), nullable=False)
     
@@ -161,9 +216,38 @@ class Forecast(db.Model):
     category = db.Column(db.String(50))  # 'train', 'test', 'future'
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+class ForecastSeries(db.Model):
+    """
+    Previsioni di un modello in forma colonnare (una riga per modello)
+    
+    Ogni colonna è un array numpy impacchettato (eventualmente compresso con zlib),
+    ordinato per data: date int64 (ns epoch), valori float64 (NaN = assente),
+    categoria uint8 (vedi forecast_store.CATEGORY_CODES).
+    """
+    __tablename__ = 'forecast_series'
+    series_id = db.Column(db.Integer, primary_key=True)
+    model_id = db.Column(db.Integer, db.ForeignKey('model.model_id'), nullable=False, unique=True)
+    
+    format_version = db.Column(db.Integer, nullable=False, default=1)
+    compression = db.Column(db.String(20), nullable=False, default='none')  # 'zlib' o 'none'
+    n_points = db.Column(db.Integer, nullable=False, default=0)
+    confidence_level = db.Column(db.Float, default=0.95)
+    
+    dates = db.Column(db.LargeBinary, nullable=False)
+    forecasted = db.Column(db.LargeBinary, nullable=False)
+    actual = db.Column(db.LargeBinary, nullable=False)
+    ci_lower = db.Column(db.LargeBinary, nullable=False)
+    ci_upper = db.Column(db.LargeBinary, nullable=False)
+    category = db.Column(db.LargeBinary, nullable=False)
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 class Metrics(db.Model):
     """Metriche di performance"""
     __tablename__ = 'metrics'
+    __table_args__ = (
+        db.Index('ix_metrics_model_type', 'model_id', 'metric_type'),
+    )
     metric_id = db.Column(db.Integer, primary_key=True)
     model_id = db.Column(db.Integer, db.ForeignKey('model.model_id'), nullable=False)
     
@@ -179,8 +263,13 @@ class Metrics(db.Model):
 class ModelRun(db.Model):
     """Salva ogni modello provato con tutte le informazioni per export PDF"""
     __tablename__ = 'model_run'
+    __table_args__ = (
+        # Liste dei run per utente e per file (paginazione keyset per data)
+        db.Index('ix_model_run_user_created', 'user_id', 'created_at', 'run_id'),
+        db.Index('ix_model_run_file_created', 'file_id', 'user_id', 'created_at', 'run_id'),
+    )
     run_id = db.Column(db.Integer, primary_key=True)
-    model_id = db.Column(db.Integer, db.ForeignKey('model.model_id'), nullable=False)
+    model_id = db.Column(db.Integer, db.ForeignKey('model.model_id'), nullable=False, index=True)
     file_id = db.Column(db.Integer, db.ForeignKey('file.file_id'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.user_id'), nullable=False)
     
@@ -193,6 +282,9 @@ class ModelRun(db.Model):
     # Path al Paper HTML generato
     paper_path = db.Column(db.String(500), nullable=True)
     
+    # Osservazioni della serie trasformata (train + test) al momento del fit
+    total_obs = db.Column(db.Integer, nullable=True)
+    
     # Timestamp
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
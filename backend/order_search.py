@@ -0,0 +1,328 @@
+"""
+Selezione automatica dell'ordine SARIMAX (griglia o stepwise).
+
+I candidati (p,d,q)(P,D,Q,m) vengono stimati in parallelo su un pool di
+processi: ogni processo riceve solo gli array train/test e restituisce AIC,
+BIC e le metriche sul test set. La classifica usa test_score
+(R² test - MAPE test / 100, come Model.test_score) oppure l'AIC.
+"""
+import itertools
+import math
+import multiprocessing
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+
+RANK_KEYS = ('test_score', 'aic')
+
+
+class CandidateTimeout(Exception):
+    """Il fit del candidato ha superato il tempo massimo"""
+
+
+def evaluate_candidate(train_values, test_values, order, seasonal_order, trend='n',
+                       enforce_stationarity=True, enforce_invertibility=True, deadline=None,
+                       timeout=None):
+    """
+    Stima un candidato e calcola le metriche di selezione (eseguita nei processi figli)
+
+    Il fit usa cov_type='none': per la selezione servono solo le stime
+    puntuali, la covarianza viene calcolata solo per il modello vincente.
+
+    Args:
+        train_values, test_values: array float64 della serie (dopo le trasformazioni)
+        order: (p, d, q)
+        seasonal_order: (P, D, Q, m)
+        deadline: istante (time.time()) oltre il quale il fit viene interrotto
+            (scadenza globale della ricerca)
+        timeout: secondi massimi del fit, contati dall'inizio dell'esecuzione nel
+            processo (non dall'accodamento: un candidato in coda non scade)
+
+    Returns:
+        dict con order, seasonal_order, status ('ok', 'failed', 'timeout') e metriche
+    """
+    from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+    result = {
+        'order': list(order),
+        'seasonal_order': list(seasonal_order),
+        'status': 'ok',
+        'aic': None,
+        'bic': None,
+        'test_r2': None,
+        'test_mape': None,
+        'test_score': None,
+        'fit_seconds': None,
+        'error': None
+    }
+    started = time.time()
+    if timeout is not None:
+        deadline = started + timeout if deadline is None else min(deadline, started + timeout)
+
+    def check_deadline(_params):
+        if deadline is not None and time.time() > deadline:
+            raise CandidateTimeout()
+
+    try:
+        if deadline is not None and started > deadline:
+            raise CandidateTimeout()
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            model = SARIMAX(
+                train_values,
+                order=tuple(order),
+                seasonal_order=tuple(seasonal_order),
+                trend=trend,
+                enforce_stationarity=enforce_stationarity,
+                enforce_invertibility=enforce_invertibility
+            )
+            fitted = model.fit(disp=False, cov_type='none', callback=check_deadline)
+            forecast = np.asarray(fitted.forecast(steps=len(test_values)), dtype=np.float64)
+
+        actual = np.asarray(test_values, dtype=np.float64)
+        errors = actual - forecast
+        ss_res = float(np.sum(errors ** 2))
+        ss_tot = float(np.sum((actual - actual.mean()) ** 2))
+        # I punti con valore reale nullo non entrano nel MAPE (come backtest.horizon_metrics):
+        # su serie differenziate un solo zero renderebbe infinito il MAPE di ogni candidato
+        nonzero = actual != 0
+        mape = float(np.mean(np.abs(errors[nonzero] / actual[nonzero])) * 100) if nonzero.any() else None
+        test_r2 = 1.0 - ss_res / ss_tot if ss_tot > 0 else None
+
+        result['aic'] = _finite_or_none(fitted.aic)
+        result['bic'] = _finite_or_none(fitted.bic)
+        result['test_r2'] = _finite_or_none(test_r2)
+        result['test_mape'] = _finite_or_none(mape)
+        if result['test_r2'] is not None and result['test_mape'] is not None:
+            result['test_score'] = result['test_r2'] - result['test_mape'] / 100.0
+        if result['aic'] is None:
+            result['status'] = 'failed'
+            result['error'] = 'AIC non finito'
+    except CandidateTimeout:
+        result['status'] = 'timeout'
+    except Exception as e:
+        result['status'] = 'failed'
+        result['error'] = str(e)
+
+    result['fit_seconds'] = time.time() - started
+    return result
+
+
+def _finite_or_none(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) else None
+
+
+def estimate_differencing(values, max_d=2, alpha=0.05):
+    """
+    Numero di differenziazioni necessarie per la stazionarietà
+
+    Usa pmdarima.ndiffs (test KPSS) se disponibile, altrimenti il test ADF di utils.
+    """
+    try:
+        from pmdarima.arima import ndiffs
+        return int(ndiffs(values, alpha=alpha, max_d=max_d))
+    except Exception:
+        # pmdarima assente o non compatibile con la versione di numpy installata
+        pass
+
+    from utils import adf_stationarity_test
+    d = 0
+    current = np.asarray(values, dtype=np.float64)
+    while d < max_d and len(current) > 20:
+        if adf_stationarity_test(current)['pvalue'] <= alpha:
+            break
+        current = np.diff(current)
+        d += 1
+    return d
+
+
+class OrderSearch:
+    """Ricerca parallela del miglior ordine SARIMAX"""
+
+    def __init__(self, train_values, test_values, trend='n', enforce_stationarity=True,
+                 enforce_invertibility=True, rank_by='test_score', n_jobs=2,
+                 candidate_timeout=30.0, time_budget=300.0, mp_context='spawn'):
+        if rank_by not in RANK_KEYS:
+            raise ValueError(f"rank_by deve essere uno tra {RANK_KEYS}")
+        self.train_values = np.ascontiguousarray(train_values, dtype=np.float64)
+        self.test_values = np.ascontiguousarray(test_values, dtype=np.float64)
+        self.fit_kwargs = {
+            'trend': trend,
+            'enforce_stationarity': enforce_stationarity,
+            'enforce_invertibility': enforce_invertibility
+        }
+        self.rank_by = rank_by
+        self.n_jobs = max(1, int(n_jobs))
+        self.candidate_timeout = float(candidate_timeout)
+        self.time_budget = float(time_budget)
+        self.mp_context = mp_context
+        self.results = {}  # (order, seasonal_order) -> dict risultato
+        self.pruned = 0
+        self.budget_exhausted = False
+
+    # ----- spazio dei candidati -----
+    @staticmethod
+    def grid_candidates(max_p=3, max_d=1, max_q=3, m=0, max_P=1, max_D=1, max_Q=1, max_order=6):
+        """
+        Candidati della griglia con pruning strutturale
+
+        Returns:
+            (candidates, pruned): lista di ((p,d,q), (P,D,Q,m)) e numero di scartati
+        """
+        seasonal = m is not None and m > 1
+        candidates = []
+        pruned = 0
+        seasonal_space = itertools.product(range(max_P + 1), range(max_D + 1), range(max_Q + 1)) if seasonal else [(0, 0, 0)]
+        seasonal_space = list(seasonal_space)
+        for p, d, q in itertools.product(range(max_p + 1), range(max_d + 1), range(max_q + 1)):
+            for P, D, Q in seasonal_space:
+                # Pruning: complessità totale e differenziazione totale limitate
+                if p + q + P + Q > max_order or d + D > 2:
+                    pruned += 1
+                    continue
+                candidates.append(((p, d, q), (P, D, Q, m if seasonal else 0)))
+        return candidates, pruned
+
+    def _sort_key(self, result):
+        value = result.get(self.rank_by)
+        if value is None:
+            return (1, 0.0)
+        # test_score: più alto è meglio; aic: più basso è meglio
+        return (0, -value if self.rank_by == 'test_score' else value)
+
+    @property
+    def ranked_by(self):
+        """
+        Criterio effettivo della classifica: con rank_by='test_score' e nessun
+        candidato con punteggio (es. test set senza valori non nulli) l'ordine
+        è quello dell'AIC, usato come criterio secondario
+        """
+        if self.rank_by == 'test_score' and not any(
+                r['status'] == 'ok' and r.get('test_score') is not None for r in self.results.values()):
+            return 'aic'
+        return self.rank_by
+
+    def leaderboard(self, size=10):
+        """Candidati stimati con successo, ordinati per il criterio scelto"""
+        ok = [r for r in self.results.values() if r['status'] == 'ok']
+        ok.sort(key=lambda r: (self._sort_key(r), r['aic'] if r['aic'] is not None else math.inf))
+        return ok[:size]
+
+    def summary(self):
+        statuses = [r['status'] for r in self.results.values()]
+        return {
+            'evaluated': len(statuses),
+            'succeeded': statuses.count('ok'),
+            'failed': statuses.count('failed'),
+            'timed_out': statuses.count('timeout'),
+            'pruned': self.pruned,
+            'budget_exhausted': self.budget_exhausted,
+            'ranked_by': self.ranked_by
+        }
+
+    # ----- esecuzione -----
+    def _evaluate_batch(self, executor, candidates, deadline):
+        """Valuta in parallelo i candidati non ancora visti, entro la scadenza globale"""
+        futures = {}
+        for order, seasonal_order in candidates:
+            key = (tuple(order), tuple(seasonal_order))
+            if key in self.results:
+                continue
+            future = executor.submit(
+                evaluate_candidate, self.train_values, self.test_values,
+                order, seasonal_order, deadline=deadline, timeout=self.candidate_timeout,
+                **self.fit_kwargs
+            )
+            futures[future] = key
+
+        pending = set(futures)
+        while pending:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                self.budget_exhausted = True
+                for future in pending:
+                    future.cancel()
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.cancelled():
+                    continue
+                try:
+                    self.results[futures[future]] = future.result()
+                except Exception as e:
+                    order, seasonal_order = futures[future]
+                    self.results[futures[future]] = {
+                        'order': list(order), 'seasonal_order': list(seasonal_order),
+                        'status': 'failed', 'error': str(e)
+                    }
+
+    def _executor(self):
+        return ProcessPoolExecutor(
+            max_workers=self.n_jobs,
+            mp_context=multiprocessing.get_context(self.mp_context)
+        )
+
+    def run_grid(self, candidates):
+        """Valuta tutti i candidati della griglia"""
+        deadline = time.time() + self.time_budget
+        executor = self._executor()
+        try:
+            self._evaluate_batch(executor, candidates, deadline)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+        board = self.leaderboard(size=1)
+        return board[0] if board else None
+
+    def run_stepwise(self, d=0, D=0, m=0, max_p=5, max_q=5, max_P=2, max_Q=2, max_order=6):
+        """
+        Ricerca stepwise (Hyndman-Khandakar): parte da pochi modelli e si muove
+        sui vicini del migliore finché il criterio migliora. I vicini di ogni
+        passo vengono valutati in parallelo.
+        """
+        seasonal = m is not None and m > 1
+        sp = lambda P, Q: (P, D, Q, m) if seasonal else (0, 0, 0, 0)
+
+        def allowed(p, q, P, Q):
+            ok = 0 <= p <= max_p and 0 <= q <= max_q and 0 <= P <= max_P and 0 <= Q <= max_Q
+            ok = ok and p + q + P + Q <= max_order
+            if not ok:
+                self.pruned += 1
+            return ok
+
+        start = [(2, 2, 1, 1), (0, 0, 0, 0), (1, 0, 1, 0), (0, 1, 0, 1)] if seasonal else \
+            [(2, 2, 0, 0), (0, 0, 0, 0), (1, 0, 0, 0), (0, 1, 0, 0)]
+
+        deadline = time.time() + self.time_budget
+        executor = self._executor()
+        try:
+            batch = [((p, d, q), sp(P, Q)) for p, q, P, Q in start if allowed(p, q, P, Q)]
+            best = None
+            while batch and not self.budget_exhausted:
+                self._evaluate_batch(executor, batch, deadline)
+                current = self.leaderboard(size=1)
+                current = current[0] if current else None
+                if current is None or (best is not None and self._sort_key(current) >= self._sort_key(best)):
+                    break
+                best = current
+                p, _, q = best['order']
+                P, _, Q, _ = best['seasonal_order']
+                moves = [(1, 0, 0, 0), (-1, 0, 0, 0), (0, 1, 0, 0), (0, -1, 0, 0),
+                         (1, 1, 0, 0), (-1, -1, 0, 0)]
+                if seasonal:
+                    moves += [(0, 0, 1, 0), (0, 0, -1, 0), (0, 0, 0, 1), (0, 0, 0, -1),
+                              (0, 0, 1, 1), (0, 0, -1, -1)]
+                batch = []
+                for dp, dq, dP, dQ in moves:
+                    cand = (p + dp, q + dq, P + dP, Q + dQ)
+                    key = ((cand[0], d, cand[1]), sp(cand[2], cand[3]))
+                    if key not in self.results and allowed(*cand):
+                        batch.append(key)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+        return best
@@ -0,0 +1,104 @@
+"""
+Paginazione keyset (a cursore) per le liste di run e file.
+
+Invece di OFFSET, ogni pagina riparte dall'ultima riga della precedente:
+il cursore contiene il valore della chiave di ordinamento e l'id dell'ultima
+riga restituita, e la pagina successiva è una WHERE su quella coppia. Il costo
+di una pagina non cresce con la sua posizione e le righe inserite nel
+frattempo non causano duplicati o salti.
+
+Le chiavi che ammettono NULL (es. AIC di un fit fallito) vengono ordinate con
+i NULL sempre in fondo, sia in ordine crescente sia decrescente.
+"""
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import and_, or_
+
+
+class CursorError(ValueError):
+    """Cursore di paginazione non valido o non coerente con l'ordinamento richiesto"""
+
+
+def encode_cursor(sort_key, value, row_id):
+    """Serializza la posizione (chiave, valore, id) in un token opaco per il client"""
+    if isinstance(value, datetime):
+        value = {'dt': value.isoformat()}
+    payload = json.dumps({'k': sort_key, 'v': value, 'id': row_id}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, sort_key):
+    """
+    Decodifica un cursore prodotto da encode_cursor
+
+    Raises:
+        CursorError: token malformato o generato con un'altra chiave di ordinamento
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+        key, value, row_id = payload['k'], payload['v'], int(payload['id'])
+        if isinstance(value, dict):
+            value = datetime.fromisoformat(value['dt'])
+    except (ValueError, KeyError, TypeError) as e:
+        raise CursorError('Cursore non valido') from e
+    if key != sort_key:
+        raise CursorError('Il cursore appartiene a un ordinamento diverso')
+    return value, row_id
+
+
+def keyset_page(query, sort_key, sort_column, id_column, descending=False, limit=None,
+                cursor=None, nullable=False, value_getter=None, id_getter=None):
+    """
+    Applica ordinamento e (opzionalmente) paginazione keyset a una query
+
+    Args:
+        query: query SQLAlchemy già filtrata
+        sort_key: nome pubblico della chiave (salvato nel cursore)
+        sort_column: colonna di ordinamento
+        id_column: colonna univoca usata come spareggio (es. ModelRun.run_id)
+        descending: ordine decrescente
+        limit: righe per pagina; None restituisce tutte le righe (nessun cursore)
+        cursor: token della pagina precedente (next_cursor)
+        nullable: True se sort_column può essere NULL (NULL in fondo)
+        value_getter, id_getter: estraggono chiave e id da una riga del risultato
+
+    Returns:
+        (rows, next_cursor): next_cursor è None se non ci sono altre pagine
+
+    Raises:
+        CursorError: cursore non valido
+    """
+    after = (lambda col, val: col < val) if descending else (lambda col, val: col > val)
+
+    if cursor:
+        value, row_id = decode_cursor(cursor, sort_key)
+        if nullable and value is None:
+            # Siamo già nel blocco dei NULL: si prosegue solo sull'id
+            query = query.filter(and_(sort_column.is_(None), after(id_column, row_id)))
+        else:
+            condition = or_(
+                after(sort_column, value),
+                and_(sort_column == value, after(id_column, row_id))
+            )
+            if nullable:
+                condition = or_(condition, sort_column.is_(None))
+            query = query.filter(condition)
+
+    ordering = []
+    if nullable:
+        ordering.append(sort_column.is_(None))  # False (0) prima: NULL in fondo
+    ordering.append(sort_column.desc() if descending else sort_column.asc())
+    ordering.append(id_column.desc() if descending else id_column.asc())
+    query = query.order_by(*ordering)
+
+    if limit is None:
+        return query.all(), None
+
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(sort_key, value_getter(last), id_getter(last))
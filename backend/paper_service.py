@@ -6,6 +6,7 @@ import json
 from datetime import datetime
 from config import Config
 from models import Model, File, ModelRun, Metrics
+from services import ResidualService
 
 
 class PaperService:
@@ -79,7 +80,8 @@ class PaperService:
             'aic': model.aic if model else None,
             'bic': model.bic if model else None,
             'test_r2': model.test_r2 if model else None,
-            'test_mape': model.test_mape if model else None
+            'test_mape': model.test_mape if model else None,
+            'residuals': None
         }
         
         # Aggiungi metriche
@@ -126,6 +128,7 @@ class PaperService:
                 })
             
             data['model_summary'] = model.model_summary
+            data['residuals'] = ResidualService.to_dict(model.residuals)
         
         return data
 
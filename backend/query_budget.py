@@ -0,0 +1,57 @@
+"""
+Conteggio delle query SQL per richiesta e budget per endpoint.
+
+Ogni statement eseguito durante una richiesta HTTP incrementa un contatore in
+flask.g. Il decoratore query_budget(n) confronta le query eseguite dalla view
+con il budget dichiarato: in produzione il superamento viene solo loggato, in
+modalità TESTING (o con QUERY_BUDGET_STRICT=true) solleva QueryBudgetExceeded,
+così una regressione N+1 fa fallire subito i test dell'endpoint.
+Il numero di query della view è esposto nell'header X-Query-Count.
+"""
+from functools import wraps
+from flask import g, current_app, has_request_context, make_response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class QueryBudgetExceeded(Exception):
+    """La view ha eseguito più query del budget dichiarato"""
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g._query_count = g.get('_query_count', 0) + 1
+
+
+def query_count():
+    """Query eseguite finora nella richiesta corrente"""
+    return g.get('_query_count', 0) if has_request_context() else 0
+
+
+def query_budget(max_queries):
+    """
+    Decoratore per le view: limita il numero di query SQL eseguite dalla view
+
+    Le query fatte prima della view (es. caricamento dell'utente di
+    flask-login) non vengono conteggiate.
+
+    Args:
+        max_queries: numero massimo di statement SQL ammessi
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            start = query_count()
+            response = make_response(view(*args, **kwargs))
+            used = query_count() - start
+            response.headers['X-Query-Count'] = str(used)
+
+            if used > max_queries:
+                message = f'{view.__name__}: {used} query SQL (budget {max_queries})'
+                if current_app.config.get('QUERY_BUDGET_STRICT') or current_app.testing:
+                    raise QueryBudgetExceeded(message)
+                current_app.logger.warning(f'Budget query superato - {message}')
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,202 @@
+"""
+Rendering delle immagini (ACF/PACF, serie storica) con cache su disco.
+
+Le immagini vengono disegnate su oggetti Figure espliciti con FigureCanvasAgg,
+senza la macchina a stati globale di pyplot: ogni chiamata lavora sulla propria
+figura ed è sicura da thread concorrenti (pool dei job, richieste Flask).
+
+Ogni PNG è indirizzato per contenuto: la chiave è l'hash dei valori della
+serie più i parametri di rendering (tipo, nlags, alpha, dpi, ...). Una serie
+trasformata ha valori diversi e quindi chiavi diverse: le immagini non
+diventano mai obsolete e file con lo stesso contenuto le condividono. La
+cartella (AI_IMAGES_FOLDER) è limitata a RENDER_CACHE_MAX_BYTES, espellendo
+le immagini usate meno di recente.
+"""
+import os
+import io
+import json
+import hashlib
+import threading
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from config import Config
+
+# Immagini ACF/PACF disponibili: singole, impilate (acf_pacf) e affiancate (combined)
+CORRELOGRAM_KINDS = ('acf', 'pacf', 'acf_pacf', 'combined')
+
+# Serializza l'espulsione delle immagini (la scrittura dei PNG è già atomica)
+_evict_lock = threading.Lock()
+
+
+def series_hash(values):
+    """Hash del contenuto di una serie (valori float64)"""
+    values = np.ascontiguousarray(values, dtype=np.float64)
+    return hashlib.sha1(memoryview(values)).hexdigest()
+
+
+def _draw_correlogram(ax, lags, values, confint, color, ylabel, title):
+    """Barre ACF o PACF con la banda di confidenza intorno a zero"""
+    ax.bar(lags, values, width=0.3, alpha=0.7, color=color)
+    ax.axhline(y=0, color='black', linestyle='-', linewidth=0.5)
+    if confint:
+        ci_lower = [ci[0] for ci in confint]
+        ci_upper = [ci[1] for ci in confint]
+        ax.fill_between(lags, ci_lower, ci_upper, alpha=0.2, color='red', label='95% CI')
+        ax.axhline(y=ci_upper[0], color='red', linestyle='--', linewidth=1, alpha=0.7)
+        ax.axhline(y=ci_lower[0], color='red', linestyle='--', linewidth=1, alpha=0.7)
+    ax.set_xlabel('Lag')
+    ax.set_ylabel(ylabel)
+    ax.set_title(title)
+    ax.grid(True, alpha=0.3)
+    ax.legend()
+
+
+def _figure_png(fig, dpi):
+    """PNG di una figura (canvas Agg dedicato, nessuno stato globale)"""
+    FigureCanvasAgg(fig)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=dpi, bbox_inches='tight')
+    return buffer.getvalue()
+
+
+class RenderService:
+    """Rendering thread-safe delle immagini e cache su disco indirizzata per contenuto"""
+
+    @staticmethod
+    def _cache_path(kind, content_hash, params):
+        key = hashlib.sha1(json.dumps([kind, content_hash, params], sort_keys=True).encode('utf-8')).hexdigest()
+        return os.path.join(Config.AI_IMAGES_FOLDER, f'{kind}_{key}.png')
+
+    @staticmethod
+    def _cached(path, render):
+        """
+        Restituisce il PNG in cache o lo genera con render() e lo salva
+
+        Returns:
+            str: percorso del PNG
+        """
+        if os.path.exists(path):
+            try:
+                # mtime = ultimo uso, per l'espulsione LRU
+                os.utime(path)
+                return path
+            except OSError:
+                pass  # rimosso nel frattempo da un altro processo: si rigenera
+
+        png = render()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as fh:
+            fh.write(png)
+        os.replace(tmp_path, path)
+        RenderService.evict(keep=path)
+        return path
+
+    @staticmethod
+    def evict(keep=None):
+        """
+        Riporta la cartella delle immagini entro RENDER_CACHE_MAX_BYTES
+
+        Rimuove i PNG con mtime (ultimo uso) più vecchio; keep non viene mai rimosso.
+
+        Returns:
+            int: immagini rimosse
+        """
+        with _evict_lock:
+            try:
+                entries = [entry for entry in os.scandir(Config.AI_IMAGES_FOLDER)
+                           if entry.is_file() and entry.name.endswith('.png')]
+            except OSError:
+                return 0
+            sizes = {}
+            for entry in entries:
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                sizes[entry.path] = (st.st_mtime_ns, st.st_size)
+
+            total = sum(size for _, size in sizes.values())
+            removed = 0
+            for path, (_, size) in sorted(sizes.items(), key=lambda item: item[1][0]):
+                if total <= Config.RENDER_CACHE_MAX_BYTES:
+                    break
+                if path == keep:
+                    continue
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                removed += 1
+            return removed
+
+    @staticmethod
+    def correlogram(values, kind='acf', nlags=None, alpha=0.05, dpi=150):
+        """
+        Immagine ACF/PACF di una serie (percorso del PNG in cache)
+
+        ACF e PACF sono calcolate una volta (calculate_acf_pacf, memoizzata) e
+        condivise da tutte le immagini della stessa serie.
+
+        Args:
+            values: valori della serie
+            kind: 'acf', 'pacf', 'acf_pacf' (impilate) o 'combined' (affiancate)
+            nlags: lag da mostrare (default: min(40, n // 4))
+            alpha: livello per le bande di confidenza
+            dpi: risoluzione del PNG
+        """
+        if kind not in CORRELOGRAM_KINDS:
+            raise ValueError(f"Tipo immagine non valido: {kind}")
+        values = np.asarray(values, dtype=np.float64)
+        params = {'nlags': nlags, 'alpha': alpha, 'dpi': dpi}
+
+        def render():
+            from utils import calculate_acf_pacf
+            data = calculate_acf_pacf(values, nlags=nlags, alpha=alpha)
+            lags = data['lags']
+            acf_args = (lags, data['acf'], data['acf_confint'], 'steelblue',
+                        'Autocorrelation', 'Autocorrelation Function (ACF)')
+            pacf_args = (lags, data['pacf'], data['pacf_confint'], 'darkgreen',
+                         'Partial Autocorrelation', 'Partial Autocorrelation Function (PACF)')
+
+            if kind in ('acf', 'pacf'):
+                fig = Figure(figsize=(10, 4))
+                _draw_correlogram(fig.subplots(), *(acf_args if kind == 'acf' else pacf_args))
+            else:
+                stacked = kind == 'acf_pacf'
+                fig = Figure(figsize=(10, 8) if stacked else (16, 6))
+                ax1, ax2 = fig.subplots(2, 1) if stacked else fig.subplots(1, 2)
+                _draw_correlogram(ax1, *acf_args)
+                _draw_correlogram(ax2, *pacf_args)
+                fig.tight_layout()
+            return _figure_png(fig, dpi)
+
+        return RenderService._cached(RenderService._cache_path(kind, series_hash(values), params), render)
+
+    @staticmethod
+    def series_plot(dates, values, dpi=150):
+        """
+        Grafico della serie storica completa (percorso del PNG in cache)
+
+        Args:
+            dates: date int64 epoch-ns (come SeriesStore)
+            values: valori
+        """
+        dates = np.ascontiguousarray(dates, dtype=np.int64)
+        content_hash = hashlib.sha1(memoryview(dates)).hexdigest() + series_hash(values)
+
+        def render():
+            fig = Figure(figsize=(12, 6))
+            ax = fig.subplots()
+            ax.plot(dates.view('datetime64[ns]'), values, linewidth=2, color='#1f4788', marker='o', markersize=3)
+            ax.set_title('Serie Storica Completa', fontsize=16, fontweight='bold')
+            ax.set_xlabel('Data', fontsize=12)
+            ax.set_ylabel('Valore (y)', fontsize=12)
+            ax.grid(True, alpha=0.3)
+            ax.tick_params(axis='x', labelrotation=45)
+            fig.tight_layout()
+            return _figure_png(fig, dpi)
+
+        return RenderService._cached(RenderService._cache_path('series', content_hash, {'dpi': dpi}), render)
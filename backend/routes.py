@@ -2,7 +2,16 @@ from flask import Blueprint, request, jsonify, send_file, render_template
 from flask_login import login_user, logout_user, login_required, current_user
 from database import db
 from models import *
-from services import FileService, SarimaxService, StatisticsService, get_absolute_path
+from services import FileService, SarimaxService, StatisticsService, ResidualService, get_absolute_path
+from forecast_store import ForecastSeriesStore
+from blob_store import BlobStore
+from transform_service import TransformService, TransformRecipe, STAGES
+from query_budget import query_budget
+from sqlalchemy import or_
+from sqlalchemy.orm import joinedload, contains_eager
+from pagination import keyset_page, CursorError
+from serializers import series_columns, series_payload, series_window, decimate_columns, to_builtin, json_response
+from decimation import METHODS as DECIMATION_METHODS
 import os
 import json
 import pandas as pd
@@ -202,24 +211,21 @@ def upload_file_temp():
         return jsonify({'error': 'Solo file CSV sono supportati'}), 400
     
     try:
-        # Salva file temporaneamente
-        os.makedirs(Config.UPLOAD_FOLDER, exist_ok=True)
-        filename = f"{user_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{file.filename}"
-        filepath = os.path.join(Config.UPLOAD_FOLDER, filename)
-        file.save(filepath)
+        # Salva il contenuto (deduplicato per hash: un CSV già caricato non viene riscritto)
+        blob, is_new = BlobStore.store_upload(file)
+        filepath = blob.path
         
         # Valida formato con gestione errori dettagliata
+        # (per un contenuto già noto la serie validata è già nell'archivio binario)
         try:
-            df = FileService.load_and_validate(filepath)
+            n_observations = len(FileService.load_series(filepath)[1])
         except ValueError as ve:
-            # Rimuovi file se validazione fallisce
-            if os.path.exists(filepath):
-                os.remove(filepath)
+            # Rilascia il blob se validazione fallisce
+            BlobStore.release(blob.content_hash)
             return jsonify({'error': f'Errore validazione: {str(ve)}'}), 400
         except Exception as e:
-            # Rimuovi file se errore
-            if os.path.exists(filepath):
-                os.remove(filepath)
+            # Rilascia il blob se errore
+            BlobStore.release(blob.content_hash)
             return jsonify({'error': f'Errore nel caricamento file: {str(e)}'}), 400
         
         # Crea record file (senza split ancora)
@@ -227,16 +233,21 @@ def upload_file_temp():
             user_id=user_id,
             file_name=file.filename,
             file_path=filepath,
-            n_observations=len(df),
+            content_hash=blob.content_hash,
+            n_observations=n_observations,
             train_split_ratio=0.8  # Default, verrà aggiornato
         )
         db.session.add(file_record)
         db.session.commit()
         
+        # Serie lunghe: piramide multi-risoluzione per i grafici (riusata se il contenuto è duplicato)
+        TransformService.pyramid(file_record, TransformRecipe())
+        
         return jsonify({
             'file_id': file_record.file_id,
             'file_name': file_record.file_name,
-            'n_observations': file_record.n_observations
+            'n_observations': file_record.n_observations,
+            'deduplicated': not is_new
         }), 201
     except ValueError as e:
         return jsonify({'error': str(e)}), 400
@@ -246,45 +257,111 @@ def upload_file_temp():
         print(f"Errore upload: {error_details}")
         return jsonify({'error': f'Errore server: {str(e)}'}), 500
 
+# ========== FINESTRE DELLE SERIE ==========
+# Punti massimi per serie restituibili con max_points
+MAX_SERIES_POINTS = 20000
+
+def parse_series_window_params(default_max_points):
+    """
+    Legge dalla query string la finestra da restituire di una serie
+    
+    Parametri: start/end (ISO 8601, end escluso; una data senza ora in end
+    include l'intero giorno), max_points (punti massimi, la serie viene decimata),
+    downsample ('lttb' default o 'minmax').
+    
+    Returns:
+        dict con start, end, max_points, method (argomenti di series_window)
+    
+    Raises:
+        ValueError: parametro non valido (messaggio per il client)
+    """
+    start = parse_date_param('start')
+    end = parse_date_param('end', end_of_day=True)
+    if start and end and start >= end:
+        raise ValueError('start deve precedere end')
+    
+    try:
+        max_points = int(request.args.get('max_points', default_max_points))
+    except ValueError:
+        raise ValueError('max_points deve essere un intero')
+    if not 3 <= max_points <= MAX_SERIES_POINTS:
+        raise ValueError(f'max_points deve essere compreso tra 3 e {MAX_SERIES_POINTS}')
+    
+    method = request.args.get('downsample', 'lttb')
+    if method not in DECIMATION_METHODS:
+        raise ValueError(f"downsample deve essere uno tra: {', '.join(DECIMATION_METHODS)}")
+    
+    return {'start': start, 'end': end, 'max_points': max_points, 'method': method}
+
 # ========== DATI FILE (prima dello split) ==========
 @api.route('/file/<int:file_id>/data', methods=['GET'])
 @login_required
 def get_file_data(file_id):
-    """Ottiene i dati completi del file ORIGINALE (sempre, non trasformati) con ACF/PACF"""
+    """
+    Ottiene i dati completi del file ORIGINALE (sempre, non trasformati) con ACF/PACF
+    
+    La serie del grafico è decimata (max_points, default 1000) e può essere
+    limitata a una finestra di date con start/end (vedi parse_series_window_params).
+    Con stage ('smoothed', 'log', 'diff') il grafico mostra la serie della ricetta
+    corrente fino a quella fase; statistiche e ACF/PACF restano dell'originale.
+    
+    Le serie lunghe hanno una piramide multi-risoluzione precalcolata: ogni
+    finestra, a qualunque zoom, costa in proporzione ai punti restituiti.
+    """
     file = File.query.get_or_404(file_id)
     
-    # SEMPRE carica dati originali (non trasformati) per la visualizzazione iniziale
-    file_path = file.file_path
+    try:
+        window_params = parse_series_window_params(default_max_points=1000)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    stage = request.args.get('stage', 'original')
+    if stage not in STAGES:
+        return jsonify({'error': f"stage deve essere uno tra: {', '.join(STAGES)}"}), 400
     
-    df = FileService.load_and_validate(file_path)
+    # Statistiche e ACF/PACF dipendono solo dal contenuto: per i file deduplicati
+    # vengono calcolate una volta e condivise tra gli upload dello stesso CSV
+    summary = BlobStore.load_summary(file.content_hash) if file.content_hash else None
+    if summary is not None:
+        stats = summary['statistics']
+        acf_pacf = summary['acf_pacf']
+    else:
+        # SEMPRE sui dati originali (non trasformati)
+        df = FileService.load_and_validate(file.file_path)
+        
+        # Calcola statistiche descrittive complete
+        from utils import calculate_statistics, calculate_acf_pacf
+        stats = calculate_statistics(df)
+        
+        # Calcola ACF/PACF
+        try:
+            acf_pacf = calculate_acf_pacf(df['y'], nlags=min(40, len(df) // 4))
+        except Exception as e:
+            print(f"Errore calcolo ACF/PACF: {e}")
+            acf_pacf = None
+        
+        if file.content_hash and acf_pacf is not None:
+            BlobStore.save_summary(file.content_hash, {'statistics': stats, 'acf_pacf': acf_pacf})
     
-    # Calcola statistiche descrittive complete
-    from utils import calculate_statistics, calculate_acf_pacf
-    stats = calculate_statistics(df)
+    original_dates = FileService.load_series(file.file_path)[0]
     
-    # Calcola ACF/PACF
     try:
-        acf_pacf = calculate_acf_pacf(df['y'], nlags=min(40, len(df) // 4))
-    except Exception as e:
-        print(f"Errore calcolo ACF/PACF: {e}")
-        acf_pacf = None
-    
-    # Prepara dati per grafico (downsample se necessario per performance)
-    n_points = len(df)
-    if n_points > 1000:
-        step = n_points // 500
-        df_plot = df.iloc[::step].copy()
+        recipe = TransformRecipe.from_file(file).stage(stage)
+        dates, values = TransformService.series(file, recipe)
+        pyramid = TransformService.pyramid(file, recipe)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Prepara dati per grafico: finestra richiesta, decimata preservando picchi e minimi
+    if pyramid is not None:
+        plot_columns, window = pyramid.window(dates, values, **window_params)
     else:
-        df_plot = df.copy()
+        plot_columns, window = series_window(series_columns(dates, values=values), **window_params)
     
-    return jsonify({
-        'data': [
-            {
-                'date': row['data'].isoformat() if isinstance(row['data'], datetime) else str(row['data']),
-                'value': float(row['y'])
-            }
-            for _, row in df_plot.iterrows()
-        ],
+    return json_response({
+        'data': series_payload(plot_columns),
+        'window': window,
+        'stage': stage,
         'statistics': {
             'mean': stats['mean'],
             'std': stats['std'],
@@ -297,13 +374,16 @@ def get_file_data(file_id):
         },
         'acf_pacf': acf_pacf,
         'date_range': {
-            'start': df['data'].min().isoformat() if isinstance(df['data'].min(), datetime) else str(df['data'].min()),
-            'end': df['data'].max().isoformat() if isinstance(df['data'].max(), datetime) else str(df['data'].max())
+            'start': pd.Timestamp(original_dates[0]).isoformat(),
+            'end': pd.Timestamp(original_dates[-1]).isoformat()
         },
         'is_smoothed': file.smoothing_window > 1 if file.smoothing_window else False
-    }), 200
+    })
 
 # ========== APPLICA SMOOTHING ==========
+# Finestra massima della media mobile (slider del frontend)
+MAX_SMOOTHING_WINDOW = 20
+
 @api.route('/file/<int:file_id>/apply-smoothing', methods=['POST'])
 @login_required
 def apply_smoothing(file_id):
@@ -317,30 +397,23 @@ def apply_smoothing(file_id):
     data = request.json
     window_size = int(data.get('window_size', 1))
     
-    if window_size < 1 or window_size > 20:
-        return jsonify({'error': 'window_size deve essere tra 1 e 20'}), 400
+    if window_size < 1 or window_size > MAX_SMOOTHING_WINDOW:
+        return jsonify({'error': f'window_size deve essere tra 1 e {MAX_SMOOTHING_WINDOW}'}), 400
     
     try:
         # Carica dati originali
         df = FileService.load_and_validate(file_record.file_path)
         
-        # Applica smoothing
-        from utils import apply_smoothing, calculate_statistics, calculate_acf_pacf
-        df_smoothed = apply_smoothing(df, window_size)
-        
-        # Salva file smussato
-        smoothed_file_name = f"smoothed_{window_size}_{file_record.file_name}"
-        smoothed_file_path = os.path.join(Config.UPLOAD_FOLDER, smoothed_file_name)
+        from utils import calculate_statistics, calculate_acf_pacf
         
-        # Salva come CSV
-        df_smoothed_copy = df_smoothed.copy()
-        if pd.api.types.is_datetime64_any_dtype(df_smoothed_copy['data']):
-            df_smoothed_copy['data'] = df_smoothed_copy['data'].dt.strftime('%Y-%m-%d')
-        df_smoothed_copy.to_csv(smoothed_file_path, index=False)
+        # La serie smussata viene calcolata dalla ricetta (memoizzata), non salvata su disco
+        recipe = TransformRecipe.from_file(file_record)._replace(smoothing_window=window_size)
+        df_smoothed = TransformService.frame(file_record, recipe.stage('smoothed'))
+        TransformService.pyramid(file_record, recipe.stage('smoothed'))
         
-        # Aggiorna file record
+        # Aggiorna la ricetta del file (log e differenziazione seguono la nuova serie)
         file_record.smoothing_window = window_size
-        file_record.smoothed_file_path = smoothed_file_path
+        TransformService.discard_materialized(file_record)
         db.session.commit()
         
         # Calcola statistiche serie smussata
@@ -353,64 +426,95 @@ def apply_smoothing(file_id):
             print(f"Errore calcolo ACF/PACF serie smussata: {e}")
             smoothed_acf_pacf = None
         
-        # Prepara dati per grafico confronto
-        # Allinea le date: la serie smussata inizia dopo (window_size-1) osservazioni
-        # Crea un DataFrame con entrambe le serie allineate per data
-        df_original = df.copy()
-        df_original['type'] = 'original'
-        
-        df_smoothed_comp = df_smoothed.copy()
-        df_smoothed_comp['type'] = 'smoothed'
-        
-        # Unisci per data per avere confronto allineato
-        df_merged = pd.merge(
-            df_original[['data', 'y']].rename(columns={'y': 'original'}),
-            df_smoothed_comp[['data', 'y']].rename(columns={'y': 'smoothed'}),
-            on='data',
-            how='outer'
-        ).sort_values('data').reset_index(drop=True)
-        
-        # Prepara dati per grafico (downsample se necessario)
-        max_points = 1000
-        step = max(1, len(df_merged) // max_points)
-        
-        original_data = []
-        smoothed_data = []
-        
-        for idx, row in df_merged.iterrows():
-            if idx % step == 0:
-                date_str = row['data'].strftime('%Y-%m-%d') if hasattr(row['data'], 'strftime') else str(row['data'])
-                
-                if pd.notna(row['original']):
-                    original_data.append({
-                        'date': date_str,
-                        'value': float(row['original'])
-                    })
-                
-                if pd.notna(row['smoothed']):
-                    smoothed_data.append({
-                        'date': date_str,
-                        'value': float(row['smoothed'])
-                    })
+        # Prepara dati per grafico confronto (decimati se necessario), ognuna con le proprie date
+        original_columns = decimate_columns(series_columns(df['data'], values=df['y']), 1000)
+        smoothed_columns = decimate_columns(series_columns(df_smoothed['data'], values=df_smoothed['y']), 1000)
         
-        return jsonify({
+        return json_response({
             'file_id': file_record.file_id,
             'window_size': window_size,
             'n_observations': len(df_smoothed),
             'original_obs': len(df),
-            'smoothed_file': smoothed_file_name,
+            'recipe': recipe.name,
             'statistics': smoothed_stats,
             'acf_pacf': smoothed_acf_pacf,
             'comparison_data': {
-                'original': original_data,
-                'smoothed': smoothed_data
+                'original': series_payload(original_columns),
+                'smoothed': series_payload(smoothed_columns)
             }
-        }), 200
+        })
     except Exception as e:
         import traceback
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+# ========== ANTEPRIMA SMOOTHING ==========
+def parse_smoothing_windows(raw):
+    """
+    Interpreta il parametro windows: intervallo 'a..b' e/o lista '1,3,5' (es. '1..5,10')
+    
+    Raises:
+        ValueError: finestre non numeriche o fuori da 1..MAX_SMOOTHING_WINDOW
+    """
+    windows = []
+    for part in raw.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '..' in part:
+            start, end = (int(v) for v in part.split('..', 1))
+            values = range(start, end + 1)
+        else:
+            values = [int(part)]
+        for window_size in values:
+            if window_size < 1 or window_size > MAX_SMOOTHING_WINDOW:
+                raise ValueError(f'Le finestre devono essere tra 1 e {MAX_SMOOTHING_WINDOW}')
+            if window_size not in windows:
+                windows.append(window_size)
+    if not windows:
+        raise ValueError('Nessuna finestra richiesta')
+    return windows
+
+@api.route('/file/<int:file_id>/smoothing-preview', methods=['GET'])
+@login_required
+def smoothing_preview(file_id):
+    """
+    Anteprima dello smoothing per più finestre (sola lettura, per lo slider)
+    
+    Query: windows ('1..20' default, anche lista '1,3,5'), max_points (punti per curva, default 500),
+    downsample ('lttb' default o 'minmax').
+    Non modifica il file: per applicare lo smoothing usare apply-smoothing.
+    """
+    file_record = File.query.get_or_404(file_id)
+    
+    # Verifica che il file appartenga all'utente corrente
+    if file_record.user_id != current_user.user_id:
+        return jsonify({'error': 'Non autorizzato ad accedere a questo file'}), 403
+    
+    try:
+        windows = parse_smoothing_windows(request.args.get('windows', f'1..{MAX_SMOOTHING_WINDOW}'))
+        max_points = int(request.args.get('max_points', 500))
+        if max_points < 2 or max_points > 5000:
+            raise ValueError('max_points deve essere tra 2 e 5000')
+        method = request.args.get('downsample', 'lttb')
+        if method not in DECIMATION_METHODS:
+            raise ValueError(f"downsample deve essere uno tra: {', '.join(DECIMATION_METHODS)}")
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        previews = TransformService.smoothing_preview(file_record, windows, max_points=max_points, method=method)
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+    
+    return json_response({
+        'file_id': file_record.file_id,
+        'current_window': file_record.smoothing_window or 1,
+        'windows': previews
+    })
+
 # ========== APPLICA TRASFORMAZIONE LOGARITMICA ==========
 @api.route('/file/<int:file_id>/apply-log-transform', methods=['POST'])
 @login_required
@@ -426,21 +530,13 @@ def apply_log_transform_endpoint(file_id):
     apply_log = data.get('apply_log', False)
     
     try:
-        # Determina quale serie usare come base (catena: smoothing -> log -> diff)
-        # La log va applicata dopo lo smoothing se presente
-        if file_record.smoothed_file_path and os.path.exists(get_absolute_path(file_record.smoothed_file_path)):
-            base_df = FileService.load_and_validate(file_record.smoothed_file_path)
-            base_prefix = 'smoothed'
-        else:
-            base_df = FileService.load_and_validate(file_record.file_path)
-            base_prefix = 'original'
+        # Catena smoothing -> log -> diff: la log va applicata dopo lo smoothing se presente
+        recipe = TransformRecipe.from_file(file_record)._replace(log_transform=bool(apply_log))
         
         # Se apply_log = False, rimuovi trasformazione log se presente
         if not apply_log:
-            if file_record.log_transformed_file_path and os.path.exists(get_absolute_path(file_record.log_transformed_file_path)):
-                os.remove(get_absolute_path(file_record.log_transformed_file_path))
             file_record.log_transform = False
-            file_record.log_transformed_file_path = None
+            TransformService.discard_materialized(file_record)
             db.session.commit()
             return jsonify({
                 'file_id': file_record.file_id,
@@ -448,23 +544,16 @@ def apply_log_transform_endpoint(file_id):
                 'message': 'Trasformazione logaritmica rimossa'
             }), 200
         
-        # Applica trasformazione logaritmica
-        from utils import apply_log_transform, calculate_statistics, calculate_acf_pacf
-        df_log = apply_log_transform(base_df)
+        from utils import calculate_statistics, calculate_acf_pacf
         
-        # Salva file trasformato
-        log_file_name = f"log_{file_record.file_name}"
-        log_file_path = os.path.join(Config.UPLOAD_FOLDER, log_file_name)
-        
-        # Salva come CSV
-        df_log_copy = df_log.copy()
-        if pd.api.types.is_datetime64_any_dtype(df_log_copy['data']):
-            df_log_copy['data'] = df_log_copy['data'].dt.strftime('%Y-%m-%d')
-        df_log_copy.to_csv(log_file_path, index=False)
+        # Valuta la ricetta prima di salvarla: valori <= 0 sollevano ValueError
+        df_log = TransformService.frame(file_record, recipe.stage('log'))
+        base_obs = TransformService.count(file_record, recipe.stage('smoothed'))
+        TransformService.pyramid(file_record, recipe.stage('log'))
         
         # Aggiorna file record
         file_record.log_transform = True
-        file_record.log_transformed_file_path = log_file_path
+        TransformService.discard_materialized(file_record)
         db.session.commit()
         
         # Calcola statistiche serie trasformata
@@ -477,33 +566,19 @@ def apply_log_transform_endpoint(file_id):
             print(f"Errore calcolo ACF/PACF serie log: {e}")
             log_acf_pacf = None
         
-        # Prepara dati per grafico (downsample se necessario per performance)
-        n_points = len(df_log)
-        if n_points > 1000:
-            step = n_points // 500
-            df_plot = df_log.iloc[::step].copy()
-        else:
-            df_plot = df_log.copy()
-        
-        # Prepara dati serie trasformata per il grafico
-        log_data = [
-            {
-                'date': row['data'].isoformat() if isinstance(row['data'], datetime) else str(row['data']),
-                'value': float(row['y'])
-            }
-            for _, row in df_plot.iterrows()
-        ]
+        # Prepara dati serie trasformata per il grafico (decimata se necessario per performance)
+        log_data = decimate_columns(series_columns(df_log['data'], values=df_log['y']), 1000)
         
-        return jsonify({
+        return json_response({
             'file_id': file_record.file_id,
             'log_applied': True,
             'n_observations': len(df_log),
-            'original_obs': len(base_df),
-            'log_file': log_file_name,
+            'original_obs': base_obs,
+            'recipe': recipe.name,
             'statistics': log_stats,
             'acf_pacf': log_acf_pacf,
-            'data': log_data  # Dati serie trasformata per il grafico
-        }), 200
+            'data': series_payload(log_data)  # Dati serie trasformata per il grafico
+        })
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -523,23 +598,13 @@ def apply_differencing_endpoint(file_id):
         return jsonify({'error': 'order deve essere tra 0 e 5'}), 400
     
     try:
-        # Determina quale serie usare come base (catena: smoothing -> log -> diff)
-        if file_record.log_transformed_file_path and os.path.exists(get_absolute_path(file_record.log_transformed_file_path)):
-            base_df = FileService.load_and_validate(file_record.log_transformed_file_path)
-            base_prefix = 'log'
-        elif file_record.smoothed_file_path and os.path.exists(get_absolute_path(file_record.smoothed_file_path)):
-            base_df = FileService.load_and_validate(file_record.smoothed_file_path)
-            base_prefix = 'smoothed'
-        else:
-            base_df = FileService.load_and_validate(file_record.file_path)
-            base_prefix = 'original'
+        # Catena smoothing -> log -> diff: la differenziazione parte dall'ultima fase presente
+        recipe = TransformRecipe.from_file(file_record)._replace(differencing_order=order)
         
         # Se order = 0, rimuovi differenziazione
         if order == 0:
-            if file_record.differenced_file_path and os.path.exists(get_absolute_path(file_record.differenced_file_path)):
-                os.remove(get_absolute_path(file_record.differenced_file_path))
             file_record.differencing_order = 0
-            file_record.differenced_file_path = None
+            TransformService.discard_materialized(file_record)
             db.session.commit()
             return jsonify({
                 'file_id': file_record.file_id,
@@ -547,23 +612,15 @@ def apply_differencing_endpoint(file_id):
                 'message': 'Differenziazione rimossa'
             }), 200
         
-        # Applica differenziazione
-        from utils import apply_differencing, calculate_statistics, calculate_acf_pacf
-        df_diff = apply_differencing(base_df, order)
+        from utils import calculate_statistics, calculate_acf_pacf
         
-        # Salva file differenziato
-        diff_file_name = f"diff_{order}_{file_record.file_name}"
-        diff_file_path = os.path.join(Config.UPLOAD_FOLDER, diff_file_name)
-        
-        # Salva come CSV
-        df_diff_copy = df_diff.copy()
-        if pd.api.types.is_datetime64_any_dtype(df_diff_copy['data']):
-            df_diff_copy['data'] = df_diff_copy['data'].dt.strftime('%Y-%m-%d')
-        df_diff_copy.to_csv(diff_file_path, index=False)
+        df_diff = TransformService.frame(file_record, recipe)
+        base_obs = TransformService.count(file_record, recipe.stage('log'))
+        TransformService.pyramid(file_record, recipe)
         
         # Aggiorna file record
         file_record.differencing_order = order
-        file_record.differenced_file_path = diff_file_path
+        TransformService.discard_materialized(file_record)
         db.session.commit()
         
         # Calcola statistiche serie differenziata
@@ -576,34 +633,20 @@ def apply_differencing_endpoint(file_id):
             print(f"Errore calcolo ACF/PACF serie differenziata: {e}")
             diff_acf_pacf = None
         
-        # Prepara dati per grafico (downsample se necessario per performance)
-        n_points = len(df_diff)
-        if n_points > 1000:
-            step = n_points // 500
-            df_plot = df_diff.iloc[::step].copy()
-        else:
-            df_plot = df_diff.copy()
+        # Prepara dati serie differenziata per il grafico (decimata se necessario per performance)
+        diff_data = decimate_columns(series_columns(df_diff['data'], values=df_diff['y']), 1000)
         
-        # Prepara dati serie differenziata per il grafico
-        diff_data = [
-            {
-                'date': row['data'].isoformat() if isinstance(row['data'], datetime) else str(row['data']),
-                'value': float(row['y'])
-            }
-            for _, row in df_plot.iterrows()
-        ]
-        
-        return jsonify({
+        return json_response({
             'file_id': file_record.file_id,
             'order': order,
             'n_observations': len(df_diff),
-            'original_obs': len(base_df),
-            'removed_obs': len(base_df) - len(df_diff),
-            'diff_file': diff_file_name,
+            'original_obs': base_obs,
+            'removed_obs': base_obs - len(df_diff),
+            'recipe': recipe.name,
             'statistics': diff_stats,
             'acf_pacf': diff_acf_pacf,
-            'data': diff_data  # Dati serie differenziata per il grafico
-        }), 200
+            'data': series_payload(diff_data)  # Dati serie differenziata per il grafico
+        })
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -633,24 +676,15 @@ def apply_split(file_id):
         if file_record.user_id != current_user.user_id:
             return jsonify({'error': 'Non autorizzato ad accedere a questo file'}), 403
         
-        # Carica dati seguendo la catena di trasformazioni: diff -> log -> smoothed -> original
-        # L'ordine di applicazione è: smoothing -> log -> diff
-        # Quindi per lo split usiamo: diff se presente, altrimenti log, altrimenti smoothed, altrimenti original
-        df = None
-        file_used = None
-        
-        if file_record.differenced_file_path and os.path.exists(get_absolute_path(file_record.differenced_file_path)):
-            df = FileService.load_and_validate(file_record.differenced_file_path)
-            file_used = 'differenced'
-        elif file_record.log_transformed_file_path and os.path.exists(get_absolute_path(file_record.log_transformed_file_path)):
-            df = FileService.load_and_validate(file_record.log_transformed_file_path)
-            file_used = 'log_transformed'
-        elif file_record.smoothed_file_path and os.path.exists(get_absolute_path(file_record.smoothed_file_path)):
-            df = FileService.load_and_validate(file_record.smoothed_file_path)
-            file_used = 'smoothed'
-        else:
-            df = FileService.load_and_validate(file_record.file_path)
-            file_used = 'original'
+        # Serie finale dopo tutte le trasformazioni (smoothing -> log -> diff) dalla ricetta del file
+        recipe = TransformRecipe.from_file(file_record)
+        df = TransformService.frame(file_record, recipe)
+        file_used = {
+            'diff': 'differenced',
+            'log': 'log_transformed',
+            'smoothed': 'smoothed',
+            'original': 'original'
+        }[recipe.last_stage]
         
         if df is None or len(df) == 0:
             return jsonify({'error': 'Impossibile caricare i dati del file'}), 500
@@ -732,41 +766,25 @@ def analyze_acf_pacf_ai(file_id):
         data = request.json or {}
         series_type = data.get('series_type', 'original')
         
-        # Se richiesta serie specifica, verifica che esista
-        if series_type == 'diff':
-            if not file_record.differenced_file_path or not os.path.exists(get_absolute_path(file_record.differenced_file_path)):
-                return jsonify({
-                    'success': False,
-                    'error': 'Serie differenziata non disponibile. Applica prima la differenziazione.',
-                    'description': None,
-                    'recommendation': None
-                }), 400
-            df = FileService.load_and_validate(file_record.differenced_file_path)
-            prefix = 'diff'
-        elif series_type == 'log':
-            if not file_record.log_transformed_file_path or not os.path.exists(get_absolute_path(file_record.log_transformed_file_path)):
-                return jsonify({
-                    'success': False,
-                    'error': 'Serie trasformata log non disponibile. Applica prima la trasformazione logaritmica.',
-                    'description': None,
-                    'recommendation': None
-                }), 400
-            df = FileService.load_and_validate(file_record.log_transformed_file_path)
-            prefix = 'log'
-        elif series_type == 'smoothed':
-            if not file_record.smoothed_file_path or not os.path.exists(get_absolute_path(file_record.smoothed_file_path)):
-                return jsonify({
-                    'success': False,
-                    'error': 'Serie smussata non disponibile. Applica prima lo smoothing.',
-                    'description': None,
-                    'recommendation': None
-                }), 400
-            df = FileService.load_and_validate(file_record.smoothed_file_path)
-            prefix = 'smoothed'
-        else:
+        # Se richiesta serie specifica, verifica che la ricetta del file la preveda
+        unavailable = {
+            'diff': 'Serie differenziata non disponibile. Applica prima la differenziazione.',
+            'log': 'Serie trasformata log non disponibile. Applica prima la trasformazione logaritmica.',
+            'smoothed': 'Serie smussata non disponibile. Applica prima lo smoothing.'
+        }
+        if series_type not in unavailable:
             # Default: usa sempre serie originale per l'analisi AI iniziale
-            df = FileService.load_and_validate(file_record.file_path)
-            prefix = 'original'
+            series_type = 'original'
+        file_recipe = TransformRecipe.from_file(file_record)
+        if not file_recipe.has_stage(series_type):
+            return jsonify({
+                'success': False,
+                'error': unavailable[series_type],
+                'description': None,
+                'recommendation': None
+            }), 400
+        recipe = file_recipe.stage(series_type)
+        df = TransformService.frame(file_record, recipe)
         
         # Inizializza servizio AI
         ai_service = AIService()
@@ -783,20 +801,12 @@ def analyze_acf_pacf_ai(file_id):
                 'recommendation': None
             }), 500
         
-        # Genera anche le immagini per visualizzazione (opzionale, per il frontend)
-        acf_path = os.path.join(ai_service.images_folder, f'{file_id}_{prefix}_acf.png')
-        pacf_path = os.path.join(ai_service.images_folder, f'{file_id}_{prefix}_pacf.png')
-        
-        # Genera immagini ACF/PACF solo se non esistono già (per visualizzazione)
-        if not os.path.exists(acf_path) or not os.path.exists(pacf_path):
-            try:
-                acf_path, pacf_path, combined_path = ai_service.generate_acf_pacf_images(
-                    df['y'], 
-                    file_id, 
-                    prefix=prefix
-                )
-            except Exception as e:
-                print(f"Errore nella generazione immagini (non critico): {e}")
+        # Genera anche le immagini per visualizzazione (cache per contenuto: già pronte se
+        # la serie è stata vista, con la stessa ACF/PACF appena calcolata)
+        try:
+            ai_service.generate_acf_pacf_images(df['y'])
+        except Exception as e:
+            print(f"Errore nella generazione immagini (non critico): {e}")
         
         # Analizza con euristica locale usando valori numerici
         from utils import adf_stationarity_test
@@ -844,41 +854,178 @@ def analyze_acf_pacf_ai(file_id):
 # ========== SERVI IMMAGINI AI ==========
 @api.route('/file/<int:file_id>/ai-image/<image_type>', methods=['GET'])
 def get_ai_image(file_id, image_type):
-    """Serve le immagini ACF/PACF generate per l'analisi AI"""
+    """
+    Serve le immagini ACF/PACF della serie (originale o smussata)
+    
+    Le immagini sono indirizzate per contenuto (RenderService): dopo una
+    trasformazione la chiave cambia e l'immagine viene ridisegnata, mai servita obsoleta.
+    """
     from flask import send_file
-    from ai_service import AIService
+    from render_service import RenderService
     
-    ai_service = AIService()
     file_record = File.query.get_or_404(file_id)
     
+    if image_type not in ('acf', 'pacf'):
+        return jsonify({'error': 'Tipo immagine non valido'}), 400
+    
     # Determina prefisso dal query parameter o default
     series_type = request.args.get('series_type', 'original')
+    file_recipe = TransformRecipe.from_file(file_record)
     if series_type == 'smoothed':
-        if not file_record.smoothed_file_path or not os.path.exists(get_absolute_path(file_record.smoothed_file_path)):
+        if not file_recipe.has_stage('smoothed'):
             return jsonify({'error': 'Serie smussata non disponibile'}), 404
         prefix = 'smoothed'
     else:
         # Default: usa smoothed se disponibile, altrimenti original
-        prefix = 'smoothed' if (file_record.smoothed_file_path and os.path.exists(get_absolute_path(file_record.smoothed_file_path))) else 'original'
+        prefix = 'smoothed' if file_recipe.has_stage('smoothed') else 'original'
     
-    # Costruisci path immagine
-    if image_type == 'acf':
-        image_path = os.path.join(ai_service.images_folder, f'{file_id}_{prefix}_acf.png')
-    elif image_type == 'pacf':
-        image_path = os.path.join(ai_service.images_folder, f'{file_id}_{prefix}_pacf.png')
-    else:
-        return jsonify({'error': 'Tipo immagine non valido'}), 400
+    try:
+        values = TransformService.series(file_record, file_recipe.stage(prefix))[1]
+        image_path = RenderService.correlogram(values, image_type)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    if os.path.exists(image_path):
-        return send_file(image_path, mimetype='image/png')
-    else:
-        return jsonify({'error': 'Immagine non trovata'}), 404
+    return send_file(image_path, mimetype='image/png')
 
 # ========== ESEGUI SARIMAX ==========
+def run_fit_sarimax_job(file_id, user_id, model_id, fit_params, sarimax_params, acf_pacf_analyses, extra_configuration=None):
+    """
+    Esegue il fit SARIMAX e registra il ModelRun (eseguita nel pool dei job)
+    
+    Args:
+        file_id: ID del file
+        user_id: utente che ha richiesto il fit
+        model_id: Model creato in stato 'pending' al momento della richiesta
+        fit_params: kwargs per SarimaxService.fit_model (order, seasonal_order, trend, ...)
+        sarimax_params: parametri (p, d, q, P, D, Q, m) come inviati dal client
+        acf_pacf_analyses: analisi ACF/PACF fatte dal frontend
+        extra_configuration: chiavi aggiuntive salvate nella configurazione del ModelRun
+    
+    Returns:
+        dict con model_id, run_id e metriche principali
+    """
+    try:
+        model, fitted_results = SarimaxService.fit_model(file_id=file_id, model_id=model_id, **fit_params)
+    except Exception:
+        # Errore prima dell'inizio del fit (es. file non caricabile): chiudi il ciclo di vita
+        model = db.session.get(Model, model_id)
+        if model and model.status in ('pending', 'running'):
+            model.status = 'failed'
+            db.session.commit()
+        raise
+    
+    file_record = db.session.get(File, file_id)
+    
+    # Calcola train_obs dalle statistiche o dal ratio
+    train_obs = None
+    if file_record.statistics and file_record.statistics.train_obs_count:
+        train_obs = file_record.statistics.train_obs_count
+    elif file_record.train_split_ratio and file_record.n_observations:
+        train_obs = int(file_record.train_split_ratio * file_record.n_observations)
+    
+    # Salva configurazione utilizzata
+    # Filtra solo le analisi non-null (quelle effettivamente calcolate)
+    saved_analyses = {}
+    if acf_pacf_analyses:
+        if acf_pacf_analyses.get('original'):
+            saved_analyses['original'] = acf_pacf_analyses['original']
+        if acf_pacf_analyses.get('smoothed'):
+            saved_analyses['smoothed'] = acf_pacf_analyses['smoothed']
+        if acf_pacf_analyses.get('log'):
+            saved_analyses['log'] = acf_pacf_analyses['log']
+        if acf_pacf_analyses.get('diff'):
+            saved_analyses['diff'] = acf_pacf_analyses['diff']
+    
+    configuration = {
+        'smoothing_window': file_record.smoothing_window,
+        'log_transform': file_record.log_transform,
+        'differencing_order': file_record.differencing_order,
+        'train_obs': train_obs,
+        'sarimax_params': sarimax_params,
+        'trend': fit_params['trend'],
+        'enforce_stationarity': fit_params['enforce_stationarity'],
+        'enforce_invertibility': fit_params['enforce_invertibility'],
+        'cov_type': fit_params['cov_type'],
+        'fit_mode': model.fit_mode,
+        'fit_seconds': model.fit_seconds,
+        'acf_pacf_analyses': saved_analyses  # Salva solo le analisi effettivamente calcolate
+    }
+    if model.cloned_from_model_id:
+        # Risultati copiati da un fit identico già completato (nessuna nuova stima)
+        configuration['cloned_from_model_id'] = model.cloned_from_model_id
+    else:
+        configuration['optimizer'] = {
+            'iterations': model.optimizer_iterations,
+            'warm_start_model_id': model.warm_start_model_id,
+            'iterations_saved_estimate': model.iterations_saved_estimate
+        }
+    if extra_configuration:
+        configuration.update(extra_configuration)
+    
+    # Crea ModelRun (le osservazioni trasformate vengono salvate ora: la serie è
+    # appena stata caricata per il fit, le liste dei modelli non rileggono il file)
+    model_run = ModelRun(
+        model_id=model.model_id,
+        file_id=file_id,
+        user_id=user_id,
+        configuration=json.dumps(configuration),
+        total_obs=get_transformed_observations_count(file_record)
+    )
+    db.session.add(model_run)
+    db.session.commit()
+    
+    # Il paper è sempre disponibile dinamicamente, salviamo l'URL
+    try:
+        model_run.paper_path = f'/paper?run_id={model_run.run_id}'
+        db.session.commit()
+    except Exception as e:
+        from flask import current_app
+        current_app.logger.error(f'Errore salvataggio paper path: {str(e)}')
+        # Non bloccare la risposta se il paper path non viene salvato
+    
+    # Diagnostica dei residui come job separato: il fit è già concluso e il suo
+    # risultato non aspetta i test sui residui
+    residuals_job_id = None
+    from job_service import JobService, JobQueueFullError
+    try:
+        residuals_job_id = JobService.submit('residuals', run_residuals_job, model.model_id,
+                                             user_id=user_id, model_id=model.model_id)['job_id']
+    except JobQueueFullError as e:
+        from flask import current_app
+        current_app.logger.warning(f'Diagnostica residui non accodata (modello {model.model_id}): {str(e)}')
+    
+    return {
+        'model_id': model.model_id,
+        'run_id': model_run.run_id,
+        'residuals_job_id': residuals_job_id,
+        'status': model.status,
+        'order': model.model_order_string,
+        'seasonal_order': model.seasonal_order_string if model.is_seasonal else None,
+        'aic': model.aic,
+        'bic': model.bic,
+        'is_seasonal': model.is_seasonal,
+        'cloned_from_model_id': model.cloned_from_model_id,
+        'optimizer_iterations': model.optimizer_iterations,
+        'warm_start_model_id': model.warm_start_model_id,
+        'iterations_saved_estimate': model.iterations_saved_estimate,
+        'fit_mode': model.fit_mode,
+        'fit_seconds': model.fit_seconds
+    }
+
+def run_residuals_job(model_id):
+    """Diagnostica dei residui di un modello stimato (eseguita nel pool dei job)"""
+    return ResidualService.to_dict(ResidualService.compute(model_id))
+
 @api.route('/file/<int:file_id>/fit-sarimax', methods=['POST'])
 @login_required
 def fit_sarimax(file_id):
-    """Addestra modello SARIMAX con parametri specificati manualmente"""
+    """
+    Addestra modello SARIMAX con parametri specificati manualmente
+    
+    Il fit viene accodato nel pool dei job: la risposta (202) contiene job_id e
+    model_id, lo stato si segue con GET /api/jobs/<job_id>.
+    Con "async": false nel body il fit viene eseguito nella richiesta (200).
+    """
     file_record = File.query.get_or_404(file_id)
     
     # Verifica che il file appartenga all'utente corrente
@@ -910,6 +1057,8 @@ def fit_sarimax(file_id):
         enforce_stationarity = data.get('enforce_stationarity', True)
         enforce_invertibility = data.get('enforce_invertibility', True)
         cov_type = data.get('cov_type', 'robust_approx')
+        # 'fast': solo stime puntuali, diagnostica poi con POST /model/<id>/diagnostics
+        fit_mode = data.get('fit_mode', 'full')
         
         # Gestisci AR selettivo
         if isinstance(data.get('p'), list):
@@ -930,95 +1079,384 @@ def fit_sarimax(file_id):
             seasonal_order = (P, D, Q, m)
         else:
             seasonal_order = (0, 0, 0, 0)
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': f'Parametri non validi: {str(e)}'}), 400
+    
+    if fit_mode not in ('full', 'fast'):
+        return jsonify({'error': "fit_mode deve essere 'full' o 'fast'"}), 400
+    
+    fit_params = {
+        'order': order,
+        'seasonal_order': seasonal_order,
+        'trend': trend_param,
+        'enforce_stationarity': enforce_stationarity,
+        'enforce_invertibility': enforce_invertibility,
+        'cov_type': cov_type,
+        'fit_mode': fit_mode
+    }
+    sarimax_params = {'p': p, 'd': d, 'q': q, 'P': P, 'D': D, 'Q': Q, 'm': m}
+    # Recupera le analisi ACF/PACF fatte dal frontend (se inviate)
+    acf_pacf_analyses = data.get('acf_pacf_analyses', {})
+    
+    try:
+        # Il Model esiste da subito in stato 'pending': il suo status segue il job
+        model = SarimaxService.create_pending_model(file_id)
+        job_args = (file_id, current_user.user_id, model.model_id, fit_params, sarimax_params, acf_pacf_analyses)
         
-        # Addestra modello SARIMAX
-        model, fitted_results = SarimaxService.fit_model(
-            file_id=file_id,
-            order=order,
-            seasonal_order=seasonal_order,
-            trend=trend_param,
-            enforce_stationarity=enforce_stationarity,
-            enforce_invertibility=enforce_invertibility,
-            cov_type=cov_type
-        )
-        
-        # Calcola train_obs dalle statistiche o dal ratio
-        train_obs = None
-        if file_record.statistics and file_record.statistics.train_obs_count:
-            train_obs = file_record.statistics.train_obs_count
-        elif file_record.train_split_ratio and file_record.n_observations:
-            train_obs = int(file_record.train_split_ratio * file_record.n_observations)
-        
-        # Salva configurazione utilizzata
-        # Recupera le analisi ACF/PACF fatte dal frontend (se inviate)
-        acf_pacf_analyses = data.get('acf_pacf_analyses', {})
-        # Filtra solo le analisi non-null (quelle effettivamente calcolate)
-        saved_analyses = {}
-        if acf_pacf_analyses:
-            if acf_pacf_analyses.get('original'):
-                saved_analyses['original'] = acf_pacf_analyses['original']
-            if acf_pacf_analyses.get('smoothed'):
-                saved_analyses['smoothed'] = acf_pacf_analyses['smoothed']
-            if acf_pacf_analyses.get('log'):
-                saved_analyses['log'] = acf_pacf_analyses['log']
-            if acf_pacf_analyses.get('diff'):
-                saved_analyses['diff'] = acf_pacf_analyses['diff']
-        
-        configuration = {
-            'smoothing_window': file_record.smoothing_window,
-            'log_transform': file_record.log_transform,
-            'differencing_order': file_record.differencing_order,
-            'train_obs': train_obs,
-            'sarimax_params': {
-                'p': p,
-                'd': d,
-                'q': q,
-                'P': P,
-                'D': D,
-                'Q': Q,
-                'm': m
-            },
-            'trend': trend_param,
-            'enforce_stationarity': enforce_stationarity,
-            'enforce_invertibility': enforce_invertibility,
-            'cov_type': cov_type,
-            'acf_pacf_analyses': saved_analyses  # Salva solo le analisi effettivamente calcolate
-        }
-        
-        # Crea ModelRun
-        model_run = ModelRun(
-            model_id=model.model_id,
-            file_id=file_id,
-            user_id=current_user.user_id,
-            configuration=json.dumps(configuration)
-        )
-        db.session.add(model_run)
-        db.session.commit()
+        if data.get('async', True) is False:
+            return jsonify(run_fit_sarimax_job(*job_args)), 200
         
-        # Il paper è sempre disponibile dinamicamente, salviamo l'URL
+        from job_service import JobService, JobQueueFullError
         try:
-            model_run.paper_path = f'/paper?run_id={model_run.run_id}'
+            job = JobService.submit('fit_sarimax', run_fit_sarimax_job, *job_args,
+                                    user_id=current_user.user_id, model_id=model.model_id)
+        except JobQueueFullError as e:
+            model.status = 'failed'
             db.session.commit()
-        except Exception as e:
-            from flask import current_app
-            current_app.logger.error(f'Errore salvataggio paper path: {str(e)}')
-            # Non bloccare la risposta se il paper path non viene salvato
+            return jsonify({'error': str(e)}), 503
         
         return jsonify({
+            'job_id': job['job_id'],
             'model_id': model.model_id,
-            'run_id': model_run.run_id,
             'status': model.status,
-            'order': model.model_order_string,
-            'seasonal_order': model.seasonal_order_string if model.is_seasonal else None,
-            'aic': model.aic,
-            'bic': model.bic,
-            'is_seasonal': model.is_seasonal
-        }), 200
+            'job_status': job['status'],
+            'status_url': f"/api/jobs/{job['job_id']}"
+        }), 202
     except Exception as e:
         import traceback
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+# ========== SELEZIONE AUTOMATICA ORDINE ==========
+def run_auto_select_job(file_id, user_id, model_id, options):
+    """
+    Cerca il miglior ordine SARIMAX e stima (e salva) solo il vincente
+    
+    La classifica compatta dei candidati viene salvata nella configurazione
+    del ModelRun ('auto_select').
+    """
+    import time
+    from order_search import OrderSearch, estimate_differencing
+    
+    started = time.time()
+    model = db.session.get(Model, model_id)
+    try:
+        model.status = 'running'
+        db.session.commit()
+        
+        file_record = db.session.get(File, file_id)
+        train_df, test_df = SarimaxService.load_train_test(file_record)
+        train_values = train_df['y'].to_numpy(dtype=float)
+        test_values = test_df['y'].to_numpy(dtype=float)
+        
+        search = OrderSearch(
+            train_values, test_values,
+            trend=options['trend'],
+            enforce_stationarity=options['enforce_stationarity'],
+            enforce_invertibility=options['enforce_invertibility'],
+            rank_by=options['rank_by'],
+            n_jobs=options['n_jobs'],
+            candidate_timeout=options['candidate_timeout'],
+            time_budget=options['time_budget'],
+            mp_context=Config.AUTO_SELECT_MP_CONTEXT
+        )
+        
+        if options['mode'] == 'stepwise':
+            d = options['d'] if options['d'] != 'auto' else estimate_differencing(train_values)
+            best = search.run_stepwise(
+                d=d, D=options['D'], m=options['m'],
+                max_p=options['max_p'], max_q=options['max_q'],
+                max_P=options['max_P'], max_Q=options['max_Q'],
+                max_order=options['max_order']
+            )
+        else:
+            candidates, pruned = OrderSearch.grid_candidates(
+                max_p=options['max_p'], max_d=options['max_d'], max_q=options['max_q'],
+                m=options['m'], max_P=options['max_P'], max_D=options['max_D'],
+                max_Q=options['max_Q'], max_order=options['max_order']
+            )
+            # Dimensione della griglia già verificata da auto_select_model
+            search.pruned = pruned
+            best = search.run_grid(candidates)
+        
+        if best is None:
+            raise ValueError('Nessun candidato stimato con successo entro i limiti di tempo')
+    except Exception:
+        if model.status in ('pending', 'running'):
+            model.status = 'failed'
+            db.session.commit()
+        raise
+    
+    p, d, q = best['order']
+    P, D, Q, m = best['seasonal_order']
+    fit_params = {
+        'order': (p, d, q),
+        'seasonal_order': (P, D, Q, m),
+        'trend': options['trend'],
+        'enforce_stationarity': options['enforce_stationarity'],
+        'enforce_invertibility': options['enforce_invertibility'],
+        'cov_type': options['cov_type']
+    }
+    auto_select = {
+        'mode': options['mode'],
+        'rank_by': options['rank_by'],
+        'search_seconds': time.time() - started,
+        **search.summary(),
+        'leaderboard': [
+            {k: r[k] for k in ('order', 'seasonal_order', 'aic', 'bic', 'test_r2', 'test_mape', 'test_score')}
+            for r in search.leaderboard(size=options['leaderboard_size'])
+        ]
+    }
+    result = run_fit_sarimax_job(
+        file_id, user_id, model_id, fit_params,
+        {'p': p, 'd': d, 'q': q, 'P': P, 'D': D, 'Q': Q, 'm': m},
+        {}, extra_configuration={'auto_select': auto_select}
+    )
+    result['auto_select'] = auto_select
+    return result
+
+@api.route('/file/<int:file_id>/auto-select', methods=['POST'])
+@login_required
+def auto_select_model(file_id):
+    """
+    Selezione automatica del miglior modello SARIMAX (griglia o stepwise)
+    
+    Body JSON (tutti opzionali): mode ('grid' | 'stepwise'), rank_by ('test_score' | 'aic'),
+    max_p, max_d, max_q, d (stepwise, intero o 'auto'), m, max_P, max_D, max_Q, D,
+    max_order, trend, candidate_timeout, time_budget (secondi), n_jobs, leaderboard_size.
+    La ricerca gira come job: la risposta (202) contiene job_id e model_id.
+    """
+    file_record = File.query.get_or_404(file_id)
+    
+    if file_record.user_id != current_user.user_id:
+        return jsonify({'error': 'Non autorizzato ad accedere a questo file'}), 403
+    
+    if file_record.train_start_date is None:
+        return jsonify({'error': 'Split non ancora applicato. Applica prima lo split.'}), 400
+    
+    data = request.json or {}
+    try:
+        d_value = data.get('d', 0)
+        options = {
+            'mode': data.get('mode', 'grid'),
+            'rank_by': data.get('rank_by', 'test_score'),
+            'max_p': int(data.get('max_p', 3)),
+            'max_d': int(data.get('max_d', 1)),
+            'max_q': int(data.get('max_q', 3)),
+            'd': d_value if d_value == 'auto' else int(d_value),
+            'm': int(data.get('m', 0)),
+            'max_P': int(data.get('max_P', 1)),
+            'max_D': int(data.get('max_D', 1)),
+            'max_Q': int(data.get('max_Q', 1)),
+            'D': int(data.get('D', 0)),
+            'max_order': int(data.get('max_order', 6)),
+            'trend': data.get('trend', 'n') if data.get('trend', 'n') in ['n', 'c', 't', 'ct'] else 'n',
+            'enforce_stationarity': data.get('enforce_stationarity', True),
+            'enforce_invertibility': data.get('enforce_invertibility', True),
+            'cov_type': data.get('cov_type', 'robust_approx'),
+            'candidate_timeout': min(float(data.get('candidate_timeout', Config.AUTO_SELECT_CANDIDATE_TIMEOUT)), Config.AUTO_SELECT_TIME_BUDGET),
+            'time_budget': min(float(data.get('time_budget', Config.AUTO_SELECT_TIME_BUDGET)), Config.AUTO_SELECT_TIME_BUDGET),
+            'n_jobs': max(1, min(int(data.get('n_jobs', Config.AUTO_SELECT_WORKERS)), Config.AUTO_SELECT_WORKERS)),
+            'leaderboard_size': max(1, min(int(data.get('leaderboard_size', 10)), 50))
+        }
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': f'Parametri non validi: {str(e)}'}), 400
+    
+    if options['mode'] not in ('grid', 'stepwise'):
+        return jsonify({'error': "mode deve essere 'grid' o 'stepwise'"}), 400
+    if options['rank_by'] not in ('test_score', 'aic'):
+        return jsonify({'error': "rank_by deve essere 'test_score' o 'aic'"}), 400
+    if min(options['max_p'], options['max_d'], options['max_q'], options['max_P'], options['max_D'], options['max_Q'],
+           options['max_order'], options['m'], options['D']) < 0:
+        return jsonify({'error': 'Ordini massimi, max_order, m e D devono essere >= 0'}), 400
+    if options['d'] != 'auto' and options['d'] < 0:
+        return jsonify({'error': "d deve essere >= 0 o 'auto'"}), 400
+    # not (x > 0) scarta anche NaN
+    if not options['candidate_timeout'] > 0 or not options['time_budget'] > 0:
+        return jsonify({'error': 'candidate_timeout e time_budget devono essere > 0'}), 400
+    
+    # Griglia troppo ampia: errore subito, senza creare il Model né accodare il job
+    if options['mode'] == 'grid':
+        from order_search import OrderSearch
+        candidates, _ = OrderSearch.grid_candidates(
+            max_p=options['max_p'], max_d=options['max_d'], max_q=options['max_q'],
+            m=options['m'], max_P=options['max_P'], max_D=options['max_D'],
+            max_Q=options['max_Q'], max_order=options['max_order']
+        )
+        if len(candidates) > Config.AUTO_SELECT_MAX_CANDIDATES:
+            return jsonify({
+                'error': f'Spazio di ricerca troppo ampio ({len(candidates)} candidati, '
+                         f'massimo {Config.AUTO_SELECT_MAX_CANDIDATES})'
+            }), 400
+        if not candidates:
+            return jsonify({'error': 'Nessun candidato nella griglia con questi limiti'}), 400
+    
+    from job_service import JobService, JobQueueFullError
+    model = SarimaxService.create_pending_model(file_id)
+    try:
+        job = JobService.submit('auto_select', run_auto_select_job, file_id, current_user.user_id,
+                                model.model_id, options, user_id=current_user.user_id, model_id=model.model_id)
+    except JobQueueFullError as e:
+        model.status = 'failed'
+        db.session.commit()
+        return jsonify({'error': str(e)}), 503
+    
+    return jsonify({
+        'job_id': job['job_id'],
+        'model_id': model.model_id,
+        'status': model.status,
+        'job_status': job['status'],
+        'status_url': f"/api/jobs/{job['job_id']}"
+    }), 202
+
+# ========== BACKTEST WALK-FORWARD ==========
+def load_backtest_series(model_run):
+    """
+    Serie del backtest di un ModelRun
+    
+    Returns:
+        (configuration, values, n_train): configurazione del run, serie trasformata
+        con la ricetta salvata nel run e osservazioni del train calcolate con la
+        regola di split di load_train_test (i parametri salvati sono stimati lì)
+    """
+    configuration = json.loads(model_run.configuration) if model_run.configuration else {}
+    recipe = TransformRecipe.from_config(configuration)
+    values = TransformService.series(model_run.file, recipe)[1]
+    return configuration, values, SarimaxService.train_obs_count(model_run.file, len(values))
+
+def run_backtest_job(run_id, options):
+    """
+    Backtest rolling origin del modello di un ModelRun (eseguita nel pool dei job)
+    
+    La serie è quella trasformata con la ricetta salvata nel run; il risultato
+    viene salvato nella configurazione del ModelRun ('backtest').
+    """
+    from backtest import Backtest
+    
+    model_run = db.session.get(ModelRun, run_id)
+    configuration, values, n_train = load_backtest_series(model_run)
+    spec = SarimaxService.model_spec(model_run.model, configuration)
+    initial = options['initial'] or n_train
+    saved_params = None
+    if initial == n_train and model_run.model.estimated_params:
+        saved_params = json.loads(model_run.model.estimated_params)
+    
+    backtest = Backtest(
+        values, spec,
+        horizon=options['horizon'],
+        initial=initial,
+        step=options['step'],
+        max_origins=options['max_origins'],
+        window=options['window'],
+        window_size=options['window_size'],
+        param_mode=options['params'],
+        refit_every=options['refit_every'],
+        n_jobs=options['n_jobs'],
+        mp_context=Config.AUTO_SELECT_MP_CONTEXT
+    )
+    result = backtest.run(saved_params)
+    
+    configuration['backtest'] = result
+    model_run.configuration = json.dumps(configuration)
+    db.session.commit()
+    return {'run_id': run_id, 'model_id': model_run.model_id, 'backtest': result}
+
+@api.route('/model-run/<int:run_id>/backtest', methods=['POST'])
+@login_required
+def backtest_model_run(run_id):
+    """
+    Backtest walk-forward (rolling origin) di un modello stimato
+    
+    Body JSON (tutti opzionali): horizon, initial (osservazioni alla prima origine,
+    default: quelle del train), step, max_origins, window ('expanding' | 'sliding'),
+    window_size, params ('fixed' | 'warm'), refit_every, n_jobs.
+    Il backtest gira come job: la risposta (202) contiene job_id; il risultato
+    (MAE/RMSE/MAPE per orizzonte) viene salvato nella configurazione del run.
+    """
+    from backtest import WINDOW_MODES, PARAM_MODES
+    model_run = ModelRun.query.get_or_404(run_id)
+    
+    if model_run.user_id != current_user.user_id:
+        return jsonify({'error': 'Non autorizzato'}), 403
+    
+    if model_run.model.status != 'completed':
+        return jsonify({'error': 'Il modello non è stato stimato con successo'}), 400
+    
+    data = request.json or {}
+    try:
+        options = {
+            'horizon': int(data.get('horizon', 1)),
+            'initial': int(data['initial']) if data.get('initial') is not None else None,
+            'step': int(data.get('step', 1)),
+            'max_origins': max(1, min(int(data.get('max_origins', 200)), Config.BACKTEST_MAX_ORIGINS)),
+            'window': data.get('window', 'expanding'),
+            'window_size': int(data['window_size']) if data.get('window_size') is not None else None,
+            'params': data.get('params', 'fixed'),
+            'refit_every': int(data.get('refit_every', 10)),
+            'n_jobs': max(1, min(int(data.get('n_jobs', Config.BACKTEST_WORKERS)), Config.BACKTEST_WORKERS))
+        }
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': f'Parametri non validi: {str(e)}'}), 400
+    
+    if not 1 <= options['horizon'] <= Config.BACKTEST_MAX_HORIZON:
+        return jsonify({'error': f'horizon deve essere tra 1 e {Config.BACKTEST_MAX_HORIZON}'}), 400
+    if options['step'] < 1 or options['refit_every'] < 1:
+        return jsonify({'error': 'step e refit_every devono essere >= 1'}), 400
+    if options['initial'] is not None and options['initial'] < 2:
+        return jsonify({'error': 'initial deve essere >= 2'}), 400
+    if options['window_size'] is not None and options['window_size'] < 2:
+        return jsonify({'error': 'window_size deve essere >= 2'}), 400
+    if options['window'] not in WINDOW_MODES:
+        return jsonify({'error': f"window deve essere uno tra {', '.join(WINDOW_MODES)}"}), 400
+    if options['params'] not in PARAM_MODES:
+        return jsonify({'error': f"params deve essere uno tra {', '.join(PARAM_MODES)}"}), 400
+    if model_run.model.p is None:
+        return jsonify({'error': 'Backtest non disponibile per modelli con AR selettivo'}), 400
+    
+    # Limiti rispetto alla lunghezza della serie: errore subito invece che nel job
+    try:
+        _, values, n_train = load_backtest_series(model_run)
+    except Exception as e:
+        return jsonify({'error': f'Errore nel caricamento della serie: {str(e)}'}), 500
+    n_total = len(values)
+    initial = options['initial'] or n_train
+    if initial + options['horizon'] > n_total:
+        return jsonify({'error': f"initial + horizon ({initial} + {options['horizon']}) supera "
+                                 f"le osservazioni della serie ({n_total})"}), 400
+    if options['window_size'] is not None and options['window_size'] > n_total:
+        return jsonify({'error': f'window_size deve essere al massimo {n_total}'}), 400
+    
+    from job_service import JobService, JobQueueFullError
+    try:
+        job = JobService.submit('backtest', run_backtest_job, run_id, options,
+                                user_id=current_user.user_id, model_id=model_run.model_id)
+    except JobQueueFullError as e:
+        return jsonify({'error': str(e)}), 503
+    
+    return jsonify({
+        'job_id': job['job_id'],
+        'run_id': run_id,
+        'model_id': model_run.model_id,
+        'job_status': job['status'],
+        'status_url': f"/api/jobs/{job['job_id']}"
+    }), 202
+
+# ========== STATO JOB ==========
+@api.route('/jobs/<job_id>', methods=['GET'])
+@login_required
+def get_job_status(job_id):
+    """Stato di un job asincrono: queued, running, completed, failed (con tempi)"""
+    from job_service import JobService
+    job = JobService.get(job_id)
+    if job is None or job['user_id'] != current_user.user_id:
+        return jsonify({'error': 'Job non trovato'}), 404
+    
+    # Lo stato del Model è la fonte persistente del ciclo di vita del fit
+    if job['model_id'] is not None:
+        model = db.session.get(Model, job['model_id'])
+        job['model_status'] = model.status if model else None
+    return jsonify(job), 200
+
 # ========== GET RISULTATI ==========
 @api.route('/file/<int:file_id>/model', methods=['GET'])
 @login_required
@@ -1093,28 +1531,123 @@ def get_model(file_id):
         'model_summary': model.model_summary,
         'config_info': config_info,  # Aggiunto informazioni di configurazione
         'metrics': metrics,
-        'forecasts_count': len(model.forecasts) if model.forecasts else 0
+        'fit_mode': model.fit_mode,
+        'fit_seconds': model.fit_seconds,
+        'diagnostics_seconds': model.diagnostics_seconds,
+        'forecasts_count': ForecastSeriesStore.count(model.model_id)
     }), 200
 
 @api.route('/model/<int:model_id>/forecasts', methods=['GET'])
 def get_forecasts(model_id):
-    """Ottiene previsioni di un modello"""
+    """Ottiene previsioni di un modello (finestra start/end, decimate a max_points, default 2000)"""
     model = Model.query.get_or_404(model_id)
-    forecasts = model.forecasts
+    try:
+        window_params = parse_series_window_params(default_max_points=2000)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    return jsonify({
-        'forecasts': [
-            {
-                'date': fc.forecast_date.isoformat() if isinstance(fc.forecast_date, datetime) else str(fc.forecast_date),
-                'forecasted': fc.forecasted_value,
-                'actual': fc.actual_value,
-                'ci_lower': fc.ci_lower,
-                'ci_upper': fc.ci_upper,
-                'category': fc.category
-            }
-            for fc in forecasts
-        ]
-    }), 200
+    series = ForecastSeriesStore.load(model.model_id)
+    columns, window = series_window(ForecastSeriesStore.to_columns(series, include_category=True),
+                                    key='forecasted', **window_params)
+    
+    return json_response({
+        'forecasts': series_payload(columns),
+        'window': window
+    })
+
+@api.route('/model/<int:model_id>/forecast', methods=['POST'])
+@login_required
+def forecast_future(model_id):
+    """
+    Previsione oltre la fine della serie con i parametri già stimati (nessun nuovo fit)
+    
+    Parametri (query string o body JSON): steps (default 12), levels (percentuali,
+    default '80,95'), original_scale (default true: inverte log e differenze).
+    Le previsioni vengono salvate come categoria 'future' (scala trasformata).
+    """
+    from forecast_service import ForecastService, parse_levels
+    model = Model.query.get_or_404(model_id)
+    
+    if model.file is None or model.file.user_id != current_user.user_id:
+        return jsonify({'error': 'Non autorizzato ad accedere a questo modello'}), 403
+    
+    if model.status != 'completed':
+        return jsonify({'error': 'Il modello non è stato stimato con successo'}), 400
+    
+    data = request.get_json(silent=True) or {}
+    param = lambda name, default: request.args.get(name, data.get(name, default))
+    try:
+        steps = int(param('steps', 12))
+        levels = parse_levels(param('levels', '80,95'))
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': f'Parametri non validi: {str(e)}'}), 400
+    original_scale = str(param('original_scale', 'true')).lower() not in ('false', '0', 'no')
+    
+    if not 1 <= steps <= Config.FORECAST_MAX_STEPS:
+        return jsonify({'error': f'steps deve essere tra 1 e {Config.FORECAST_MAX_STEPS}'}), 400
+    
+    try:
+        result = ForecastService.forecast(model, steps, levels, original_scale=original_scale)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    transformed = result.pop('transformed')
+    ForecastService.save_future(model_id, result['dates'], transformed['forecast'],
+                                transformed['ci_lower'], transformed['ci_upper'])
+    
+    result['dates'] = series_columns(result['dates'])['dates']
+    return json_response(result)
+
+@api.route('/model/<int:model_id>/diagnostics', methods=['POST'])
+@login_required
+def compute_model_diagnostics(model_id):
+    """
+    Diagnostica di un modello stimato in modalità 'fast' (o ricalcolo per un altro cov_type)
+    
+    Calcola errori standard, p-value, intervalli dei coefficienti, summary e test
+    sui residui (Ljung-Box, Jarque-Bera, eteroschedasticità) dai parametri salvati,
+    senza ristimare il modello. Body JSON opzionale: cov_type.
+    """
+    model = Model.query.get_or_404(model_id)
+    
+    if model.file is None or model.file.user_id != current_user.user_id:
+        return jsonify({'error': 'Non autorizzato ad accedere a questo modello'}), 403
+    
+    if model.status != 'completed':
+        return jsonify({'error': 'Il modello non è stato stimato con successo'}), 400
+    
+    data = request.get_json(silent=True) or {}
+    try:
+        return jsonify(SarimaxService.compute_diagnostics(model, cov_type=data.get('cov_type'))), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@api.route('/model/<int:model_id>/residuals', methods=['GET'])
+@login_required
+def get_model_residuals(model_id):
+    """
+    Diagnostica dei residui di train: statistiche, ACF, Ljung-Box per più lag e Jarque-Bera
+    
+    Di norma calcolata dal job 'residuals' accodato dopo il fit; se manca
+    (modelli stimati prima del job o coda piena) viene calcolata ora e salvata.
+    """
+    model = Model.query.get_or_404(model_id)
+    
+    if model.file is None or model.file.user_id != current_user.user_id:
+        return jsonify({'error': 'Non autorizzato ad accedere a questo modello'}), 403
+    
+    if model.status != 'completed':
+        return jsonify({'error': 'Il modello non è stato stimato con successo'}), 400
+    
+    residuals = model.residuals
+    if residuals is None or residuals.computed_at is None:
+        try:
+            residuals = ResidualService.compute(model_id)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if residuals is None:
+            return jsonify({'error': 'Previsioni di train non disponibili per il modello'}), 400
+    return jsonify(ResidualService.to_dict(residuals)), 200
 
 @api.route('/model/<int:model_id>/results', methods=['GET'])
 @login_required
@@ -1218,7 +1751,10 @@ def get_model_results(model_id):
             'config_info': config_info,
             'sarimax_params': sarimax_params,
             'metrics': metrics,
-            'forecasts_count': len(model.forecasts) if model.forecasts else 0
+            'fit_mode': model.fit_mode,
+            'fit_seconds': model.fit_seconds,
+            'diagnostics_seconds': model.diagnostics_seconds,
+            'forecasts_count': ForecastSeriesStore.count(model.model_id)
         }), 200
     except Exception as e:
         import traceback
@@ -1229,7 +1765,12 @@ def get_model_results(model_id):
 @api.route('/model/<int:model_id>/forecasts-chart', methods=['GET'])
 @login_required
 def get_forecasts_for_chart(model_id):
-    """Ottiene previsioni organizzate per grafici (train vs test)"""
+    """
+    Ottiene previsioni organizzate per grafici (train vs test)
+    
+    Ogni serie è limitata alla finestra start/end e decimata a max_points
+    (default 2000) scegliendo i punti sui valori osservati.
+    """
     model = Model.query.get_or_404(model_id)
     
     # Verifica che il modello appartenga all'utente corrente
@@ -1237,36 +1778,30 @@ def get_forecasts_for_chart(model_id):
     if not file_record or file_record.user_id != current_user.user_id:
         return jsonify({'error': 'Non autorizzato ad accedere a questo modello'}), 403
     
-    forecasts = model.forecasts
-    
-    # Separa training e test
-    train_data = []
-    test_data = []
+    try:
+        window_params = parse_series_window_params(default_max_points=2000)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    for fc in forecasts:
-        forecast_item = {
-            'date': fc.forecast_date.isoformat() if isinstance(fc.forecast_date, datetime) else str(fc.forecast_date),
-            'forecasted': fc.forecasted_value,
-            'actual': fc.actual_value,
-            'ci_lower': fc.ci_lower,
-            'ci_upper': fc.ci_upper
-        }
-        
-        if fc.category == 'train':
-            train_data.append(forecast_item)
-        elif fc.category == 'test':
-            test_data.append(forecast_item)
+    # Un solo fetch della serie colonnare, separata in training e test
+    series = ForecastSeriesStore.load(model.model_id)
+    train_data, train_window = series_window(ForecastSeriesStore.to_columns(series, category='train'),
+                                             key='actual', **window_params)
+    test_data, test_window = series_window(ForecastSeriesStore.to_columns(series, category='test'),
+                                           key='actual', **window_params)
     
-    return jsonify({
+    return json_response({
         'training': {
-            'data': train_data,
+            'data': series_payload(train_data),
+            'window': train_window,
             'label': 'Training Set'
         },
         'test': {
-            'data': test_data,
+            'data': series_payload(test_data),
+            'window': test_window,
             'label': 'Test Set'
         }
-    }), 200
+    })
 
 # ========== STATISTICHE ==========
 @api.route('/file/<int:file_id>/statistics', methods=['GET'])
@@ -1296,12 +1831,135 @@ def get_statistics(file_id):
 
 # Export PDF rimosso come richiesto
 
+# ========== CACHE DI PROCESSO ==========
+@api.route('/system/cache-stats', methods=['GET'])
+@login_required
+def get_cache_stats():
+    """Statistiche (hit/miss/evictions, byte occupati) delle cache del worker corrente"""
+    from cache import all_cache_stats
+    return jsonify({'pid': os.getpid(), 'caches': all_cache_stats()}), 200
+
+# ========== PAGINAZIONE LISTE ==========
+# Massimo di righe per pagina accettato dal parametro 'limit'
+MAX_PAGE_SIZE = 500
+
+def parse_date_param(name, end_of_day=False):
+    """
+    Data ISO 8601 dalla query string (None se assente)
+    
+    Con end_of_day una data senza ora diventa l'inizio del giorno successivo,
+    da usare come limite escluso: '2024-01-31' include tutto il 31 gennaio.
+    
+    Raises:
+        ValueError: data non valida (messaggio per il client)
+    """
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'{name} deve essere una data ISO 8601 (es. 2024-01-31)')
+    if end_of_day and len(value) == 10:
+        parsed = parsed + pd.Timedelta(days=1)
+    return parsed
+
+def parse_listing_params(sort_keys, default_sort):
+    """
+    Legge dalla query string i parametri comuni delle liste paginate
+    
+    Parametri: sort (una delle sort_keys), direction ('asc'/'desc', default della chiave),
+    limit (righe per pagina; assente = tutte le righe), cursor (next_cursor della
+    pagina precedente), date_from/date_to (ISO 8601; una data senza ora in date_to
+    include l'intero giorno).
+    
+    Returns:
+        dict con sort, descending, limit, cursor, date_from, date_to
+    
+    Raises:
+        ValueError: parametro non valido (messaggio per il client)
+    """
+    sort = request.args.get('sort', default_sort)
+    if sort not in sort_keys:
+        raise ValueError(f"sort deve essere uno tra: {', '.join(sort_keys)}")
+    
+    direction = request.args.get('direction')
+    if direction is None:
+        descending = sort_keys[sort]['descending']
+    elif direction in ('asc', 'desc'):
+        descending = direction == 'desc'
+    else:
+        raise ValueError("direction deve essere 'asc' o 'desc'")
+    
+    limit = request.args.get('limit')
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise ValueError('limit deve essere un intero')
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            raise ValueError(f'limit deve essere compreso tra 1 e {MAX_PAGE_SIZE}')
+    
+    return {
+        'sort': sort,
+        'descending': descending,
+        'limit': limit,
+        'cursor': request.args.get('cursor') or None,
+        'date_from': parse_date_param('date_from'),
+        'date_to': parse_date_param('date_to', end_of_day=True)
+    }
+
+def normalize_order_param(value):
+    """'1,0,1' o '(1, 0, 1)' -> '(1, 0, 1)', il formato di Model.model_order_string"""
+    parts = [p.strip() for p in value.strip().strip('()').split(',')]
+    if parts and all(p.lstrip('-').isdigit() for p in parts):
+        return '(' + ', '.join(str(int(p)) for p in parts) + ')'
+    return value
+
 # ========== LISTA FILE UTENTE ==========
+FILE_SORT_KEYS = {
+    'uploaded_at': {'column': File.uploaded_at, 'descending': True, 'nullable': False, 'get': lambda f: f.uploaded_at},
+    'file_name': {'column': File.file_name, 'descending': False, 'nullable': False, 'get': lambda f: f.file_name},
+    'n_observations': {'column': File.n_observations, 'descending': True, 'nullable': True, 'get': lambda f: f.n_observations}
+}
+
 @api.route('/user/files', methods=['GET'])
 @login_required
+@query_budget(2)
 def get_user_files():
-    """Ottiene tutti i file caricati dall'utente corrente"""
-    files = File.query.filter_by(user_id=current_user.user_id).order_by(File.uploaded_at.desc()).all()
+    """
+    Ottiene i file caricati dall'utente corrente
+    
+    Senza 'limit' restituisce tutti i file; con 'limit' pagina a cursore
+    (vedi parse_listing_params): sort = uploaded_at | file_name | n_observations.
+    """
+    try:
+        params = parse_listing_params(FILE_SORT_KEYS, 'uploaded_at')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    query = File.query.filter_by(user_id=current_user.user_id)
+    if params['date_from']:
+        query = query.filter(File.uploaded_at >= params['date_from'])
+    if params['date_to']:
+        query = query.filter(File.uploaded_at < params['date_to'])
+    
+    sort_key = FILE_SORT_KEYS[params['sort']]
+    try:
+        files, next_cursor = keyset_page(
+            query, params['sort'], sort_key['column'], File.file_id,
+            descending=params['descending'], limit=params['limit'], cursor=params['cursor'],
+            nullable=sort_key['nullable'], value_getter=sort_key['get'], id_getter=lambda f: f.file_id
+        )
+    except CursorError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # File con un modello associato, in una sola query (invece di caricare file.model per ogni file)
+    files_with_model = {
+        row[0] for row in db.session.query(Model.file_id)
+        .filter(Model.file_id.in_([f.file_id for f in files]))
+        .distinct()
+    } if files else set()
     
     files_data = []
     for file in files:
@@ -1310,10 +1968,10 @@ def get_user_files():
             'file_name': file.file_name,
             'n_observations': file.n_observations,
             'uploaded_at': file.uploaded_at.isoformat() if file.uploaded_at else None,
-            'has_model': file.model is not None
+            'has_model': file.file_id in files_with_model
         })
     
-    return jsonify({'files': files_data}), 200
+    return jsonify({'files': files_data, 'next_cursor': next_cursor}), 200
 
 # ========== LISTA MODELLI PROVATI ==========
 def get_transformed_observations_count(file_record, transform_config=None):
@@ -1333,45 +1991,11 @@ def get_transformed_observations_count(file_record, transform_config=None):
         from flask import current_app
         
         # Usa configurazione fornita o quella del file_record
-        smoothing_window = transform_config.get('smoothing_window') if transform_config else file_record.smoothing_window
-        log_transform = transform_config.get('log_transform') if transform_config else file_record.log_transform
-        differencing_order = transform_config.get('differencing_order') if transform_config else file_record.differencing_order
-        
-        # Determina quale file usare (catena: smoothing -> log -> diff)
-        # L'ordine di applicazione è: smoothing -> log -> diff
-        # Quindi per il conteggio usiamo: diff se presente, altrimenti log, altrimenti smoothed, altrimenti original
-        file_path = None
-        
-        # Controlla differencing (ultima trasformazione applicata)
-        if differencing_order and differencing_order > 0:
-            if file_record.differenced_file_path and os.path.exists(get_absolute_path(file_record.differenced_file_path)):
-                file_path = file_record.differenced_file_path
-                current_app.logger.debug(f'Usando file differenziato: {file_path} (order={differencing_order})')
-        
-        # Se non c'è differencing, controlla log transform
-        if not file_path and log_transform:
-            if file_record.log_transformed_file_path and os.path.exists(get_absolute_path(file_record.log_transformed_file_path)):
-                file_path = file_record.log_transformed_file_path
-                current_app.logger.debug(f'Usando file log trasformato: {file_path}')
-        
-        # Se non c'è log, controlla smoothing
-        if not file_path and smoothing_window and smoothing_window > 1:
-            if file_record.smoothed_file_path and os.path.exists(get_absolute_path(file_record.smoothed_file_path)):
-                file_path = file_record.smoothed_file_path
-                current_app.logger.debug(f'Usando file smoothed: {file_path} (window={smoothing_window})')
-        
-        # Se non abbiamo trovato un file trasformato, usa quello originale
-        if not file_path:
-            file_path = file_record.file_path
-            current_app.logger.debug(f'Usando file originale: {file_path}')
-        
-        if not os.path.exists(file_path):
-            current_app.logger.warning(f'File non trovato: {file_path}, uso n_observations originale')
-            return file_record.n_observations if file_record else None
-        
-        df = FileService.load_and_validate(file_path)
-        count = len(df)
-        current_app.logger.debug(f'Osservazioni dopo trasformazioni: {count} (originale: {file_record.n_observations}, smoothing: {smoothing_window}, log: {log_transform}, diff: {differencing_order})')
+        recipe = TransformRecipe.from_config(transform_config) if transform_config else TransformRecipe.from_file(file_record)
+        
+        # La ricetta viene valutata dalla serie base in cache (memoizzata per ricetta)
+        count = TransformService.count(file_record, recipe)
+        current_app.logger.debug(f'Osservazioni dopo trasformazioni: {count} (originale: {file_record.n_observations}, ricetta: {recipe.name})')
         return count
     except Exception as e:
         from flask import current_app
@@ -1379,8 +2003,126 @@ def get_transformed_observations_count(file_record, transform_config=None):
         # Fallback: usa n_observations originale
         return file_record.n_observations if file_record else None
 
+def get_run_total_obs(run, file_record, config):
+    """
+    Osservazioni dopo le trasformazioni per un ModelRun
+    
+    Usa il valore salvato al fit; per i run creati prima che venisse salvato lo
+    calcola dal file (una sola volta) e lo memorizza sul run. Il commit è a
+    carico del chiamante.
+    """
+    if run.total_obs is not None:
+        return run.total_obs
+    
+    # Usa la configurazione salvata nel ModelRun: le trasformazioni del file_record potrebbero essere cambiate
+    transform_config = {
+        'smoothing_window': config.get('smoothing_window', 1),
+        'log_transform': config.get('log_transform', False),
+        'differencing_order': config.get('differencing_order', 0)
+    }
+    total_obs = get_transformed_observations_count(file_record, transform_config=transform_config)
+    run.total_obs = total_obs
+    return total_obs
+
+def load_test_metrics(model_runs):
+    """
+    Metrics di test dei modelli senza test_r2/test_mape salvati, con una sola query
+    
+    Returns:
+        dict model_id -> Metrics
+    """
+    missing_ids = {
+        run.model.model_id for run in model_runs
+        if run.model and (run.model.test_r2 is None or run.model.test_mape is None)
+    }
+    if not missing_ids:
+        return {}
+    metrics = Metrics.query.filter(Metrics.metric_type == 'test', Metrics.model_id.in_(missing_ids)).all()
+    return {m.model_id: m for m in metrics}
+
+def get_model_test_scores(model, test_metrics_by_model):
+    """test_r2 e test_mape dal modello, con fallback sulle Metrics di test (già caricate)"""
+    if not model:
+        return None, None
+    test_r2 = model.test_r2
+    test_mape = model.test_mape
+    if test_r2 is None or test_mape is None:
+        test_metrics = test_metrics_by_model.get(model.model_id)
+        if test_metrics:
+            if test_r2 is None:
+                test_r2 = test_metrics.r_squared
+            if test_mape is None:
+                test_mape = test_metrics.mape_percent
+    return test_r2, test_mape
+
+def model_runs_query():
+    """
+    Query dei ModelRun con file e modello caricati nella stessa query (niente N+1)
+    
+    Il join esplicito su Model permette di filtrare e ordinare sulle sue colonne.
+    """
+    return ModelRun.query.outerjoin(Model, ModelRun.model_id == Model.model_id).options(
+        joinedload(ModelRun.file),
+        contains_eager(ModelRun.model)
+    )
+
+RUN_SORT_KEYS = {
+    'created_at': {'column': ModelRun.created_at, 'descending': True, 'nullable': False, 'get': lambda r: r.created_at},
+    'aic': {'column': Model.aic, 'descending': False, 'nullable': True, 'get': lambda r: r.model.aic if r.model else None},
+    'bic': {'column': Model.bic, 'descending': False, 'nullable': True, 'get': lambda r: r.model.bic if r.model else None},
+    'test_r2': {'column': Model.test_r2, 'descending': True, 'nullable': True, 'get': lambda r: r.model.test_r2 if r.model else None},
+    'test_mape': {'column': Model.test_mape, 'descending': False, 'nullable': True, 'get': lambda r: r.model.test_mape if r.model else None}
+}
+
+def list_model_runs(query):
+    """
+    Applica alla query dei run i filtri e l'ordinamento della query string
+    
+    Filtri: file_id, seasonal (true/false), order e seasonal_order (es. '1,0,1'),
+    date_from/date_to su created_at. Ordinamento: created_at | aic | bic |
+    test_r2 | test_mape (test_r2/test_mape sono quelli salvati sul modello).
+    
+    Returns:
+        (model_runs, next_cursor)
+    
+    Raises:
+        ValueError, CursorError: parametri non validi
+    """
+    params = parse_listing_params(RUN_SORT_KEYS, 'created_at')
+    
+    file_id = request.args.get('file_id')
+    if file_id:
+        try:
+            query = query.filter(ModelRun.file_id == int(file_id))
+        except ValueError:
+            raise ValueError('file_id deve essere un intero')
+    seasonal = request.args.get('seasonal')
+    if seasonal:
+        if seasonal.lower() not in ('true', 'false'):
+            raise ValueError("seasonal deve essere 'true' o 'false'")
+        is_seasonal = seasonal.lower() == 'true'
+        query = query.filter(Model.is_seasonal.is_(True) if is_seasonal else or_(Model.is_seasonal.is_(False), Model.is_seasonal.is_(None)))
+    model_order = request.args.get('order')
+    if model_order:
+        query = query.filter(Model.model_order_string == normalize_order_param(model_order))
+    seasonal_order = request.args.get('seasonal_order')
+    if seasonal_order:
+        query = query.filter(Model.seasonal_order_string == normalize_order_param(seasonal_order))
+    if params['date_from']:
+        query = query.filter(ModelRun.created_at >= params['date_from'])
+    if params['date_to']:
+        query = query.filter(ModelRun.created_at < params['date_to'])
+    
+    sort_key = RUN_SORT_KEYS[params['sort']]
+    return keyset_page(
+        query, params['sort'], sort_key['column'], ModelRun.run_id,
+        descending=params['descending'], limit=params['limit'], cursor=params['cursor'],
+        nullable=sort_key['nullable'], value_getter=sort_key['get'], id_getter=lambda r: r.run_id
+    )
+
 @api.route('/user/model-runs', methods=['GET'])
 @login_required
+@query_budget(4)
 def get_all_user_model_runs():
     """Ottiene lista di TUTTI i modelli provati dall'utente corrente (per tutti i file)"""
     # Verifica che l'utente sia correttamente autenticato
@@ -1390,24 +2132,23 @@ def get_all_user_model_runs():
     user_id = current_user.user_id
     print(f"get_all_user_model_runs: Ricerca modelli per user_id={user_id}")
     
-    model_runs = ModelRun.query.filter_by(user_id=user_id).order_by(ModelRun.created_at.desc()).all()
+    try:
+        model_runs, next_cursor = list_model_runs(model_runs_query().filter(ModelRun.user_id == user_id))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     print(f"get_all_user_model_runs: Trovati {len(model_runs)} modelli per user_id={user_id}")
     
+    test_metrics_by_model = load_test_metrics(model_runs)
+    
     runs_data = []
     for run in model_runs:
         config = json.loads(run.configuration) if run.configuration else {}
         
-        # Ottieni informazioni sul file
-        file_record = File.query.get(run.file_id) if run.file_id else None
+        # Ottieni informazioni sul file (già caricato con la query)
+        file_record = run.file
         
-        # Calcola osservazioni totali DOPO le trasformazioni usando la configurazione salvata nel ModelRun
-        # Questo è importante perché le trasformazioni del file_record potrebbero essere cambiate
-        transform_config = {
-            'smoothing_window': config.get('smoothing_window', 1),
-            'log_transform': config.get('log_transform', False),
-            'differencing_order': config.get('differencing_order', 0)
-        }
-        total_obs_after_transforms = get_transformed_observations_count(file_record, transform_config=transform_config)
+        # Osservazioni totali DOPO le trasformazioni (salvate al fit)
+        total_obs_after_transforms = get_run_total_obs(run, file_record, config)
         train_obs = config.get('train_obs')
         test_obs = total_obs_after_transforms - train_obs if total_obs_after_transforms and train_obs else None
         
@@ -1416,22 +2157,7 @@ def get_all_user_model_runs():
         sarimax_params = config.get('sarimax_params', {})
         
         # Recupera test_r2 e test_mape dal modello o dalle metrics come fallback
-        test_r2 = None
-        test_mape = None
-        if model:
-            # Prova prima dal modello
-            test_r2 = model.test_r2
-            test_mape = model.test_mape
-            
-            # Se non sono nel modello, recupera dalle metrics
-            if test_r2 is None or test_mape is None:
-                # Metrics è già importato con 'from models import *' all'inizio del file
-                test_metrics = Metrics.query.filter_by(model_id=model.model_id, metric_type='test').first()
-                if test_metrics:
-                    if test_r2 is None:
-                        test_r2 = test_metrics.r_squared
-                    if test_mape is None:
-                        test_mape = test_metrics.mape_percent
+        test_r2, test_mape = get_model_test_scores(model, test_metrics_by_model)
         
         runs_data.append({
             'run_id': run.run_id,
@@ -1461,10 +2187,15 @@ def get_all_user_model_runs():
             'trend': config.get('trend', 'n')  # Assicurati che trend sia sempre presente
         })
     
-    return jsonify({'runs': runs_data}), 200
+    # Salva le osservazioni calcolate per i run meno recenti (una sola volta)
+    if db.session.dirty:
+        db.session.commit()
+    
+    return jsonify({'runs': runs_data, 'next_cursor': next_cursor}), 200
 
 @api.route('/file/<int:file_id>/model-runs', methods=['GET'])
 @login_required
+@query_budget(5)
 def get_model_runs(file_id):
     """Ottiene lista di tutti i modelli provati per un file specifico"""
     file_record = File.query.get_or_404(file_id)
@@ -1473,20 +2204,21 @@ def get_model_runs(file_id):
     if file_record.user_id != current_user.user_id:
         return jsonify({'error': 'Non autorizzato'}), 403
     
-    model_runs = ModelRun.query.filter_by(file_id=file_id, user_id=current_user.user_id).order_by(ModelRun.created_at.desc()).all()
+    try:
+        model_runs, next_cursor = list_model_runs(
+            model_runs_query().filter(ModelRun.file_id == file_id, ModelRun.user_id == current_user.user_id)
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    test_metrics_by_model = load_test_metrics(model_runs)
     
     runs_data = []
     for run in model_runs:
         config = json.loads(run.configuration) if run.configuration else {}
         
-        # Calcola osservazioni totali DOPO le trasformazioni usando la configurazione salvata nel ModelRun
-        # Questo è importante perché le trasformazioni del file_record potrebbero essere cambiate
-        transform_config = {
-            'smoothing_window': config.get('smoothing_window', 1),
-            'log_transform': config.get('log_transform', False),
-            'differencing_order': config.get('differencing_order', 0)
-        }
-        total_obs_after_transforms = get_transformed_observations_count(file_record, transform_config=transform_config)
+        # Osservazioni totali DOPO le trasformazioni (salvate al fit)
+        total_obs_after_transforms = get_run_total_obs(run, file_record, config)
         train_obs = config.get('train_obs')
         test_obs = total_obs_after_transforms - train_obs if total_obs_after_transforms and train_obs else None
         
@@ -1495,22 +2227,7 @@ def get_model_runs(file_id):
         sarimax_params = config.get('sarimax_params', {})
         
         # Recupera test_r2 e test_mape dal modello o dalle metrics come fallback
-        test_r2 = None
-        test_mape = None
-        if model:
-            # Prova prima dal modello
-            test_r2 = model.test_r2
-            test_mape = model.test_mape
-            
-            # Se non sono nel modello, recupera dalle metrics
-            if test_r2 is None or test_mape is None:
-                # Metrics è già importato con 'from models import *' all'inizio del file
-                test_metrics = Metrics.query.filter_by(model_id=model.model_id, metric_type='test').first()
-                if test_metrics:
-                    if test_r2 is None:
-                        test_r2 = test_metrics.r_squared
-                    if test_mape is None:
-                        test_mape = test_metrics.mape_percent
+        test_r2, test_mape = get_model_test_scores(model, test_metrics_by_model)
         
         runs_data.append({
             'run_id': run.run_id,
@@ -1538,7 +2255,11 @@ def get_model_runs(file_id):
             'trend': config.get('trend', 'n')  # Assicurati che trend sia sempre presente
         })
     
-    return jsonify({'runs': runs_data}), 200
+    # Salva le osservazioni calcolate per i run meno recenti (una sola volta)
+    if db.session.dirty:
+        db.session.commit()
+    
+    return jsonify({'runs': runs_data, 'next_cursor': next_cursor}), 200
 
 # ========== ELIMINA MODELLO ==========
 @api.route('/model-run/<int:run_id>', methods=['DELETE'])
@@ -1552,8 +2273,13 @@ def delete_model_run(run_id):
         return jsonify({'error': 'Non autorizzato'}), 403
     
     try:
-        # Elimina il ModelRun (il Model associato rimane nel database per eventuali riferimenti)
+        # Elimina il ModelRun e il suo Model se nessun altro run lo usa: gli artefatti
+        # del modello vengono rimossi dopo il commit (listener in model_store)
+        model = model_run.model
         db.session.delete(model_run)
+        db.session.flush()
+        if model is not None and not ModelRun.query.filter_by(model_id=model.model_id).count():
+            db.session.delete(model)
         db.session.commit()
         
         return jsonify({'success': True, 'message': 'Modello eliminato con successo'}), 200
@@ -1592,6 +2318,9 @@ def generate_paper(run_id):
         current_app.logger.error(f'Errore generazione paper: {str(e)}')
         return jsonify({'error': f'Errore nella generazione del paper: {str(e)}'}), 500
 
+# Punti massimi per serie nei grafici del paper (decimazione LTTB)
+PAPER_MAX_POINTS = 2000
+
 @api.route('/model-run/<int:run_id>/paper-data', methods=['GET'])
 @login_required
 def get_paper_data(run_id):
@@ -1608,13 +2337,15 @@ def get_paper_data(run_id):
         config = json.loads(model_run.configuration) if model_run.configuration else {}
         
         # Prepara i dati del paper
-        # Usa la configurazione del ModelRun per calcolare le osservazioni corrette
         transform_config = {
             'smoothing_window': config.get('smoothing_window', 1),
             'log_transform': config.get('log_transform', False),
             'differencing_order': config.get('differencing_order', 0)
         }
-        total_obs = get_transformed_observations_count(file_record, transform_config=transform_config)
+        # Osservazioni salvate sul ModelRun (calcolate dalla sua configurazione se mancanti)
+        total_obs = get_run_total_obs(model_run, file_record, config)
+        if db.session.dirty:
+            db.session.commit()
         
         paper_data = {
             'file_name': file_record.file_name if file_record else 'N/A',
@@ -1639,6 +2370,7 @@ def get_paper_data(run_id):
             'bic': None,
             'test_r2': None,
             'test_mape': None,
+            'residuals': None,
             'original_series': None,
             'transformed_series': None,
             'ai_recommendation': None,
@@ -1648,21 +2380,20 @@ def get_paper_data(run_id):
         # Serie originale: dati, statistiche, ACF/PACF
         try:
             from services import FileService
-            from utils import calculate_statistics, calculate_acf_pacf, apply_smoothing, apply_log_transform, apply_differencing
+            from utils import calculate_statistics, calculate_acf_pacf
             from ai_service import AIService
             
             df_orig = FileService.load_and_validate(file_record.file_path)
             
-            # Assumi colonne standard 'data' e 'y'
-            dates_orig = df_orig['data'].astype(str).tolist()
-            values_orig = df_orig['y'].astype(float).tolist()
+            # Assumi colonne standard 'data' e 'y'; grafico decimato a PAPER_MAX_POINTS
+            orig_columns = to_builtin(decimate_columns(series_columns(df_orig['data'], values=df_orig['y']), PAPER_MAX_POINTS))
             
             stats_orig = calculate_statistics(df_orig)
             acf_pacf_orig = calculate_acf_pacf(df_orig['y'])
             
             paper_data['original_series'] = {
-                'dates': dates_orig,
-                'values': values_orig,
+                'dates': orig_columns['dates'],
+                'values': orig_columns['values'],
                 'stats': stats_orig,
                 'acf_pacf': {
                     'lags': acf_pacf_orig['lags'],
@@ -1671,29 +2402,20 @@ def get_paper_data(run_id):
                 }
             }
             
-            # Serie trasformata (se presenti trasformazioni)
-            df_trans = df_orig.copy()
-            has_transformations = transform_config['smoothing_window'] > 1 or \
-                transform_config['log_transform'] or \
-                transform_config['differencing_order'] > 0
+            # Serie trasformata (se presenti trasformazioni), dalla ricetta salvata nel run
+            run_recipe = TransformRecipe.from_config(transform_config)
             
-            if has_transformations:
-                if transform_config['smoothing_window'] > 1:
-                    df_trans = apply_smoothing(df_trans, window_size=transform_config['smoothing_window'])
-                if transform_config['log_transform']:
-                    df_trans = apply_log_transform(df_trans)
-                if transform_config['differencing_order'] > 0:
-                    df_trans = apply_differencing(df_trans, order=transform_config['differencing_order'])
+            if not run_recipe.is_identity:
+                df_trans = TransformService.frame(file_record, run_recipe)
                 
-                dates_trans = df_trans['data'].astype(str).tolist()
-                values_trans = df_trans['y'].astype(float).tolist()
+                trans_columns = to_builtin(decimate_columns(series_columns(df_trans['data'], values=df_trans['y']), PAPER_MAX_POINTS))
                 
                 stats_trans = calculate_statistics(df_trans)
                 acf_pacf_trans = calculate_acf_pacf(df_trans['y'])
                 
                 paper_data['transformed_series'] = {
-                    'dates': dates_trans,
-                    'values': values_trans,
+                    'dates': trans_columns['dates'],
+                    'values': trans_columns['values'],
                     'stats': stats_trans,
                     'acf_pacf': {
                         'lags': acf_pacf_trans['lags'],
@@ -1825,33 +2547,24 @@ def get_paper_data(run_id):
                 paper_data['bic'] = float(model.bic) if model.bic is not None else None
                 paper_data['test_r2'] = float(model.test_r2) if model.test_r2 is not None else None
                 paper_data['test_mape'] = float(model.test_mape) if model.test_mape is not None else None
+                # Diagnostica dei residui (None finché il job 'residuals' non è concluso)
+                paper_data['residuals'] = ResidualService.to_dict(model.residuals)
                 
                 # Aggiungi dati per i grafici di previsione
-                forecasts = Forecast.query.filter_by(model_id=model.model_id).order_by(Forecast.forecast_date).all()
-                
-                train_data = []
-                test_data = []
-                
-                for f in forecasts:
-                    data_point = {
-                        'date': f.forecast_date.isoformat() if f.forecast_date else None,
-                        'forecasted': float(f.forecasted_value) if f.forecasted_value is not None else None,
-                        'actual': float(f.actual_value) if f.actual_value is not None else None
-                    }
-                    
-                    if f.category == 'train':
-                        train_data.append(data_point)
-                    elif f.category == 'test':
-                        test_data.append(data_point)
-                
-                paper_data['charts'] = {
-                    'train': train_data,
-                    'test': test_data
-                }
+                series = ForecastSeriesStore.load(model.model_id)
+                chart_fields = ('forecasted', 'actual')
+                paper_data['charts'] = to_builtin({
+                    category: series_payload(decimate_columns(
+                        ForecastSeriesStore.to_columns(series, category=category, fields=chart_fields),
+                        PAPER_MAX_POINTS, key='actual'
+                    ))
+                    for category in ('train', 'test')
+                })
             except Exception as e:
                 from flask import current_app
                 current_app.logger.warning(f'Errore recupero info modello/grafici: {str(e)}')
-                paper_data['charts'] = {'train': [], 'test': []}
+                empty = series_payload(ForecastSeriesStore.to_columns(None, fields=('forecasted', 'actual')))
+                paper_data['charts'] = to_builtin({'train': empty, 'test': empty})
         
         return jsonify(paper_data), 200
     except Exception as e:
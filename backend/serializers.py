@@ -0,0 +1,173 @@
+"""
+Serializzazione colonnare delle serie per le risposte JSON dei grafici.
+
+Le serie vengono restituite come colonne ({'dates': [...], 'values': [...]})
+invece che come lista di dict per punto: date e valori restano array NumPy
+fino all'encoder, che li converte in blocco. Con orjson (dipendenza opzionale)
+gli array vengono scritti direttamente, senza passare da oggetti Python;
+senza orjson si usa jsonify dopo una conversione vettoriale (date ISO 8601
+con np.datetime_as_string, NaN -> null).
+
+Il vecchio formato a righe ([{'date': ..., 'value': ...}, ...]) resta
+disponibile con ?format=rows per i client non aggiornati.
+
+series_window seleziona una finestra di date (ricerca binaria) e la decima
+con LTTB o min/max (modulo decimation): il payload resta limitato a
+max_points qualunque sia la lunghezza della serie, e zoomando il client
+riceve la finestra visibile a piena risoluzione.
+"""
+import numpy as np
+from flask import current_app, jsonify, request
+from decimation import decimate_indices
+
+try:
+    import orjson
+except ImportError:  # dipendenza opzionale: si usa l'encoder di Flask
+    orjson = None
+
+# Nomi delle chiavi nel formato a righe (le altre colonne mantengono il nome)
+ROW_KEYS = {'dates': 'date', 'values': 'value'}
+
+
+def wants_rows():
+    """True se il client ha chiesto il formato a righe (?format=rows)"""
+    return request.args.get('format') == 'rows'
+
+
+def date_array(dates):
+    """Date (int64 epoch-ns, datetime64 o Series pandas) come array datetime64[s]"""
+    dates = np.asarray(dates)
+    if dates.dtype.kind in 'iu':
+        dates = dates.view('datetime64[ns]')
+    elif dates.dtype.kind != 'M':
+        dates = dates.astype('datetime64[ns]')
+    return dates.astype('datetime64[s]')
+
+
+def series_columns(dates, **columns):
+    """
+    Serie in formato colonnare
+
+    Args:
+        dates: date della serie
+        **columns: colonne di valori (array o Series, stessa lunghezza delle date)
+
+    Returns:
+        dict {'dates': datetime64[s], <colonna>: float64, ...} pronto per json_response
+    """
+    result = {'dates': date_array(dates)}
+    for name, values in columns.items():
+        result[name] = np.asarray(values, dtype=np.float64)
+    return result
+
+
+def select_window(columns, start=None, end=None):
+    """
+    Punti con start <= data < end, per colonne con date ordinate
+
+    Ricerca binaria sulle date: le colonne restituite sono viste, senza copie.
+    """
+    dates = columns['dates']
+    lo = np.searchsorted(dates, np.datetime64(start, 's')) if start is not None else 0
+    hi = np.searchsorted(dates, np.datetime64(end, 's')) if end is not None else len(dates)
+    return {name: values[lo:hi] for name, values in columns.items()}
+
+
+def decimate_columns(columns, max_points, method='lttb', key='values'):
+    """
+    Riduce tutte le colonne ad al più max_points punti (vedi decimation)
+
+    Args:
+        columns: colonne da series_columns
+        max_points: punti massimi
+        method: 'lttb' o 'minmax'
+        key: colonna usata per scegliere i punti (le altre seguono gli stessi indici)
+    """
+    if len(columns['dates']) <= max_points:
+        return columns
+    indices = decimate_indices(columns['dates'].astype(np.int64), columns[key], max_points, method)
+    return {name: values[indices] for name, values in columns.items()}
+
+
+def series_window(columns, start=None, end=None, max_points=None, method='lttb', key='values'):
+    """
+    Finestra [start, end) della serie decimata ad al più max_points punti
+
+    Returns:
+        (colonne, info): info descrive la finestra restituita (punti totali e
+        restituiti, metodo) per permettere al client di chiedere più dettaglio
+    """
+    window = select_window(columns, start, end)
+    total = len(window['dates'])
+    if max_points:
+        window = decimate_columns(window, max_points, method=method, key=key)
+    return window, window_info(window, total, method)
+
+
+def window_info(columns, total, method):
+    """Descrizione della finestra restituita: estremi, punti totali e restituiti, metodo"""
+    returned = len(columns['dates'])
+    dates = columns['dates']
+    return {
+        'start': str(dates[0]) if returned else None,
+        'end': str(dates[-1]) if returned else None,
+        'total_points': total,
+        'returned_points': returned,
+        'method': method if returned < total else None
+    }
+
+
+def to_builtin(value):
+    """Converte ricorsivamente gli array NumPy in liste JSON-compatibili"""
+    if isinstance(value, np.ndarray):
+        if value.dtype.kind == 'M':
+            return np.datetime_as_string(value.astype('datetime64[s]'), unit='s').tolist()
+        if value.dtype.kind == 'f':
+            finite = np.isfinite(value)
+            if finite.all():
+                return value.tolist()
+            # NaN/inf -> None (null in JSON)
+            return np.where(finite, value, None).tolist()
+        return value.tolist()
+    if isinstance(value, dict):
+        return {key: to_builtin(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_builtin(item) for item in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def columns_to_rows(columns):
+    """Formato a righe di compatibilità: [{'date': ..., 'value': ...}, ...]"""
+    columns = to_builtin(columns)
+    keys = [ROW_KEYS.get(name, name) for name in columns]
+    return [dict(zip(keys, values)) for values in zip(*columns.values())]
+
+
+def series_payload(columns):
+    """Colonne o righe secondo il parametro format della richiesta"""
+    return columns_to_rows(columns) if wants_rows() else columns
+
+
+def _orjson_default(value):
+    """Tipi che orjson non serializza nativamente (es. array sottocampionati non contigui)"""
+    if isinstance(value, np.ndarray):
+        if not value.flags.c_contiguous:
+            return np.ascontiguousarray(value)
+        return to_builtin(value)
+    raise TypeError(f'Tipo non serializzabile in JSON: {type(value).__name__}')
+
+
+def json_response(payload, status=200):
+    """
+    Risposta JSON che accetta array NumPy nel payload
+
+    Le date datetime Python vanno passate già formattate (isoformat): orjson e
+    jsonify le scriverebbero in formati diversi.
+    """
+    if orjson is not None:
+        body = orjson.dumps(payload, default=_orjson_default,
+                            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+        return current_app.response_class(body, status=status, mimetype='application/json')
+    return jsonify(to_builtin(payload)), status
@@ -0,0 +1,286 @@
+"""
+Piramide multi-risoluzione delle serie lunghe.
+
+Per le serie con molti punti la decimazione di una finestra (LTTB, min/max)
+deve comunque leggere tutti i punti della finestra: zoomando indietro su una
+serie da milioni di punti ogni richiesta costa O(n). La piramide precalcola,
+una volta sola, livelli di aggregati per bucket di dimensione crescente
+(BASE_BUCKET, BASE_BUCKET * FACTOR, ...): per ogni bucket minimo, massimo
+(con la loro posizione), media, primo e ultimo valore.
+
+Una finestra [lo, hi) viene coperta dai bucket interi del livello più fine
+che rispetta il budget di punti; i margini non allineati scendono ai livelli
+più fini e infine ai punti grezzi (al più BASE_BUCKET per lato). Da ogni
+bucket si prendono primo, minimo, massimo e ultimo punto (M4): il costo è
+proporzionale ai punti restituiti, non alla lunghezza della finestra.
+
+I livelli sono salvati accanto all'archivio binario della serie (SeriesStore),
+uno per ricetta di trasformazione, come .npy caricati in memory-map.
+"""
+import os
+import json
+import shutil
+import numpy as np
+from config import Config
+from decimation import decimate_indices, _fill_nan
+from series_store import SeriesStore
+from serializers import series_columns, window_info
+
+# Incrementare se cambia il formato su disco (invalida le piramidi esistenti)
+PYRAMID_VERSION = 1
+
+# Punti per bucket al livello 0 e fattore tra livelli successivi
+BASE_BUCKET = 64
+FACTOR = 4
+# Il livello più grossolano ha al più questo numero di bucket
+TOP_BUCKETS = 64
+
+# Aggregati per bucket; argmin/argmax sono indici nella serie completa
+LEVEL_DTYPE = np.dtype([
+    ('min', 'f8'), ('max', 'f8'), ('mean', 'f8'), ('first', 'f8'), ('last', 'f8'),
+    ('argmin', 'i8'), ('argmax', 'i8')
+])
+
+
+def _bucket_rows(values, size):
+    """Livello 0: aggregati dei punti grezzi a bucket di 'size' punti"""
+    n = len(values)
+    n_buckets = -(-n // size)
+    values = np.asarray(values, dtype=np.float64)
+    low = np.full(n_buckets * size, np.inf)
+    high = np.full(n_buckets * size, -np.inf)
+    low[:n] = values
+    high[:n] = values
+    # I NaN non devono vincere argmin/argmax
+    missing = np.isnan(values)
+    if missing.any():
+        low[:n][missing] = np.inf
+        high[:n][missing] = -np.inf
+
+    offsets = np.arange(n_buckets, dtype=np.int64) * size
+    starts = offsets
+    stops = np.minimum(offsets + size, n)
+
+    rows = np.empty(n_buckets, dtype=LEVEL_DTYPE)
+    rows['argmin'] = low.reshape(n_buckets, size).argmin(axis=1) + offsets
+    rows['argmax'] = high.reshape(n_buckets, size).argmax(axis=1) + offsets
+    rows['min'] = values[rows['argmin']]
+    rows['max'] = values[rows['argmax']]
+    rows['mean'] = np.add.reduceat(np.nan_to_num(values), starts) / (stops - starts)
+    rows['first'] = values[starts]
+    rows['last'] = values[stops - 1]
+    return rows
+
+
+def _merge_rows(child, n_points, child_size):
+    """Livello successivo: unisce FACTOR bucket consecutivi del livello precedente"""
+    m = len(child)
+    n_buckets = -(-m // FACTOR)
+    pad = n_buckets * FACTOR - m
+
+    low = np.append(child['min'], np.full(pad, np.inf)).reshape(n_buckets, FACTOR)
+    high = np.append(child['max'], np.full(pad, -np.inf)).reshape(n_buckets, FACTOR)
+    low = np.where(np.isnan(low), np.inf, low)
+    high = np.where(np.isnan(high), -np.inf, high)
+    base = np.arange(n_buckets, dtype=np.int64) * FACTOR
+    lo_child = base + low.argmin(axis=1)
+    hi_child = base + high.argmax(axis=1)
+    last_child = np.minimum(base + FACTOR, m) - 1
+
+    # Media pesata sul numero di punti dei figli (l'ultimo può essere parziale)
+    counts = np.minimum((np.arange(m, dtype=np.int64) + 1) * child_size, n_points) - np.arange(m) * child_size
+    sums = np.add.reduceat(child['mean'] * counts, base)
+    totals = np.add.reduceat(counts, base)
+
+    rows = np.empty(n_buckets, dtype=LEVEL_DTYPE)
+    rows['min'] = child['min'][lo_child]
+    rows['max'] = child['max'][hi_child]
+    rows['argmin'] = child['argmin'][lo_child]
+    rows['argmax'] = child['argmax'][hi_child]
+    rows['mean'] = sums / totals
+    rows['first'] = child['first'][base]
+    rows['last'] = child['last'][last_child]
+    return rows
+
+
+def build_levels(values):
+    """
+    Calcola i livelli della piramide di una serie
+
+    Returns:
+        list: array strutturati LEVEL_DTYPE, dal più fine al più grossolano
+    """
+    n = len(values)
+    size = BASE_BUCKET
+    levels = [_bucket_rows(values, size)]
+    while len(levels[-1]) > TOP_BUCKETS:
+        levels.append(_merge_rows(levels[-1], n, size))
+        size *= FACTOR
+    return levels
+
+
+class SeriesPyramid:
+    """Livelli di una serie caricati (in memory-map) e interrogazione per finestre"""
+
+    def __init__(self, levels, n_points):
+        self.levels = levels
+        self.n_points = n_points
+        self.sizes = [BASE_BUCKET * FACTOR ** k for k in range(len(levels))]
+
+    def _segments(self, lo, hi, level):
+        """
+        Copertura esatta di [lo, hi) con bucket interi: lista di (livello, da, a)
+
+        I bucket del livello indicato coprono la parte centrale; i margini non
+        allineati scendono ai livelli più fini, fino ai punti grezzi (livello -1).
+        """
+        if hi <= lo:
+            return []
+        if level < 0:
+            return [(-1, lo, hi)]
+        size = self.sizes[level]
+        first = -(-lo // size)
+        last = hi // size
+        if first >= last:
+            return self._segments(lo, hi, level - 1)
+        return (self._segments(lo, first * size, level - 1)
+                + [(level, first, last)]
+                + self._segments(last * size, hi, level - 1))
+
+    def _candidate_indices(self, values, lo, hi, max_buckets):
+        """Indici M4 (primo, minimo, massimo, ultimo) dei bucket che coprono [lo, hi)"""
+        # Livello più fine con al più max_buckets bucket nella finestra
+        level = len(self.levels) - 1
+        for k, size in enumerate(self.sizes):
+            if (hi - lo) // size <= max_buckets:
+                level = k
+                break
+
+        parts = []
+        for k, start, stop in self._segments(lo, hi, level):
+            if k < 0:
+                chunk = _fill_nan(np.asarray(values[start:stop], dtype=np.float64))
+                parts.append(np.array([start, stop - 1, start + chunk.argmin(), start + chunk.argmax()]))
+            else:
+                rows = self.levels[k][start:stop]
+                size = self.sizes[k]
+                firsts = np.arange(start, stop, dtype=np.int64) * size
+                parts.extend((firsts, firsts + size - 1, rows['argmin'], rows['argmax']))
+        return np.unique(np.concatenate(parts))
+
+    def window_indices(self, dates, values, lo, hi, max_points, method='lttb'):
+        """
+        Indici dei punti da restituire per la finestra [lo, hi)
+
+        Con 'minmax' l'inviluppo M4 dei bucket è già il risultato; con 'lttb'
+        i punti M4 (circa 4 * max_points) sono i candidati su cui gira LTTB.
+
+        Returns:
+            array int64 di al più max_points indici crescenti
+        """
+        if hi - lo <= max_points:
+            return np.arange(lo, hi)
+        max_buckets = max(1, max_points // 4) if method == 'minmax' else max_points
+        candidates = self._candidate_indices(values, lo, hi, max_buckets)
+        if len(candidates) > max_points:
+            picked = decimate_indices(dates[candidates], values[candidates], max_points, method)
+            candidates = candidates[picked]
+        return candidates
+
+    def window(self, dates, values, start=None, end=None, max_points=None, method='lttb'):
+        """
+        Come serializers.series_window, ma la decimazione usa la piramide
+
+        Le date sono quelle della serie (int64 epoch-ns): la finestra viene
+        cercata per bisezione, senza convertire o copiare la serie completa.
+
+        Returns:
+            (colonne, info) nello stesso formato di series_window
+        """
+        lo = int(np.searchsorted(dates, np.datetime64(start, 'ns').astype(np.int64))) if start is not None else 0
+        hi = int(np.searchsorted(dates, np.datetime64(end, 'ns').astype(np.int64))) if end is not None else len(dates)
+        hi = max(lo, hi)
+        if max_points:
+            indices = self.window_indices(dates, values, lo, hi, max_points, method)
+            columns = series_columns(dates[indices], values=values[indices])
+        else:
+            columns = series_columns(dates[lo:hi], values=values[lo:hi])
+        return columns, window_info(columns, hi - lo, method)
+
+
+class PyramidStore:
+    """Lettura/scrittura delle piramidi accanto all'archivio binario delle serie"""
+
+    @staticmethod
+    def directory(source_path, recipe_name='original'):
+        """Cartella della piramide di una ricetta per un CSV sorgente"""
+        return os.path.join(f'{SeriesStore._base_path(source_path)}.pyramid', recipe_name)
+
+    @staticmethod
+    def save(source_path, recipe_name, values):
+        """
+        Calcola e salva la piramide di una serie (se abbastanza lunga)
+
+        Returns:
+            SeriesPyramid o None se la serie ha meno di PYRAMID_MIN_POINTS punti
+        """
+        n = len(values)
+        if n < Config.PYRAMID_MIN_POINTS:
+            return None
+
+        levels = build_levels(values)
+        directory = PyramidStore.directory(source_path, recipe_name)
+        os.makedirs(directory, exist_ok=True)
+        for k, rows in enumerate(levels):
+            path = os.path.join(directory, f'level{k}.npy')
+            tmp_path = f'{path}.tmp'
+            with open(tmp_path, 'wb') as fh:
+                np.save(fh, rows, allow_pickle=False)
+            os.replace(tmp_path, path)
+
+        # Il meta va scritto per ultimo: senza meta la piramide non viene usata
+        meta = {
+            'version': PYRAMID_VERSION,
+            'n_points': n,
+            'base_bucket': BASE_BUCKET,
+            'factor': FACTOR,
+            'levels': len(levels),
+            'source': SeriesStore._source_signature(source_path)
+        }
+        meta_path = os.path.join(directory, 'meta.json')
+        with open(f'{meta_path}.tmp', 'w') as fh:
+            json.dump(meta, fh)
+        os.replace(f'{meta_path}.tmp', meta_path)
+        return SeriesPyramid(levels, n)
+
+    @staticmethod
+    def load(source_path, recipe_name, n_points):
+        """
+        Carica una piramide valida per la serie corrente (livelli in memory-map)
+
+        Returns:
+            SeriesPyramid o None se assente, obsoleta o di un'altra serie
+        """
+        directory = PyramidStore.directory(source_path, recipe_name)
+        try:
+            with open(os.path.join(directory, 'meta.json')) as fh:
+                meta = json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+        expected = (PYRAMID_VERSION, n_points, BASE_BUCKET, FACTOR)
+        if (meta.get('version'), meta.get('n_points'), meta.get('base_bucket'), meta.get('factor')) != expected:
+            return None
+        try:
+            if meta.get('source') != SeriesStore._source_signature(source_path):
+                return None
+            levels = [np.load(os.path.join(directory, f'level{k}.npy'), mmap_mode='r', allow_pickle=False)
+                      for k in range(meta['levels'])]
+        except (OSError, ValueError, KeyError):
+            return None
+        return SeriesPyramid(levels, n_points)
+
+    @staticmethod
+    def remove(source_path):
+        """Rimuove tutte le piramidi associate a un CSV (se presenti)"""
+        shutil.rmtree(f'{SeriesStore._base_path(source_path)}.pyramid', ignore_errors=True)
@@ -0,0 +1,151 @@
+"""
+Archivio binario colonnare delle serie validate.
+
+Ogni CSV caricato viene validato una sola volta (validate_file_format) e poi
+salvato in forma compatta: date come int64 (nanosecondi epoch) e valori come
+float64, in due file .npy memory-mappabili. I caricamenti successivi leggono
+direttamente gli array senza parsing; le serie grandi (SERIES_MMAP_MIN_BYTES)
+vengono mappate in memoria invece di essere copiate.
+"""
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+from config import Config
+from cache import LRUCache
+
+# Incrementare se cambia il formato su disco (invalida gli archivi esistenti)
+STORE_VERSION = 1
+
+# Cache di processo delle serie validate: path -> ((mtime_ns, size), (dates, values))
+series_cache = LRUCache('series', Config.SERIES_CACHE_MAX_BYTES)
+
+# Costo in cache di una serie mappata: le pagine sono della page cache del sistema, non del processo
+MMAP_ENTRY_BYTES = 4096
+
+
+def resident_nbytes(*arrays):
+    """Byte occupati nella memoria del processo (0 per gli array memory-mapped)"""
+    return sum(0 if isinstance(array, np.memmap) else array.nbytes for array in arrays)
+
+
+class SeriesStore:
+    """Lettura/scrittura delle serie in formato binario colonnare"""
+
+    @staticmethod
+    def _base_path(source_path):
+        """Percorso base dei file dell'archivio per un CSV sorgente"""
+        key = hashlib.sha1(os.path.abspath(source_path).encode('utf-8')).hexdigest()
+        return os.path.join(Config.SERIES_STORE_FOLDER, key)
+
+    @staticmethod
+    def paths(source_path):
+        """
+        Restituisce i percorsi (dates, values, meta) dell'archivio per un CSV
+        """
+        base = SeriesStore._base_path(source_path)
+        return f'{base}.dates.npy', f'{base}.values.npy', f'{base}.meta.json'
+
+    @staticmethod
+    def _source_signature(source_path):
+        """Firma del file sorgente (dimensione + mtime) per rilevare modifiche"""
+        st = os.stat(source_path)
+        return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+    @staticmethod
+    def save(source_path, df):
+        """
+        Salva una serie già validata (colonne 'data' e 'y') nell'archivio binario
+
+        Args:
+            source_path: percorso assoluto del CSV da cui la serie è stata letta
+            df: DataFrame validato e ordinato per data
+
+        Returns:
+            tuple: (dates int64, values float64) appena scritti
+        """
+        os.makedirs(Config.SERIES_STORE_FOLDER, exist_ok=True)
+        dates_path, values_path, meta_path = SeriesStore.paths(source_path)
+
+        dates = np.ascontiguousarray(df['data'].values.astype('datetime64[ns]').view('int64'))
+        values = np.ascontiguousarray(df['y'].values, dtype=np.float64)
+
+        # Scrittura atomica: prima su file temporanei, poi rename
+        for path, array in ((dates_path, dates), (values_path, values)):
+            tmp_path = f'{path}.tmp'
+            with open(tmp_path, 'wb') as fh:
+                np.save(fh, array, allow_pickle=False)
+            os.replace(tmp_path, path)
+
+        meta = {
+            'version': STORE_VERSION,
+            'n_observations': int(len(values)),
+            'source': SeriesStore._source_signature(source_path)
+        }
+        tmp_meta = f'{meta_path}.tmp'
+        with open(tmp_meta, 'w') as fh:
+            json.dump(meta, fh)
+        os.replace(tmp_meta, meta_path)
+
+        return dates, values
+
+    @staticmethod
+    def load(source_path, mmap=None):
+        """
+        Carica la serie binaria se presente e aggiornata rispetto al CSV
+
+        Args:
+            mmap: True/False per forzare la lettura memory-mapped o in memoria;
+                None (default) la usa solo per serie di almeno SERIES_MMAP_MIN_BYTES.
+                I file vengono sostituiti con os.replace: una mappa esistente
+                continua a vedere il file precedente finché resta in uso
+
+        Returns:
+            tuple (dates int64, values float64) oppure None se l'archivio manca
+            o non corrisponde più al file sorgente
+        """
+        dates_path, values_path, meta_path = SeriesStore.paths(source_path)
+        try:
+            with open(meta_path) as fh:
+                meta = json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+        if meta.get('version') != STORE_VERSION:
+            return None
+        try:
+            if meta.get('source') != SeriesStore._source_signature(source_path):
+                return None
+        except OSError:
+            # CSV sorgente non più presente
+            return None
+
+        if mmap is None:
+            mmap = meta.get('n_observations', 0) * 16 >= Config.SERIES_MMAP_MIN_BYTES
+        mmap_mode = 'r' if mmap else None
+        try:
+            dates = np.load(dates_path, mmap_mode=mmap_mode, allow_pickle=False)
+            values = np.load(values_path, mmap_mode=mmap_mode, allow_pickle=False)
+        except (OSError, ValueError):
+            return None
+
+        if len(dates) != meta.get('n_observations') or len(values) != len(dates):
+            return None
+        return dates, values
+
+    @staticmethod
+    def remove(source_path):
+        """Rimuove l'archivio binario associato a un CSV (se presente)"""
+        for path in SeriesStore.paths(source_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    @staticmethod
+    def to_frame(dates, values):
+        """Ricostruisce il DataFrame standard ('data', 'y') dagli array colonnari"""
+        # copy=True: il DataFrame non deve condividere memoria con il file mappato
+        return pd.DataFrame({
+            'data': np.asarray(dates).view('datetime64[ns]'),
+            'y': np.asarray(values, dtype=np.float64)
+        }, copy=True)
@@ -5,11 +5,33 @@ from database import db
 from models import *
 from utils import split_train_test, calculate_statistics
 from utils import validate_file_format
+from series_store import SeriesStore, series_cache, resident_nbytes, MMAP_ENTRY_BYTES
+from forecast_store import ForecastSeriesStore, CATEGORY_CODES
+from blob_store import BlobStore
+from model_store import ModelArtifactStore
+from transform_service import TransformService, TransformRecipe
 import json
 import os
+import hashlib
 from datetime import datetime
 from config import Config, BASE_DIR
 
+# Incrementare se cambia il calcolo del fit (le impronte precedenti non vengono più riusate)
+FIT_FINGERPRINT_VERSION = 3
+
+# Modalità di fit: 'full' calcola subito la diagnostica, 'fast' solo le stime puntuali
+FIT_MODES = ('full', 'fast')
+
+# Campi del Model copiati da un fit identico (SarimaxService._clone_fit)
+CLONED_MODEL_COLUMNS = (
+    'p', 'd', 'q', 'seasonal_p', 'seasonal_d', 'seasonal_q', 'seasonal_m',
+    'model_order_string', 'seasonal_order_string', 'is_seasonal', 'aic', 'bic',
+    'test_r2', 'test_mape', 'test_score', 'estimated_params', 'param_standard_errors',
+    'param_pvalues', 'param_tvalues', 'param_confidence_intervals', 'model_summary',
+    'optimizer_iterations', 'warm_start_model_id', 'iterations_saved_estimate', 'fit_mode',
+    'diagnostics_seconds'
+)
+
 def get_absolute_path(relative_path):
     """Converte un percorso relativo in assoluto usando BASE_DIR del progetto"""
     if relative_path is None:
@@ -23,14 +45,71 @@ def get_absolute_path(relative_path):
 class FileService:
     @staticmethod
     def load_and_validate(file_path):
-        """Carica e valida file CSV"""
+        """
+        Carica e valida file CSV
+        
+        Il CSV viene letto e validato solo al primo accesso: la serie validata
+        viene salvata nell'archivio binario (SeriesStore) e i caricamenti
+        successivi la leggono dalla cache in memoria o direttamente dall'archivio.
+        """
+        return SeriesStore.to_frame(*FileService.load_series(file_path))
+    
+    @staticmethod
+    def load_series(file_path):
+        """
+        Carica la serie validata come array colonnari in sola lettura
+        
+        Returns:
+            tuple: (dates int64 epoch-ns, values float64), entrambi non scrivibili
+        """
         # Converti percorso relativo in assoluto
         file_path = get_absolute_path(file_path)
         
+        if not file_path.endswith('.csv'):
+            raise ValueError("Solo file CSV sono supportati")
+        
+        # La firma (mtime, size) invalida la voce se il file su disco cambia
+        try:
+            st = os.stat(file_path)
+            signature = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            signature = None
+        
+        if signature is not None:
+            cached = series_cache.get(file_path)
+            if cached is not None:
+                if cached[0] == signature:
+                    return cached[1]
+                series_cache.pop(file_path)
+        
+        # Serie già validata: lettura diretta dall'archivio binario
+        stored = SeriesStore.load(file_path)
+        if stored is None:
+            df = FileService._read_and_validate_csv(file_path)
+            try:
+                stored = SeriesStore.save(file_path, df)
+            except OSError as e:
+                # L'archivio è solo un'ottimizzazione: in caso di errore si usa il CSV
+                print(f"Errore salvataggio archivio serie per {file_path}: {e}")
+                stored = (
+                    df['data'].values.astype('datetime64[ns]').view('int64'),
+                    df['y'].values.astype(np.float64)
+                )
+        
+        dates, values = stored
+        dates.setflags(write=False)
+        values.setflags(write=False)
+        
+        if signature is not None:
+            # Le serie mappate non occupano memoria del processo: costo fisso in cache
+            nbytes = resident_nbytes(dates, values) or MMAP_ENTRY_BYTES
+            series_cache.put(file_path, (signature, (dates, values)), nbytes=nbytes)
+        return dates, values
+    
+    @staticmethod
+    def _read_and_validate_csv(file_path):
+        """Legge il CSV e applica validate_file_format (percorso lento)"""
         try:
-            if not file_path.endswith('.csv'):
-                raise ValueError("Solo file CSV sono supportati")
-            
             # Leggi CSV con encoding UTF-8 e gestione errori
             # Prova prima UTF-8, poi latin-1 se fallisce
             try:
@@ -61,14 +140,16 @@ class FileService:
     
     @staticmethod
     def save_file(file, user_id, train_ratio=0.8):
-        """Salva file e crea split training/test"""
-        os.makedirs(Config.UPLOAD_FOLDER, exist_ok=True)
-        filename = f"{user_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{file.filename}"
-        filepath = os.path.join(Config.UPLOAD_FOLDER, filename)
-        file.save(filepath)
+        """Salva file (deduplicato per contenuto) e crea split training/test"""
+        blob, _ = BlobStore.store_upload(file)
+        filepath = blob.path
         
         # Carica e valida
-        df = FileService.load_and_validate(filepath)
+        try:
+            df = FileService.load_and_validate(filepath)
+        except Exception:
+            BlobStore.release(blob.content_hash)
+            raise
         
         # Split training/test (usa train_ratio per calcolare train_obs)
         n = len(df)
@@ -80,6 +161,7 @@ class FileService:
             user_id=user_id,
             file_name=file.filename,
             file_path=filepath,
+            content_hash=blob.content_hash,
             n_observations=len(df),
             train_split_ratio=train_ratio,
             train_start_date=train_df['data'].min(),
@@ -93,6 +175,9 @@ class FileService:
         # Calcola statistiche
         StatisticsService.calculate_and_save(file_record.file_id, train_df, test_df)
         
+        # Serie lunghe: piramide multi-risoluzione per i grafici (già presente se il contenuto è duplicato)
+        TransformService.pyramid(file_record, TransformRecipe())
+        
         return file_record
 
 class StatisticsService:
@@ -122,7 +207,76 @@ class SarimaxService:
     """Servizio SARIMAX per modelli configurati manualmente"""
     
     @staticmethod
-    def fit_model(file_id, order, seasonal_order, trend, enforce_stationarity=True, enforce_invertibility=True, cov_type='robust_approx'):
+    def create_pending_model(file_id):
+        """Crea il Model in stato 'pending' prima che il fit venga eseguito"""
+        model = Model(file_id=file_id, status='pending')
+        db.session.add(model)
+        db.session.commit()
+        return model
+    
+    @staticmethod
+    def load_train_test(file_record):
+        """
+        Carica la serie finale (dopo le trasformazioni) e applica lo split del file
+        
+        Returns:
+            train_df, test_df
+        """
+        # Serie finale valutata dalla ricetta del file (smoothing -> log -> diff)
+        df = TransformService.frame(file_record)
+        
+        # Applica split usando train_obs
+        return split_train_test(df, SarimaxService.train_obs_count(file_record, len(df)))
+    
+    @staticmethod
+    def train_obs_count(file_record, n_total):
+        """
+        Osservazioni del train per una serie (trasformata) di n_total punti
+        
+        Regola di split usata da load_train_test: backtest e diagnostica la
+        riusano per lavorare sulla stessa finestra del fit.
+        """
+        # Calcola train_obs da train_split_ratio (per retrocompatibilità)
+        # train_split_ratio è salvato come float (es. 0.8 per 80%)
+        if file_record.train_split_ratio:
+            train_obs = int(n_total * file_record.train_split_ratio)
+            # Assicura che ci sia almeno 1 osservazione nel test set
+            if train_obs >= n_total:
+                train_obs = n_total - 1
+        else:
+            # Default: 80% del dataset
+            train_obs = int(n_total * 0.8)
+        return train_obs
+    
+    @staticmethod
+    def model_spec(model, configuration):
+        """
+        Argomenti SARIMAX (order, seasonal_order, trend, enforce_*) di un modello stimato
+        
+        Args:
+            model: Model completato
+            configuration: configurazione (dict) del suo ModelRun
+        
+        Returns:
+            dict di kwargs per SARIMAX
+        """
+        if model.p is None:
+            # Il Model non conserva i lag dell'AR selettivo
+            raise ValueError('Modello con AR selettivo non supportato')
+        spec = {
+            'order': (model.p, model.d or 0, model.q or 0),
+            'seasonal_order': (0, 0, 0, 0),
+            'trend': configuration.get('trend', 'n'),
+            'enforce_stationarity': configuration.get('enforce_stationarity', True),
+            'enforce_invertibility': configuration.get('enforce_invertibility', True)
+        }
+        if model.is_seasonal:
+            spec['seasonal_order'] = (model.seasonal_p or 0, model.seasonal_d or 0,
+                                      model.seasonal_q or 0, model.seasonal_m)
+        return spec
+    
+    @staticmethod
+    def fit_model(file_id, order, seasonal_order, trend, enforce_stationarity=True, enforce_invertibility=True, cov_type='robust_approx', model_id=None, fit_mode='full'):
         """
         Addestra modello SARIMAX con parametri specificati manualmente
         
@@ -134,10 +288,19 @@ class SarimaxService:
             enforce_stationarity: bool
             enforce_invertibility: bool
             cov_type: str, tipo di covarianza ('robust_approx', 'opg', etc.)
+            model_id: Model già creato in stato 'pending' (job asincrono); se None ne crea uno
+            fit_mode: 'full' (errori standard, summary) o 'fast' (solo stime puntuali,
+                AIC/BIC e metriche; la diagnostica si calcola poi con compute_diagnostics)
         
         Returns:
-            model (Model), fitted_results (SARIMAXResults)
+            model (Model), fitted_results (SARIMAXResults; None se i risultati sono
+            stati copiati da un fit identico già completato)
         """
+        import time
+        started = time.time()
+        if fit_mode not in FIT_MODES:
+            raise ValueError(f"fit_mode deve essere uno tra {FIT_MODES}")
+        
         file_record = File.query.get(file_id)
         if not file_record:
             raise ValueError("File non trovato")
@@ -145,37 +308,15 @@ class SarimaxService:
         if file_record.train_start_date is None:
             raise ValueError("Split non ancora applicato")
         
-        # Carica dati seguendo la catena di trasformazioni: diff -> log -> smoothed -> original
-        # L'ordine di applicazione è: smoothing -> log -> diff
-        # Quindi per SARIMAX usiamo: diff se presente, altrimenti log, altrimenti smoothed, altrimenti original
-        if file_record.differenced_file_path and os.path.exists(file_record.differenced_file_path):
-            df = FileService.load_and_validate(file_record.differenced_file_path)
-        elif file_record.log_transformed_file_path and os.path.exists(file_record.log_transformed_file_path):
-            df = FileService.load_and_validate(file_record.log_transformed_file_path)
-        elif file_record.smoothed_file_path and os.path.exists(file_record.smoothed_file_path):
-            df = FileService.load_and_validate(file_record.smoothed_file_path)
-        else:
-            df = FileService.load_and_validate(file_record.file_path)
-        
-        # Calcola train_obs da train_split_ratio (per retrocompatibilità)
-        # train_split_ratio è salvato come float (es. 0.8 per 80%)
-        n_total = len(df)
-        if file_record.train_split_ratio:
-            train_obs = int(n_total * file_record.train_split_ratio)
-            # Assicura che ci sia almeno 1 osservazione nel test set
-            if train_obs >= n_total:
-                train_obs = n_total - 1
-        else:
-            # Default: 80% del dataset
-            train_obs = int(n_total * 0.8)
-        
-        # Applica split usando train_obs
-        train_df, test_df = split_train_test(df, train_obs)
+        train_df, test_df = SarimaxService.load_train_test(file_record)
         train_series = train_df.set_index('data')['y']
         
-        # Crea modello nel DB
-        model = Model(file_id=file_id, status='running')
-        db.session.add(model)
+        # Crea modello nel DB (o riprende quello 'pending' creato alla richiesta)
+        model = db.session.get(Model, model_id) if model_id is not None else None
+        if model is None:
+            model = Model(file_id=file_id)
+            db.session.add(model)
+        model.status = 'running'
         db.session.commit()
         
         try:
@@ -205,6 +346,23 @@ class SarimaxService:
             else:
                 trend_param = 'n'
             
+            # Fit identico (stessi dati, split e specifica) già completato: copia i risultati
+            model.fit_fingerprint = SarimaxService.fit_fingerprint(
+                file_record, len(train_df), order_tuple, seasonal_order_tuple, trend_param,
+                enforce_stationarity, enforce_invertibility, cov_type, fit_mode
+            )
+            source = Model.query.filter(
+                Model.fit_fingerprint == model.fit_fingerprint,
+                Model.status == 'completed',
+                Model.model_id != model.model_id
+            ).order_by(Model.model_id).first()
+            if source is not None:
+                SarimaxService._clone_fit(source, model)
+                model.status = 'completed'
+                model.fit_seconds = time.time() - started
+                db.session.commit()
+                return model, None
+            
             # Crea e addestra modello SARIMAX
             sarimax_model = SARIMAX(
                 train_series,
@@ -215,8 +373,38 @@ class SarimaxService:
                 enforce_invertibility=enforce_invertibility
             )
             
-            # Fit modello
-            fitted_results = sarimax_model.fit(disp=False, cov_type=cov_type)
+            # Modalità 'fast': nessuna covarianza dei parametri (Hessiana numerica) e
+            # filtro a memoria ridotta durante la stima
+            fit_kwargs = {'cov_type': cov_type} if fit_mode == 'full' else {'cov_type': 'none', 'low_memory': True}
+            
+            # Fit modello, partendo se possibile dai parametri del modello più simile già stimato
+            warm_source, start_params = SarimaxService._warm_start(file_record, model, sarimax_model)
+            fitted_results = None
+            if start_params is not None:
+                try:
+                    fitted_results = sarimax_model.fit(disp=False, start_params=start_params, **fit_kwargs)
+                except (ValueError, np.linalg.LinAlgError) as e:
+                    # Parametri di partenza non ammissibili (es. AR non stazionario dopo il cambio d'ordine)
+                    print(f"Warm start dal modello {warm_source.model_id} non riuscito: {e}")
+                    warm_source = None
+            if fitted_results is None:
+                fitted_results = sarimax_model.fit(disp=False, **fit_kwargs)
+            
+            model.optimizer_iterations = int((getattr(fitted_results, 'mle_retvals', None) or {}).get('iterations') or 0)
+            if fit_mode == 'fast':
+                # Un solo passaggio del filtro completo per valori fitted, previsioni e stato finale
+                fitted_results = sarimax_model.filter(fitted_results.params, cov_type='none')
+            model.warm_start_model_id = warm_source.model_id if warm_source is not None else None
+            if warm_source is not None:
+                # Il risultato dipende anche dal punto di partenza, che l'impronta non
+                # descrive: un fit a caldo non viene riusato per richieste identiche
+                model.fit_fingerprint = None
+            # Stima, non misura: il fit a freddo della nuova specifica non viene eseguito e
+            # le iterazioni a freddo sono quelle del modello di partenza (specifica diversa)
+            model.iterations_saved_estimate = None
+            if warm_source is not None and warm_source.optimizer_iterations is not None:
+                cold_iterations = warm_source.optimizer_iterations + (warm_source.iterations_saved_estimate or 0)
+                model.iterations_saved_estimate = max(0, cold_iterations - model.optimizer_iterations)
             
             # Salva parametri modello
             if isinstance(p_val, list):
@@ -240,15 +428,34 @@ class SarimaxService:
             model.aic = float(fitted_results.aic)
             model.bic = float(fitted_results.bic) if hasattr(fitted_results, 'bic') else None
             
-            # Estrai output completo
-            SarimaxService._extract_model_output(model, fitted_results)
+            # Estrai output completo (in modalità 'fast' solo i coefficienti)
+            model.fit_mode = fit_mode
+            if fit_mode == 'full':
+                SarimaxService._extract_model_output(model, fitted_results)
+            else:
+                model.estimated_params = json.dumps(
+                    {str(name): float(value) for name, value in fitted_results.params.items()}
+                )
             
             db.session.commit()
             
+            # Salva il modello stimato: gli usi successivi non richiedono un nuovo fit
+            try:
+                ModelArtifactStore.save(model.model_id, fitted_results, {
+                    'order': order_tuple,
+                    'seasonal_order': seasonal_order_tuple,
+                    'trend': trend_param,
+                    'enforce_stationarity': enforce_stationarity,
+                    'enforce_invertibility': enforce_invertibility
+                })
+            except Exception as e:
+                print(f"Errore salvataggio artefatto modello {model.model_id}: {e}")
+            
             # Genera previsioni e calcola metriche
             SarimaxService._generate_forecasts_and_metrics(model, fitted_results, train_df, test_df, order_tuple)
             
             model.status = 'completed'
+            model.fit_seconds = time.time() - started
             db.session.commit()
             
             return model, fitted_results
@@ -260,6 +467,194 @@ class SarimaxService:
             traceback.print_exc()
             raise e
     
+    @staticmethod
+    def compute_diagnostics(model, cov_type=None):
+        """
+        Seconda fase di un fit: errori standard, summary e test sui residui
+        
+        Nessuna nuova stima: i parametri salvati vengono applicati con filter()
+        alle osservazioni di train del run, calcolando solo la covarianza dei
+        parametri. Il Model passa in modalità 'full'; i test sui residui e la
+        durata vengono salvati nella configurazione del ModelRun ('diagnostics').
+        
+        Args:
+            model: Model completato
+            cov_type: tipo di covarianza (default: quello richiesto al fit)
+        
+        Returns:
+            dict con model_id, cov_type, test sui residui e tempi
+        """
+        import time
+        from forecast_service import ForecastService
+        started = time.time()
+        
+        model_run = ForecastService.latest_run(model)
+        if model_run is None or not model.estimated_params:
+            raise ValueError('Parametri del modello non disponibili')
+        configuration = json.loads(model_run.configuration) if model_run.configuration else {}
+        cov_type = cov_type or configuration.get('cov_type') or 'robust_approx'
+        if cov_type == 'none':
+            cov_type = 'robust_approx'
+        spec = SarimaxService.model_spec(model, configuration)
+        
+        dates, values = TransformService.series(model.file, TransformRecipe.from_config(configuration))
+        # Stessa regola di split di load_train_test, dove i parametri sono stati stimati
+        n_train = SarimaxService.train_obs_count(model.file, len(values))
+        # Serie con indice di date come al fit (il summary riporta il periodo del campione)
+        train_series = pd.Series(values[:n_train], index=pd.DatetimeIndex(dates[:n_train].view('datetime64[ns]')))
+        
+        import warnings
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            sarimax_model = SARIMAX(train_series, **spec)
+            saved = json.loads(model.estimated_params)
+            if list(saved) != list(sarimax_model.param_names):
+                raise ValueError('I parametri salvati non corrispondono alla specifica del modello')
+            results = sarimax_model.filter(pd.Series(saved)[sarimax_model.param_names], cov_type=cov_type)
+            
+            SarimaxService._extract_model_output(model, results)
+            
+            nobs = int(results.nobs)
+            lags = [lag for lag in (5, 10, 20) if lag < nobs // 2] or [1]
+            ljung_box = results.test_serial_correlation('ljungbox', lags=max(lags))[0]
+            jarque_bera = results.test_normality('jarquebera')[0]
+            heteroskedasticity = results.test_heteroskedasticity('breakvar')[0]
+        
+        finite = lambda value: float(value) if np.isfinite(value) else None
+        diagnostics = {
+            'cov_type': cov_type,
+            'ljung_box': [
+                {'lag': lag, 'stat': finite(ljung_box[0][lag - 1]), 'pvalue': finite(ljung_box[1][lag - 1])}
+                for lag in lags
+            ],
+            'jarque_bera': {
+                'stat': finite(jarque_bera[0]), 'pvalue': finite(jarque_bera[1]),
+                'skew': finite(jarque_bera[2]), 'kurtosis': finite(jarque_bera[3])
+            },
+            'heteroskedasticity': {'stat': finite(heteroskedasticity[0]), 'pvalue': finite(heteroskedasticity[1])},
+            'seconds': time.time() - started
+        }
+        
+        model.fit_mode = 'full'
+        model.diagnostics_seconds = diagnostics['seconds']
+        if model.fit_fingerprint is not None:
+            # Stesse stime di un fit 'full' con questo cov_type: l'impronta diventa quella
+            # del fit completo, così un fit 'fast' non viene più riusato dopo la promozione
+            model.fit_fingerprint = SarimaxService.fit_fingerprint(
+                model.file, n_train, spec['order'], spec['seasonal_order'], spec['trend'],
+                spec['enforce_stationarity'], spec['enforce_invertibility'], cov_type, 'full',
+                recipe=TransformRecipe.from_config(configuration)
+            )
+        configuration['diagnostics'] = diagnostics
+        model_run.configuration = json.dumps(configuration)
+        db.session.commit()
+        
+        return {
+            'model_id': model.model_id,
+            'run_id': model_run.run_id,
+            'fit_mode': model.fit_mode,
+            'fit_seconds': model.fit_seconds,
+            'diagnostics_seconds': model.diagnostics_seconds,
+            **diagnostics
+        }
+    
+    @staticmethod
+    def _warm_start(file_record, model, sarimax_model):
+        """
+        Parametri di partenza dal modello più simile già stimato sullo stesso file
+        
+        Tra i fit completati più recenti con la stessa ricetta di trasformazione
+        (stessa scala dei dati) si sceglie quello che ha più parametri in comune
+        con il nuovo modello. I parametri in comune vengono copiati, i nuovi
+        partono dai valori di default di statsmodels: nuovi coefficienti AR e MA
+        entrambi a zero sarebbero un punto stazionario della verosimiglianza
+        (fattori comuni) da cui l'ottimizzatore non si muove.
+        
+        Returns:
+            (Model di partenza, array start_params) oppure (None, None)
+        """
+        if not Config.FIT_WARM_START:
+            return None, None
+        recipe = TransformRecipe.from_file(file_record)
+        candidates = (
+            db.session.query(Model, ModelRun.configuration)
+            .join(ModelRun, ModelRun.model_id == Model.model_id)
+            .filter(ModelRun.file_id == file_record.file_id,
+                    Model.status == 'completed',
+                    Model.estimated_params.isnot(None),
+                    Model.model_id != model.model_id)
+            .order_by(ModelRun.created_at.desc(), ModelRun.run_id.desc())
+            .limit(Config.FIT_WARM_START_CANDIDATES)
+            .all()
+        )
+        
+        names = sarimax_model.param_names
+        source, source_params, best_overlap = None, None, 0
+        for candidate, configuration in candidates:
+            if TransformRecipe.from_config(json.loads(configuration or '{}')) != recipe:
+                continue
+            saved = json.loads(candidate.estimated_params)
+            overlap = sum(1 for name in names if name in saved and name != 'sigma2')
+            if overlap > best_overlap:
+                source, source_params, best_overlap = candidate, saved, overlap
+        if source is None:
+            return None, None
+        
+        start_params = np.array(sarimax_model.start_params, dtype=np.float64)
+        for i, name in enumerate(names):
+            if name in source_params:
+                start_params[i] = source_params[name]
+        return source, start_params
+    
+    @staticmethod
+    def fit_fingerprint(file_record, train_obs, order, seasonal_order, trend,
+                        enforce_stationarity, enforce_invertibility, cov_type, fit_mode='full',
+                        recipe=None):
+        """
+        Impronta di un fit: contenuto della serie trasformata (date e valori), split,
+        specifica e modalità del fit
+        
+        Due fit a freddo con la stessa impronta producono gli stessi risultati; i fit
+        partiti dai parametri di un altro modello (warm start) non hanno impronta.
+        """
+        dates, values = TransformService.series(file_record, recipe)
+        digest = hashlib.sha256()
+        digest.update(np.ascontiguousarray(dates, dtype=np.int64).tobytes())
+        digest.update(np.ascontiguousarray(values, dtype=np.float64).tobytes())
+        digest.update(json.dumps([
+            FIT_FINGERPRINT_VERSION, int(train_obs), order, seasonal_order, trend,
+            bool(enforce_stationarity), bool(enforce_invertibility), cov_type, fit_mode
+        ], default=int).encode('utf-8'))
+        return digest.hexdigest()
+    
+    @staticmethod
+    def _clone_fit(source, model):
+        """
+        Copia su model i risultati di un fit identico: campi del Model, previsioni
+        (righe e serie colonnare), metriche e artefatto del modello stimato
+        
+        Le righe vengono copiate con INSERT ... SELECT, senza passare da Python.
+        """
+        for column in CLONED_MODEL_COLUMNS:
+            setattr(model, column, getattr(source, column))
+        model.cloned_from_model_id = source.cloned_from_model_id or source.model_id
+        
+        for table_model in (Forecast, ForecastSeries, Metrics):
+            table = table_model.__table__
+            columns = [c.name for c in table.columns if not c.primary_key and c.name != 'model_id']
+            db.session.execute(
+                db.insert(table_model).from_select(
+                    ['model_id'] + columns,
+                    db.select(db.literal(model.model_id), *[table.c[name] for name in columns])
+                    .where(table.c.model_id == source.model_id)
+                )
+            )
+        
+        try:
+            ModelArtifactStore.copy(source.model_id, model.model_id)
+        except OSError as e:
+            print(f"Errore copia artefatto modello {source.model_id}: {e}")
+    
     @staticmethod
     def _extract_model_output(model, fitted_results):
         """Estrae output completo dal modello SARIMAX"""
@@ -422,6 +817,17 @@ class SarimaxService:
         
         return aligned
     
+    @staticmethod
+    def _bulk_insert_forecasts(rows):
+        """
+        Inserisce le righe Forecast (lista di dict) in blocco via Core executemany
+        
+        I default delle colonne (created_at, confidence_level) vengono applicati
+        da SQLAlchemy anche in questo percorso.
+        """
+        if rows:
+            db.session.execute(db.insert(Forecast), rows)
+    
     @staticmethod
     def _generate_forecasts_and_metrics(model, fitted_results, train_df, test_df, order):
         """Genera previsioni e calcola metriche su training e test"""
@@ -458,37 +864,55 @@ class SarimaxService:
         test_conf_int.index = test_dates
         test_actual = test_df['y'].values
         
-        # Salva previsioni training
-        for date in common_dates:
-            actual = train_actual_aligned.loc[date]
-            fitted = train_fitted_aligned.loc[date]
-            forecast_record = Forecast(
-                model_id=model.model_id,
-                forecast_date=pd.to_datetime(date),
-                forecasted_value=float(fitted),
-                actual_value=float(actual),
-                category='train'
-            )
-            db.session.add(forecast_record)
-        
-        # Salva previsioni test
-        for i, date in enumerate(test_dates):
-            actual = test_actual[i]
-            forecast = test_forecasts.iloc[i]
-            ci_lower = test_conf_int.iloc[i, 0]
-            ci_upper = test_conf_int.iloc[i, 1]
-            
-            forecast_record = Forecast(
-                model_id=model.model_id,
-                forecast_date=pd.to_datetime(date),
-                forecasted_value=float(forecast),
-                actual_value=float(actual),
-                ci_lower=float(ci_lower),
-                ci_upper=float(ci_upper),
-                category='test'
+        # Salva previsioni training e test con un unico INSERT executemany
+        # (nessun oggetto ORM per riga: evita unit of work e identity map)
+        train_dates = pd.DatetimeIndex(common_dates).to_pydatetime()
+        train_fitted_list = train_fitted_aligned.to_numpy(dtype=float).tolist()
+        train_actual_list = train_actual_aligned.to_numpy(dtype=float).tolist()
+        rows = [
+            {
+                'model_id': model.model_id,
+                'forecast_date': date,
+                'forecasted_value': fitted,
+                'actual_value': actual,
+                'category': 'train'
+            }
+            for date, fitted, actual in zip(train_dates, train_fitted_list, train_actual_list)
+        ]
+        
+        test_conf_values = test_conf_int.to_numpy(dtype=float)
+        rows.extend(
+            {
+                'model_id': model.model_id,
+                'forecast_date': date,
+                'forecasted_value': forecast,
+                'actual_value': actual,
+                'ci_lower': ci_lower,
+                'ci_upper': ci_upper,
+                'category': 'test'
+            }
+            for date, forecast, actual, ci_lower, ci_upper in zip(
+                pd.DatetimeIndex(test_dates).to_pydatetime(),
+                test_forecasts.to_numpy(dtype=float).tolist(),
+                np.asarray(test_actual, dtype=float).tolist(),
+                test_conf_values[:, 0].tolist(),
+                test_conf_values[:, 1].tolist()
             )
-            db.session.add(forecast_record)
+        )
+        SarimaxService._bulk_insert_forecasts(rows)
         
+        # Stessa serie in forma colonnare (una riga), letta dagli endpoint dei grafici
+        n_train, n_test = len(train_dates), len(test_dates)
+        nan_train = np.full(n_train, np.nan)
+        ForecastSeriesStore.save(
+            model.model_id,
+            np.concatenate([pd.DatetimeIndex(common_dates).values, pd.DatetimeIndex(test_dates).values]),
+            np.concatenate([train_fitted_aligned.to_numpy(dtype=float), test_forecasts.to_numpy(dtype=float)]),
+            np.concatenate([train_actual_aligned.to_numpy(dtype=float), np.asarray(test_actual, dtype=float)]),
+            np.concatenate([nan_train, test_conf_values[:, 0]]),
+            np.concatenate([nan_train, test_conf_values[:, 1]]),
+            np.repeat(np.array([CATEGORY_CODES['train'], CATEGORY_CODES['test']], dtype=np.uint8), [n_train, n_test])
+        )
         db.session.commit()
         
         # Calcola metriche training
@@ -544,44 +968,95 @@ class SarimaxService:
         
         db.session.commit()
 
+class ResidualService:
+    """Diagnostica dei residui di train di un modello (tabella Residuals)"""
+
+    @staticmethod
+    def compute(model_id):
+        """
+        Calcola e salva la diagnostica dei residui (actual - fitted sulle righe di train)
+
+        Eseguita come job in background dopo ogni fit: i residui vengono letti
+        dalla serie colonnare delle previsioni, senza filtrare di nuovo il
+        modello, e tutti i test derivano da un solo passaggio vettoriale
+        (utils.residual_diagnostics). Una riga Residuals esistente viene aggiornata.
+
+        Returns:
+            Residuals salvato, o None se il modello non esiste o non ha previsioni di train
+        """
+        from utils import residual_diagnostics
+        model = db.session.get(Model, model_id)
+        if model is None or model.status != 'completed':
+            return None
+        series = ForecastSeriesStore.load(model_id)
+        if series is None:
+            return None
+        train = series['category'] == CATEGORY_CODES['train']
+        diagnostics = residual_diagnostics(series['actual'][train] - series['forecasted'][train])
+
+        # Colonne del test singolo: lag 10 se disponibile, altrimenti il più alto calcolato
+        ljung_box = diagnostics['ljung_box']
+        main = next((item for item in ljung_box if item['lag'] == 10), ljung_box[-1])
+
+        residuals = Residuals.query.filter_by(model_id=model_id).first()
+        if residuals is None:
+            residuals = Residuals(model_id=model_id)
+            db.session.add(residuals)
+        for column in ('n_obs', 'mean', 'std', 'min', 'max', 'skewness', 'kurtosis', 'normality_passed'):
+            setattr(residuals, column, diagnostics[column])
+        residuals.ljung_box_stat = main['stat']
+        residuals.ljung_box_pvalue = main['pvalue']
+        residuals.jarque_bera_stat = diagnostics['jarque_bera']['stat']
+        residuals.jarque_bera_pvalue = diagnostics['jarque_bera']['pvalue']
+        residuals.ljung_box_lags = json.dumps(ljung_box)
+        residuals.residual_acf = json.dumps(diagnostics['acf'])
+        residuals.computed_at = datetime.utcnow()
+        db.session.commit()
+        return residuals
+
+    @staticmethod
+    def to_dict(residuals):
+        """Riga Residuals in formato JSON (None se assente)"""
+        if residuals is None:
+            return None
+        return {
+            'model_id': residuals.model_id,
+            'n_obs': residuals.n_obs,
+            'mean': residuals.mean,
+            'std': residuals.std,
+            'min': residuals.min,
+            'max': residuals.max,
+            'skewness': residuals.skewness,
+            'kurtosis': residuals.kurtosis,
+            'ljung_box': {'stat': residuals.ljung_box_stat, 'pvalue': residuals.ljung_box_pvalue},
+            'ljung_box_lags': json.loads(residuals.ljung_box_lags) if residuals.ljung_box_lags else [],
+            'jarque_bera': {'stat': residuals.jarque_bera_stat, 'pvalue': residuals.jarque_bera_pvalue},
+            'normality_passed': residuals.normality_passed,
+            'acf': json.loads(residuals.residual_acf) if residuals.residual_acf else None,
+            'computed_at': residuals.computed_at.isoformat() if residuals.computed_at else None
+        }
+
 class VisualizationService:
     """Servizio per generare grafici"""
     
     @staticmethod
     def get_plot_base64(file_id):
-        """Genera grafico e restituisce come base64 per embedding HTML"""
-        import matplotlib
-        matplotlib.use('Agg')
-        import matplotlib.pyplot as plt
+        """
+        Genera grafico e restituisce come base64 per embedding HTML
+        
+        La serie viene letta dall'archivio binario e il PNG dalla cache delle
+        immagini (RenderService): viene ridisegnato solo se il contenuto cambia.
+        """
         import base64
-        import io
+        from render_service import RenderService
         
         file_record = File.query.get(file_id)
         if not file_record:
             raise ValueError("File non trovato")
         
-        # Carica dati (solo CSV)
-        df = pd.read_csv(file_record.file_path)
-        
-        df['data'] = pd.to_datetime(df['data'])
-        df = df.sort_values('data').reset_index(drop=True)
-        
-        # Crea grafico
-        plt.figure(figsize=(12, 6))
-        plt.plot(df['data'], df['y'], linewidth=2, color='#1f4788', marker='o', markersize=3)
-        plt.title('Serie Storica Completa', fontsize=16, fontweight='bold')
-        plt.xlabel('Data', fontsize=12)
-        plt.ylabel('Valore (y)', fontsize=12)
-        plt.grid(True, alpha=0.3)
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        
-        # Converti in base64
-        buffer = io.BytesIO()
-        plt.savefig(buffer, format='png', dpi=150, bbox_inches='tight')
-        buffer.seek(0)
-        image_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-        plt.close()
+        dates, values = FileService.load_series(file_record.file_path)
+        with open(RenderService.series_plot(dates, values), 'rb') as fh:
+            image_base64 = base64.b64encode(fh.read()).decode('utf-8')
         
         return f"data:image/png;base64,{image_base64}"
 
@@ -0,0 +1,103 @@
+"""
+Configurazione comune dei test.
+
+I moduli del backend si importano in forma piatta (from models import *), come
+fa app.py: la cartella backend viene aggiunta al path. Database e cartelle
+dati puntano a una directory temporanea prima dell'import di config, così i
+test non toccano instance/ né data/.
+"""
+import io
+import os
+import sys
+import time
+import shutil
+import tempfile
+import itertools
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_DIR = os.path.dirname(BACKEND_DIR)
+SAMPLE_CSV = os.path.join(REPO_DIR, 'ftse_mib_esempio.csv')
+
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+_DATA_DIR = tempfile.mkdtemp(prefix='dash-tests-')
+os.environ.update(
+    DATABASE_URL=f'sqlite:///{os.path.join(_DATA_DIR, "test.db")}',
+    UPLOAD_FOLDER=os.path.join(_DATA_DIR, 'uploads'),
+    SERIES_STORE_FOLDER=os.path.join(_DATA_DIR, 'series'),
+    MODEL_ARTIFACTS_FOLDER=os.path.join(_DATA_DIR, 'models'),
+    AI_IMAGES_FOLDER=os.path.join(_DATA_DIR, 'ai_images'),
+    EXPORT_FOLDER=os.path.join(_DATA_DIR, 'exports'),
+    AUTO_SELECT_MP_CONTEXT='fork',
+    AUTO_SELECT_WORKERS='1',
+    BACKTEST_WORKERS='1'
+)
+
+_emails = itertools.count()
+
+
+@pytest.fixture(scope='session')
+def sample_csv():
+    """CSV di esempio del repository (FTSE MIB, giorni di borsa)"""
+    return SAMPLE_CSV
+
+
+@pytest.fixture(scope='session')
+def app():
+    from app import create_app
+    app = create_app()
+    app.config['TESTING'] = True
+    yield app
+    shutil.rmtree(_DATA_DIR, ignore_errors=True)
+
+
+@pytest.fixture
+def client(app):
+    """Client di test con un nuovo utente registrato (e autenticato)"""
+    client = app.test_client()
+    response = client.post('/api/register', json={
+        'name': 'Test', 'surname': 'User',
+        'email': f'user{next(_emails)}@example.com', 'password': 'secret1'
+    })
+    assert response.status_code in (200, 201), response.get_data(as_text=True)
+    client.user_id = response.get_json()['user']['user_id']
+    return client
+
+
+@pytest.fixture
+def split_file(client, sample_csv):
+    """CSV di esempio caricato dal client con split train/test applicato; restituisce file_id"""
+    with open(sample_csv, 'rb') as fh:
+        response = client.post('/api/upload-temp', data={'file': (io.BytesIO(fh.read()), 'ftse.csv')},
+                               content_type='multipart/form-data')
+    assert response.status_code in (200, 201), response.get_data(as_text=True)
+    file_id = response.get_json()['file_id']
+    assert client.post(f'/api/file/{file_id}/apply-split', json={'train_obs': 1000}).status_code == 200
+    return file_id
+
+
+@pytest.fixture
+def wait_job(client):
+    """Attende la fine di un job del client seguendo GET /api/jobs/<job_id>"""
+    def wait(job_id, timeout=120):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            job = client.get(f'/api/jobs/{job_id}').get_json()
+            if job['status'] in ('completed', 'failed'):
+                return job
+            time.sleep(0.05)
+        raise AssertionError(f'Job {job_id} non terminato entro {timeout}s')
+    return wait
+
+
+@pytest.fixture
+def fitted(client, split_file, wait_job):
+    """File di esempio con split applicato e un fit ARIMA(1,1,1) completato in background"""
+    response = client.post(f'/api/file/{split_file}/fit-sarimax', json={'p': 1, 'd': 1, 'q': 1})
+    assert response.status_code == 202
+    job = wait_job(response.get_json()['job_id'])
+    assert job['status'] == 'completed', job['error']
+    return split_file, job['result']
@@ -0,0 +1,112 @@
+"""Backtest rolling origin: origini, metriche per orizzonte e indipendenza da n_jobs"""
+import warnings
+
+import numpy as np
+import pytest
+from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+from backtest import Backtest, evaluate_origins, horizon_metrics, rolling_origins
+
+SPEC = {'order': (1, 0, 1), 'seasonal_order': (0, 0, 0, 0), 'trend': 'c',
+        'enforce_stationarity': True, 'enforce_invertibility': True}
+
+
+@pytest.fixture(scope='module')
+def values():
+    rng = np.random.default_rng(11)
+    noise = rng.normal(size=400)
+    out = np.zeros(400)
+    for t in range(1, 400):
+        out[t] = 0.5 + 0.7 * out[t - 1] + noise[t] + 0.2 * noise[t - 1]
+    return out
+
+
+def test_rolling_origins():
+    np.testing.assert_array_equal(rolling_origins(10, 5, 2), [5, 6, 7, 8])
+    np.testing.assert_array_equal(rolling_origins(20, 5, 1, step=4), [5, 9, 13, 17])
+    assert len(rolling_origins(5, 5, 1)) == 0
+    thinned = rolling_origins(1000, 100, 5, max_origins=10)
+    assert len(thinned) == 10
+    assert thinned[0] == 100 and thinned[-1] == 1000 - 5
+    assert np.all(np.diff(thinned) > 0)
+
+
+def test_horizon_metrics_skips_zero_actuals_in_mape():
+    actual = np.array([[0.0, 2.0], [4.0, 5.0]])
+    forecasts = np.array([[1.0, 1.0], [2.0, 5.0]])
+    metrics = horizon_metrics(actual, forecasts)
+    assert metrics['by_horizon'][0]['mape'] == pytest.approx(50.0)
+    assert metrics['by_horizon'][1]['mae'] == pytest.approx(0.5)
+    assert metrics['overall']['rmse'] == pytest.approx(np.sqrt((1 + 1 + 4 + 0) / 4))
+
+
+@pytest.mark.parametrize('window', ['expanding', 'sliding'])
+def test_evaluate_origins_matches_refiltering_each_origin(values, window):
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        params = SARIMAX(values[:300], **SPEC).fit(disp=False).params
+        origins = np.array([300, 301, 305, 320])
+        out = evaluate_origins(values, origins, 3, SPEC, params, window=window, window_size=250)
+        for i, origin in enumerate(origins):
+            start = origin - 250 if window == 'sliding' else 0
+            expected = SARIMAX(values[start:origin], **SPEC).filter(params).forecast(3)
+            np.testing.assert_allclose(out['forecasts'][i], expected, rtol=1e-8, atol=1e-8)
+
+
+def test_fixed_params_parallel_blocks_match_single_block(values):
+    kwargs = dict(horizon=2, initial=150, max_origins=None)
+    single = Backtest(values, SPEC, n_jobs=1, **kwargs).run()
+    parallel = Backtest(values, SPEC, n_jobs=2, mp_context='fork', **kwargs).run()
+    assert parallel['n_jobs'] == 2
+    for got, expected in zip(parallel['metrics']['by_horizon'], single['metrics']['by_horizon']):
+        assert got == pytest.approx(expected, rel=1e-9)
+
+
+def test_warm_params_do_not_depend_on_n_jobs(values):
+    kwargs = dict(horizon=1, initial=150, max_origins=None, param_mode='warm', refit_every=40)
+    single = Backtest(values, SPEC, n_jobs=1, **kwargs).run()
+    many = Backtest(values, SPEC, n_jobs=4, mp_context='fork', **kwargs).run()
+    assert many['n_jobs'] == 1
+    assert many['refits'] == single['refits'] == (single['n_origins'] - 1) // 40
+    assert many['metrics'] == single['metrics']
+
+
+def test_backtest_rejects_short_series(values):
+    with pytest.raises(ValueError):
+        Backtest(values[:20], SPEC, horizon=30, initial=10)
+
+
+@pytest.mark.parametrize('body', [
+    {'initial': 1300, 'horizon': 30},
+    {'horizon': 300},
+    {'window': 'sliding', 'window_size': 5000},
+])
+def test_backtest_route_checks_series_length(client, fitted, body):
+    # Serie di esempio: circa 1300 osservazioni, 1000 nel train
+    response = client.post(f"/api/model-run/{fitted[1]['run_id']}/backtest", json=body)
+    assert response.status_code == 400, response.get_data(as_text=True)
+
+
+def test_backtest_job_uses_fit_train_window(app, client, fitted, wait_job):
+    import json
+    from database import db
+    from models import ModelRun
+    from services import SarimaxService
+    run_id = fitted[1]['run_id']
+    # train_obs salvato nella configurazione non più allineato alla serie trasformata
+    with app.app_context():
+        run = db.session.get(ModelRun, run_id)
+        configuration = json.loads(run.configuration)
+        configuration['train_obs'] = 700
+        run.configuration = json.dumps(configuration)
+        db.session.commit()
+        n_train = SarimaxService.train_obs_count(run.file, run.file.n_observations)
+
+    response = client.post(f'/api/model-run/{run_id}/backtest', json={'horizon': 5, 'max_origins': 20})
+    assert response.status_code == 202, response.get_data(as_text=True)
+    job = wait_job(response.get_json()['job_id'])
+    assert job['status'] == 'completed', job['error']
+    result = job['result']['backtest']
+    # Prima origine = osservazioni del fit, con i parametri salvati (nessun nuovo fit)
+    assert result['first_origin'] == n_train
+    assert result['initial_fit'] is False
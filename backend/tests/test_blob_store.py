@@ -0,0 +1,91 @@
+"""Deduplicazione degli upload: conteggio dei riferimenti e raccolta dei blob"""
+import io
+import os
+import uuid
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from blob_store import BlobStore
+from database import db
+from models import Blob, File
+from series_store import SeriesStore
+
+
+@pytest.fixture
+def csv_bytes():
+    """CSV valido con contenuto unico (il database dei test è condiviso)"""
+    rng = np.random.default_rng(uuid.uuid4().int % 2**32)
+    frame = pd.DataFrame({'data': pd.bdate_range('2020-01-01', periods=200).strftime('%Y-%m-%d'),
+                          'y': np.round(1000 + np.cumsum(rng.normal(size=200)), 4)})
+    return frame.to_csv(index=False).encode()
+
+
+def upload(client, content):
+    response = client.post('/api/upload-temp', data={'file': (io.BytesIO(content), 'serie.csv')},
+                           content_type='multipart/form-data')
+    assert response.status_code in (200, 201), response.get_data(as_text=True)
+    return response.get_json()
+
+
+def delete_file(app, file_id):
+    with app.app_context():
+        db.session.delete(db.session.get(File, file_id))
+        db.session.commit()
+
+
+def test_same_content_shares_one_blob(app, client, csv_bytes):
+    first = upload(client, csv_bytes)
+    second = upload(client, csv_bytes)
+    assert second['deduplicated']
+    with app.app_context():
+        paths = {db.session.get(File, f['file_id']).file_path for f in (first, second)}
+        blob = db.session.get(Blob, db.session.get(File, first['file_id']).content_hash)
+        assert paths == {blob.path}
+        assert blob.ref_count == 2
+
+
+def test_deleting_last_file_removes_blob_and_artifacts(app, client, csv_bytes):
+    first = upload(client, csv_bytes)
+    second = upload(client, csv_bytes)
+    # Statistiche e ACF/PACF della serie originale finiscono negli artefatti condivisi
+    assert client.get(f"/api/file/{first['file_id']}/data").status_code == 200
+    with app.app_context():
+        file_record = db.session.get(File, first['file_id'])
+        content_hash, path = file_record.content_hash, file_record.file_path
+        derived = BlobStore.derived_dir(content_hash)
+    assert os.path.exists(path) and os.path.isdir(derived)
+
+    delete_file(app, first['file_id'])
+    with app.app_context():
+        assert db.session.get(Blob, content_hash).ref_count == 1
+    assert os.path.exists(path)
+
+    delete_file(app, second['file_id'])
+    with app.app_context():
+        assert db.session.get(Blob, content_hash) is None
+    assert not os.path.exists(path)
+    assert not os.path.exists(derived)
+    assert not any(os.path.exists(p) for p in SeriesStore.paths(path))
+
+
+def test_collect_garbage_keeps_blobs_referenced_again(app, client, csv_bytes):
+    uploaded = upload(client, csv_bytes)
+    with app.app_context():
+        content_hash = db.session.get(File, uploaded['file_id']).content_hash
+        # Riferimento rilasciato e subito ripreso (es. upload concorrente dello stesso contenuto)
+        BlobStore._add_ref(content_hash, -1)
+        BlobStore._add_ref(content_hash, 1)
+        db.session.commit()
+        assert BlobStore.collect_garbage([content_hash]) == 0
+        assert db.session.get(Blob, content_hash).ref_count == 1
+
+
+def test_invalid_upload_releases_its_blob(app, client):
+    content = f'data,y\nnon-una-data,{uuid.uuid4().int}\n'.encode()
+    response = client.post('/api/upload-temp', data={'file': (io.BytesIO(content), 'rotto.csv')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 400
+    with app.app_context():
+        assert Blob.query.filter(Blob.ref_count <= 0).count() == 0
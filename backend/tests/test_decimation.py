@@ -0,0 +1,79 @@
+"""Decimazione dei grafici: LTTB e inviluppo min/max"""
+import numpy as np
+import pytest
+
+from decimation import lttb_indices, minmax_indices, decimate_indices
+
+
+def reference_lttb(x, y, n_out):
+    """LTTB punto per punto (stessi bucket di lttb_indices) come riferimento"""
+    n = len(y)
+    x = (np.asarray(x, dtype=np.int64) - x[0]).astype(np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = [0]
+    for i in range(n_out - 2):
+        start, stop = edges[i], edges[i + 1]
+        if i + 1 < n_out - 2:
+            nx, ny = x[edges[i + 1]:edges[i + 2]].mean(), y[edges[i + 1]:edges[i + 2]].mean()
+        else:
+            nx, ny = x[n - 1], y[n - 1]
+        ax, ay = x[selected[-1]], y[selected[-1]]
+        best, best_area = start, -1.0
+        for j in range(start, stop):
+            area = abs((ax - nx) * (y[j] - ay) - (ax - x[j]) * (ny - ay))
+            if area > best_area:
+                best, best_area = j, area
+        selected.append(best)
+    selected.append(n - 1)
+    return np.array(selected)
+
+
+@pytest.fixture
+def series():
+    rng = np.random.default_rng(3)
+    x = np.arange(5000, dtype=np.int64) * 86_400_000_000_000
+    y = np.cumsum(rng.normal(size=5000))
+    y[1234] += 40  # picco isolato
+    return x, y
+
+
+@pytest.mark.parametrize('n_out', [3, 10, 250])
+def test_lttb_matches_reference(series, n_out):
+    x, y = series
+    np.testing.assert_array_equal(lttb_indices(x, y, n_out), reference_lttb(x, y, n_out))
+
+
+def test_lttb_keeps_endpoints_and_spikes(series):
+    x, y = series
+    indices = lttb_indices(x, y, 200)
+    assert len(indices) == 200
+    assert indices[0] == 0 and indices[-1] == len(y) - 1
+    assert np.all(np.diff(indices) > 0)
+    assert 1234 in indices
+
+
+def test_lttb_returns_all_points_when_under_budget(series):
+    x, y = series
+    np.testing.assert_array_equal(lttb_indices(x[:50], y[:50], 100), np.arange(50))
+
+
+def test_minmax_keeps_bucket_extremes(series):
+    _, y = series
+    indices = minmax_indices(y, 102)
+    assert len(indices) <= 102
+    assert np.all(np.diff(indices) > 0)
+    assert {0, len(y) - 1, int(np.argmin(y)), int(np.argmax(y))} <= set(indices.tolist())
+
+
+def test_minmax_ignores_nan(series):
+    _, y = series
+    y = y.copy()
+    y[10:20] = np.nan
+    indices = minmax_indices(y, 50)
+    assert int(np.nanargmax(y)) in indices
+
+
+def test_decimate_indices_rejects_unknown_method(series):
+    x, y = series
+    with pytest.raises(ValueError):
+        decimate_indices(x, y, 100, method='every_nth')
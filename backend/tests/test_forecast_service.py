@@ -0,0 +1,67 @@
+"""Date e intervalli delle previsioni future"""
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.stats import norm
+
+from forecast_service import future_dates, interval_bounds, parse_levels
+
+
+def as_ns(index):
+    return pd.DatetimeIndex(index).values.astype('datetime64[ns]').view('int64')
+
+
+def test_trading_days_with_holidays_skip_weekends():
+    # Giorni lavorativi con due festività: pd.infer_freq non trova una frequenza
+    dates = pd.bdate_range('2024-08-01', '2024-09-27').delete([10, 20])
+    result = pd.DatetimeIndex(future_dates(as_ns(dates), 4))
+    assert list(result.strftime('%Y-%m-%d')) == ['2024-09-30', '2024-10-01', '2024-10-02', '2024-10-03']
+
+
+def test_sample_file_forecasts_start_on_monday(sample_csv):
+    dates = pd.to_datetime(pd.read_csv(sample_csv)['data']).sort_values()
+    result = pd.DatetimeIndex(future_dates(as_ns(dates), 10))
+    assert result[0] == pd.Timestamp('2024-09-30')
+    assert (result.dayofweek < 5).all()
+
+
+@pytest.mark.parametrize('index, expected', [
+    (pd.date_range('2024-01-31', periods=12, freq='ME'), ['2025-01-31', '2025-02-28']),
+    (pd.date_range('2024-01-01', periods=30, freq='D').delete([5]), ['2024-01-31', '2024-02-01']),
+    (pd.date_range('2024-01-06', periods=20, freq='7D'), ['2024-05-25', '2024-06-01']),
+])
+def test_inferred_and_most_common_step_frequencies(index, expected):
+    result = pd.DatetimeIndex(future_dates(as_ns(index), 2))
+    assert list(result.strftime('%Y-%m-%d')) == expected
+
+
+def test_hourly_series_with_gap_keeps_hourly_step():
+    index = pd.date_range('2024-01-01', periods=30, freq='h').delete([3])
+    result = pd.DatetimeIndex(future_dates(as_ns(index), 2))
+    assert list(result) == [index[-1] + pd.Timedelta(hours=1), index[-1] + pd.Timedelta(hours=2)]
+
+
+def test_parse_levels():
+    assert parse_levels('95,80, 95') == [0.8, 0.95]
+    assert parse_levels([90]) == [0.9]
+    for bad in ('0', '100', '', 'abc'):
+        with pytest.raises(ValueError):
+            parse_levels(bad)
+
+
+def test_interval_bounds_for_several_levels():
+    mean = np.array([1.0, 2.0])
+    variance = np.array([4.0, 0.25])
+    lower, upper = interval_bounds(mean, variance, [0.8, 0.95])
+    z = norm.ppf([0.9, 0.975])
+    np.testing.assert_allclose(upper - mean, z[:, None] * np.sqrt(variance))
+    np.testing.assert_allclose(mean - lower, upper - mean)
+
+
+def test_forecast_route_continues_trading_days(client, fitted):
+    response = client.post(f"/api/model/{fitted[1]['model_id']}/forecast?steps=3&levels=80,95")
+    assert response.status_code == 200, response.get_data(as_text=True)
+    data = response.get_json()
+    assert [d[:10] for d in data['dates']] == ['2024-09-30', '2024-10-01', '2024-10-02']
+    assert len(data['forecast']) == 3
+    assert data['scale'] == 'original'
@@ -0,0 +1,164 @@
+"""Job in background: registro dei job e fit SARIMAX asincrono"""
+import json
+import re
+import time
+
+import pytest
+
+from job_service import JobQueueFullError, JobService
+
+
+def wait_snapshot(job_id, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = JobService.get(job_id)
+        if job['status'] in ('completed', 'failed'):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f'Job {job_id} non terminato entro {timeout}s')
+
+
+def _boom():
+    raise ValueError('errore previsto')
+
+
+def test_job_lifecycle(app):
+    with app.app_context():
+        job = JobService.submit('test', lambda a, b=0: {'sum': a + b}, 2, b=3, user_id=1)
+        assert job['status'] in ('queued', 'running', 'completed')
+        done = wait_snapshot(job['job_id'])
+        assert done['status'] == 'completed'
+        assert done['result'] == {'sum': 5}
+        assert done['queue_seconds'] is not None and done['run_seconds'] is not None
+
+        failed = wait_snapshot(JobService.submit('test', _boom)['job_id'])
+        assert failed['status'] == 'failed'
+        assert failed['error'] == 'errore previsto'
+        assert JobService.get('sconosciuto') is None
+
+
+def test_queue_full(app, monkeypatch):
+    from config import Config
+    monkeypatch.setattr(Config, 'JOB_MAX_QUEUED', 0)
+    with app.app_context(), pytest.raises(JobQueueFullError):
+        JobService.submit('test', lambda: None)
+
+
+def test_fit_job_completes_model(client, fitted):
+    file_id, result = fitted
+    job_model = client.get(f'/api/file/{file_id}/model').get_json()
+    assert job_model['status'] == 'completed'
+    assert result['status'] == 'completed'
+    assert result['run_id'] is not None
+
+
+def test_fit_job_of_other_user_is_not_found(app, client, fitted, wait_job):
+    other = app.test_client()
+    other.post('/api/register', json={'name': 'O', 'surname': 'U', 'email': 'other-jobs@example.com',
+                                      'password': 'secret1'})
+    response = client.post(f'/api/file/{fitted[0]}/fit-sarimax', json={'p': 0, 'd': 1, 'q': 1})
+    assert response.status_code == 202
+    assert other.get(f"/api/jobs/{response.get_json()['job_id']}").status_code == 404
+    wait_job(response.get_json()['job_id'])
+
+
+def test_identical_fit_is_cloned_with_optimizer_statistics(client, fitted):
+    file_id, result = fitted
+    response = client.post(f'/api/file/{file_id}/fit-sarimax', json={'p': 1, 'd': 1, 'q': 1, 'async': False})
+    assert response.status_code == 200
+    clone = response.get_json()
+    # Lo stesso CSV può essere già stato stimato da un altro test: l'origine è il primo fit
+    assert clone['cloned_from_model_id'] == (result['cloned_from_model_id'] or result['model_id'])
+    assert clone['optimizer_iterations'] is not None
+    assert clone['optimizer_iterations'] == result['optimizer_iterations']
+    assert clone['aic'] == result['aic']
+
+
+def test_new_order_is_warm_started_from_previous_fit(client, fitted):
+    file_id, result = fitted
+    response = client.post(f'/api/file/{file_id}/fit-sarimax', json={'p': 2, 'd': 1, 'q': 1, 'async': False})
+    assert response.status_code == 200
+    warm = response.get_json()
+    assert warm['warm_start_model_id'] is not None
+    assert warm['optimizer_iterations'] is not None
+    assert warm['iterations_saved_estimate'] is None or warm['iterations_saved_estimate'] >= 0
+    # Il risultato di un fit a caldo dipende dal modello di partenza: non viene riusato
+    rerun = client.post(f'/api/file/{file_id}/fit-sarimax', json={'p': 2, 'd': 1, 'q': 1, 'async': False})
+    assert rerun.get_json()['cloned_from_model_id'] is None
+
+
+def test_fast_fit_diagnostics_use_fit_train_window(app, client, split_file):
+    from database import db
+    from models import Model, ModelRun
+    from services import SarimaxService
+    response = client.post(f'/api/file/{split_file}/fit-sarimax',
+                           json={'p': 0, 'd': 1, 'q': 1, 'fit_mode': 'fast', 'async': False})
+    assert response.status_code == 200, response.get_data(as_text=True)
+    fast = response.get_json()
+    assert fast['fit_mode'] == 'fast'
+    # train_obs salvato nella configurazione non più allineato alla serie trasformata
+    with app.app_context():
+        run = db.session.get(ModelRun, fast['run_id'])
+        configuration = json.loads(run.configuration)
+        configuration['train_obs'] = 700
+        run.configuration = json.dumps(configuration)
+        db.session.commit()
+        n_train = SarimaxService.train_obs_count(run.file, run.file.n_observations)
+
+    response = client.post(f"/api/model/{fast['model_id']}/diagnostics", json={})
+    assert response.status_code == 200, response.get_data(as_text=True)
+    diagnostics = response.get_json()
+    assert diagnostics['fit_mode'] == 'full'
+    assert diagnostics['ljung_box'] and diagnostics['jarque_bera']['pvalue'] is not None
+    with app.app_context():
+        model = db.session.get(Model, fast['model_id'])
+        assert model.param_standard_errors is not None
+        assert int(re.search(r'No\. Observations:\s+(\d+)', model.model_summary).group(1)) == n_train
+
+
+def test_promoted_fast_fit_is_reused_as_full_fit(client, split_file):
+    body = {'p': 0, 'd': 1, 'q': 2, 'async': False}
+    fast = client.post(f'/api/file/{split_file}/fit-sarimax', json={**body, 'fit_mode': 'fast'}).get_json()
+    assert client.post(f'/api/file/{split_file}/fit-sarimax', json=body).get_json()['cloned_from_model_id'] is None
+
+    assert client.post(f"/api/model/{fast['model_id']}/diagnostics", json={}).status_code == 200
+    full = client.post(f'/api/file/{split_file}/fit-sarimax', json=body).get_json()
+    assert full['cloned_from_model_id'] == fast['model_id']
+    assert full['fit_mode'] == 'full'
+
+
+def test_fit_job_queues_residual_diagnostics(client, fitted, wait_job):
+    _, result = fitted
+    residuals_job = wait_job(result['residuals_job_id'])
+    assert residuals_job['status'] == 'completed', residuals_job['error']
+    assert residuals_job['kind'] == 'residuals'
+
+    response = client.get(f"/api/model/{result['model_id']}/residuals")
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['n_obs'] > 900
+    assert [item['lag'] for item in data['ljung_box_lags']] == [5, 10, 20]
+    assert data['ljung_box']['stat'] == data['ljung_box_lags'][1]['stat']
+    assert len(data['acf']['values']) == len(data['acf']['lags'])
+
+    paper = client.get(f"/api/model-run/{result['run_id']}/paper-data").get_json()
+    assert paper['residuals']['n_obs'] == data['n_obs']
+
+
+def test_residuals_endpoint_computes_missing_rows_and_checks_owner(app, client, fitted, wait_job):
+    from database import db
+    from models import Residuals
+    _, result = fitted
+    wait_job(result['residuals_job_id'])
+    with app.app_context():
+        Residuals.query.filter_by(model_id=result['model_id']).delete()
+        db.session.commit()
+
+    response = client.get(f"/api/model/{result['model_id']}/residuals")
+    assert response.status_code == 200
+    assert response.get_json()['computed_at'] is not None
+
+    other = app.test_client()
+    other.post('/api/register', json={'name': 'O', 'surname': 'U', 'email': 'other-owner@example.com',
+                                      'password': 'secret1'})
+    assert other.get(f"/api/model/{result['model_id']}/residuals").status_code == 403
@@ -0,0 +1,68 @@
+"""Migrazioni dello schema: da un database precedente allo schema dei modelli"""
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from database import db
+import models  # noqa: F401  (registra le tabelle in db.metadata)
+from migrations import LATEST_VERSION, MIGRATIONS, get_schema_version, run_migrations
+
+# Colonne aggiunte dalle migrazioni (assenti nei database creati prima)
+MIGRATED_COLUMNS = {
+    'model_run': ['total_obs'],
+    'file': ['content_hash'],
+    'model': ['fit_fingerprint', 'cloned_from_model_id', 'optimizer_iterations', 'warm_start_model_id',
+              'iterations_saved_estimate', 'fit_mode', 'fit_seconds', 'diagnostics_seconds'],
+    'residuals': ['n_obs', 'skewness', 'kurtosis', 'ljung_box_lags', 'residual_acf', 'computed_at'],
+}
+
+
+def _rebuild_without(conn, table, drop=()):
+    """Ricrea una tabella senza alcune colonne (e senza indici), come in un database precedente"""
+    columns = [c['name'] for c in inspect(conn).get_columns(table) if c['name'] not in drop]
+    select = ', '.join(f'"{c}"' for c in columns)
+    conn.execute(text(f'CREATE TABLE "{table}_old" AS SELECT {select} FROM "{table}"'))
+    conn.execute(text(f'DROP TABLE "{table}"'))
+    conn.execute(text(f'ALTER TABLE "{table}_old" RENAME TO "{table}"'))
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path / "legacy.db"}')
+    db.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+def _schema(engine):
+    inspector = inspect(engine)
+    columns = {t: {c['name'] for c in inspector.get_columns(t)} for t in inspector.get_table_names()}
+    indexes = {i['name'] for t in inspector.get_table_names() for i in inspector.get_indexes(t)}
+    return columns, indexes
+
+
+def test_legacy_database_reaches_model_schema(engine, tmp_path):
+    expected_columns, expected_indexes = _schema(engine)
+    with engine.begin() as conn:
+        for table, columns in MIGRATED_COLUMNS.items():
+            _rebuild_without(conn, table, drop=columns)
+        conn.execute(text('PRAGMA user_version = 0'))
+
+    applied = run_migrations(engine)
+    assert applied == [version for version, _, _ in MIGRATIONS]
+
+    columns, indexes = _schema(engine)
+    for table, names in expected_columns.items():
+        assert names <= columns[table], table
+    # Indici dichiarati nei modelli (ix_*) ricreati dalle migrazioni
+    assert {name for name in expected_indexes if name.startswith('ix_')} <= indexes
+    with engine.connect() as conn:
+        assert get_schema_version(conn) == LATEST_VERSION
+
+    # Rieseguire le migrazioni non fa nulla
+    assert run_migrations(engine) == []
+
+
+def test_fresh_database_is_only_marked(engine):
+    assert run_migrations(engine, fresh=True) == []
+    with engine.connect() as conn:
+        assert get_schema_version(conn) == LATEST_VERSION
@@ -0,0 +1,43 @@
+"""Archivio dei modelli stimati: ciclo di vita degli artefatti"""
+import os
+
+import numpy as np
+
+from database import db
+from model_store import FittedModel, ModelArtifactStore
+from models import Model, ModelRun
+
+
+def artifact_path(model_id):
+    return ModelArtifactStore._paths(model_id)[0]
+
+
+def test_nbytes_survives_missing_results_file(tmp_path):
+    fitted = FittedModel([0.5], ['ar.L1'], {}, 10, np.zeros(1), np.eye(1),
+                         results_path=str(tmp_path / 'rimosso.pkl'))
+    fitted._results = object()
+    assert fitted.nbytes > 0
+
+
+def test_deleting_run_removes_model_and_artifacts(app, client, fitted):
+    _, result = fitted
+    path = artifact_path(result['model_id'])
+    assert os.path.exists(path)
+
+    response = client.delete(f"/api/model-run/{result['run_id']}")
+    assert response.status_code == 200
+    with app.app_context():
+        assert db.session.get(Model, result['model_id']) is None
+        assert db.session.get(ModelRun, result['run_id']) is None
+    assert not os.path.exists(path)
+
+
+def test_rolled_back_delete_keeps_artifacts(app, fitted):
+    _, result = fitted
+    with app.app_context():
+        db.session.delete(db.session.get(ModelRun, result['run_id']))
+        db.session.delete(db.session.get(Model, result['model_id']))
+        db.session.flush()
+        db.session.rollback()
+        assert db.session.get(Model, result['model_id']) is not None
+    assert os.path.exists(artifact_path(result['model_id']))
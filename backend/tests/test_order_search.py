@@ -0,0 +1,74 @@
+"""Selezione dell'ordine: timeout dei candidati e classifica per test_score"""
+import time
+
+import numpy as np
+import pytest
+
+from order_search import OrderSearch, evaluate_candidate
+
+
+@pytest.fixture(scope='module')
+def differenced():
+    # Serie intera differenziata: il test set contiene degli zeri
+    rng = np.random.default_rng(5)
+    return np.diff(np.round(np.cumsum(rng.normal(size=401) * 2)))
+
+
+def test_mape_ignores_zero_actuals(differenced):
+    train, test = differenced[:300], differenced[300:]
+    assert (test == 0).any()
+    result = evaluate_candidate(train, test, (1, 0, 0), (0, 0, 0, 0))
+    assert result['status'] == 'ok'
+    assert result['test_mape'] is not None
+    assert result['test_score'] is not None
+
+
+def test_timeout_counts_from_start_of_fit(differenced):
+    train, test = differenced[:300], differenced[300:]
+    # Scadenza globale lontana: un timeout relativo non scade prima dell'inizio del fit
+    result = evaluate_candidate(train, test, (1, 0, 1), (0, 0, 0, 0), deadline=time.time() + 60, timeout=30)
+    assert result['status'] == 'ok'
+    # Scadenza globale già passata: il candidato non viene stimato
+    expired = evaluate_candidate(train, test, (1, 0, 1), (0, 0, 0, 0), deadline=time.time() - 1, timeout=30)
+    assert expired['status'] == 'timeout'
+
+
+def test_queued_candidates_are_not_timed_out(differenced):
+    train, test = differenced[:300], differenced[300:]
+    candidates, _ = OrderSearch.grid_candidates(max_p=2, max_d=0, max_q=2)
+    # Ogni fit dura pochi centesimi di secondo, la griglia intera (con l'avvio del
+    # processo) più del timeout: i candidati in coda devono essere comunque stimati
+    search = OrderSearch(train, test, n_jobs=1, candidate_timeout=0.5, mp_context='fork')
+    search.run_grid(candidates)
+    assert search.summary()['timed_out'] == 0
+    assert search.summary()['succeeded'] == len(candidates)
+    assert search.ranked_by == 'test_score'
+
+
+def test_ranking_reports_aic_fallback_when_no_score():
+    rng = np.random.default_rng(2)
+    train = rng.normal(size=200)
+    search = OrderSearch(train, np.zeros(20), n_jobs=1, mp_context='fork')
+    best = search.run_grid([((0, 0, 0), (0, 0, 0, 0)), ((1, 0, 0), (0, 0, 0, 0))])
+    assert all(r['test_score'] is None for r in search.results.values())
+    assert search.summary()['ranked_by'] == 'aic'
+    assert best['aic'] == min(r['aic'] for r in search.results.values())
+
+
+@pytest.mark.parametrize('body', [
+    {'candidate_timeout': 0},
+    {'time_budget': -5},
+    {'candidate_timeout': 'nan'},
+    {'max_order': -1},
+    {'m': -12},
+    {'d': -1, 'mode': 'stepwise'},
+    {'max_p': 10, 'max_q': 10, 'max_d': 2, 'max_order': 20},
+])
+def test_auto_select_rejects_invalid_options_before_creating_model(app, client, split_file, body):
+    from models import Model
+    with app.app_context():
+        before = Model.query.filter_by(file_id=split_file).count()
+    response = client.post(f'/api/file/{split_file}/auto-select', json=body)
+    assert response.status_code == 400, response.get_data(as_text=True)
+    with app.app_context():
+        assert Model.query.filter_by(file_id=split_file).count() == before
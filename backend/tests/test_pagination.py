@@ -0,0 +1,83 @@
+"""Paginazione keyset: pagine concatenate = lista completa ordinata, NULL in fondo"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import Column, DateTime, Float, Integer, create_engine
+from sqlalchemy.orm import Session, declarative_base
+
+from pagination import CursorError, decode_cursor, encode_cursor, keyset_page
+
+Base = declarative_base()
+
+
+class Row(Base):
+    __tablename__ = 'row'
+    id = Column(Integer, primary_key=True)
+    score = Column(Float, nullable=True)
+    created_at = Column(DateTime, nullable=False)
+
+
+@pytest.fixture
+def session():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        start = datetime(2024, 1, 1)
+        # Valori ripetuti e NULL per verificare spareggi e ordinamento dei NULL
+        scores = [3.0, None, 1.0, 3.0, 2.0, None, 1.0, 5.0, 3.0, None, 4.0, 2.0]
+        session.add_all(Row(id=i + 1, score=score, created_at=start + timedelta(hours=i % 5))
+                        for i, score in enumerate(scores))
+        session.commit()
+        yield session
+
+
+def collect(session, column, key, descending, limit, nullable):
+    pages, cursor = [], None
+    while True:
+        rows, cursor = keyset_page(
+            session.query(Row), key, column, Row.id, descending=descending, limit=limit,
+            cursor=cursor, nullable=nullable,
+            value_getter=lambda r: getattr(r, key), id_getter=lambda r: r.id)
+        assert len(rows) <= limit
+        pages.append([r.id for r in rows])
+        if cursor is None:
+            return pages
+
+
+def expected_order(session, key, descending):
+    rows = session.query(Row).all()
+    present = sorted((r for r in rows if getattr(r, key) is not None),
+                     key=lambda r: (getattr(r, key), r.id), reverse=descending)
+    missing = sorted((r for r in rows if getattr(r, key) is None), key=lambda r: r.id, reverse=descending)
+    return [r.id for r in present + missing]
+
+
+@pytest.mark.parametrize('descending', [False, True])
+@pytest.mark.parametrize('limit', [1, 4, 5, 50])
+def test_pages_cover_nullable_sort_without_gaps(session, descending, limit):
+    pages = collect(session, Row.score, 'score', descending, limit, nullable=True)
+    flat = [row_id for page in pages for row_id in page]
+    assert flat == expected_order(session, 'score', descending)
+
+
+@pytest.mark.parametrize('descending', [False, True])
+def test_pages_on_datetime_key(session, descending):
+    pages = collect(session, Row.created_at, 'created_at', descending, 3, nullable=False)
+    flat = [row_id for page in pages for row_id in page]
+    assert flat == expected_order(session, 'created_at', descending)
+
+
+def test_no_limit_returns_everything_without_cursor(session):
+    rows, cursor = keyset_page(session.query(Row), 'score', Row.score, Row.id, nullable=True)
+    assert cursor is None
+    assert [r.id for r in rows] == expected_order(session, 'score', False)
+
+
+def test_cursor_roundtrip_and_validation():
+    moment = datetime(2024, 5, 1, 12, 30)
+    assert decode_cursor(encode_cursor('created_at', moment, 7), 'created_at') == (moment, 7)
+    assert decode_cursor(encode_cursor('score', None, 3), 'score') == (None, 3)
+    with pytest.raises(CursorError):
+        decode_cursor(encode_cursor('score', 1.0, 3), 'created_at')
+    with pytest.raises(CursorError):
+        decode_cursor('not-a-cursor', 'score')
@@ -0,0 +1,97 @@
+"""
+Budget di query SQL delle liste di file e run (decoratore query_budget)
+
+Con app.testing il superamento del budget solleva QueryBudgetExceeded: qui si
+verifica anche che il numero di query non cresca con il numero di righe (N+1).
+"""
+import json
+
+import pytest
+
+from database import db
+from models import File, Metrics, Model, ModelRun
+from query_budget import QueryBudgetExceeded
+
+# Budget dichiarati in routes.py
+BUDGETS = {
+    '/api/user/files': 2,
+    '/api/user/model-runs': 4,
+    '/api/file/{file_id}/model-runs': 5,
+}
+
+
+def seed(app, user_id, sample_csv, n_files, runs_per_file):
+    """File e run di un utente; metà dei modelli senza test_r2 (fallback su Metrics)"""
+    with app.app_context():
+        files = [File(user_id=user_id, file_name=f'serie_{i}.csv', file_path=sample_csv, n_observations=1000 + i)
+                 for i in range(n_files)]
+        db.session.add_all(files)
+        db.session.flush()
+        for file in files:
+            for j in range(runs_per_file):
+                model = Model(file_id=file.file_id, status='completed', p=j, d=1, q=1, aic=100.0 - j,
+                              bic=110.0 - j, model_order_string=f'({j}, 1, 1)',
+                              test_r2=0.5 if j % 2 else None, test_mape=5.0 if j % 2 else None)
+                db.session.add(model)
+                db.session.flush()
+                db.session.add(Metrics(model_id=model.model_id, metric_type='test', r_squared=0.4,
+                                       mape=6.0, mape_percent=6.0, mae=1.0, rmse=1.0))
+                db.session.add(ModelRun(model_id=model.model_id, file_id=file.file_id, user_id=user_id,
+                                        total_obs=999, configuration=json.dumps({'train_obs': 800})))
+        db.session.commit()
+        return files[0].file_id
+
+
+def query_counts(client, file_id):
+    counts = {}
+    for template in BUDGETS:
+        response = client.get(template.format(file_id=file_id))
+        assert response.status_code == 200, response.get_data(as_text=True)
+        counts[template] = int(response.headers['X-Query-Count'])
+    return counts
+
+
+RUN_QUERIES = ['', '?limit=10', '?limit=10&sort=aic', '?sort=test_r2&direction=asc', '?seasonal=false&order=1,1,1']
+FILE_QUERIES = ['', '?limit=10', '?limit=10&sort=file_name', '?sort=n_observations&direction=asc']
+
+
+@pytest.mark.parametrize('template, query_string', [
+    *[('/api/user/files', q) for q in FILE_QUERIES],
+    *[('/api/user/model-runs', q) for q in RUN_QUERIES],
+    *[('/api/file/{file_id}/model-runs', q) for q in RUN_QUERIES],
+])
+def test_listings_stay_within_budget(app, client, sample_csv, template, query_string):
+    file_id = seed(app, client.user_id, sample_csv, n_files=40, runs_per_file=6)
+    response = client.get(template.format(file_id=file_id) + query_string)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    used = int(response.headers['X-Query-Count'])
+    assert used <= BUDGETS[template], f'{template}{query_string}: {used} query (budget {BUDGETS[template]})'
+
+
+def test_query_count_does_not_grow_with_rows(app, client, sample_csv):
+    file_id = seed(app, client.user_id, sample_csv, n_files=2, runs_per_file=2)
+    small = query_counts(client, file_id)
+    seed(app, client.user_id, sample_csv, n_files=60, runs_per_file=8)
+    large = query_counts(client, file_id)
+    assert large == small
+
+
+def test_next_page_stays_within_budget(app, client, sample_csv):
+    seed(app, client.user_id, sample_csv, n_files=30, runs_per_file=3)
+    first = client.get('/api/user/model-runs?limit=25').get_json()
+    assert first['next_cursor']
+    response = client.get(f"/api/user/model-runs?limit=25&cursor={first['next_cursor']}")
+    assert response.status_code == 200
+    assert int(response.headers['X-Query-Count']) <= BUDGETS['/api/user/model-runs']
+
+
+def test_budget_overrun_fails_in_testing(app):
+    from query_budget import query_budget
+
+    @query_budget(0)
+    def view():
+        db.session.execute(db.text('SELECT 1'))
+        return 'ok'
+
+    with app.test_request_context(), pytest.raises(QueryBudgetExceeded):
+        view()
@@ -0,0 +1,48 @@
+"""Anteprima dello smoothing per più finestre"""
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def test_smoothing_preview_does_not_modify_file(client, split_file, sample_csv):
+    response = client.get(f'/api/file/{split_file}/smoothing-preview?windows=1,5&max_points=100')
+    assert response.status_code == 200, response.get_data(as_text=True)
+    data = response.get_json()
+    assert data['current_window'] == 1
+
+    values = pd.read_csv(sample_csv)['y'].to_numpy(dtype=float)
+    by_window = {item['window_size']: item for item in data['windows']}
+    assert by_window[5]['n_observations'] == len(values) - 4
+    assert by_window[5]['removed_obs'] == 4
+    for item in by_window.values():
+        assert 2 <= len(item['values']) <= 100
+        assert len(item['dates']) == len(item['values'])
+    assert by_window[5]['values'][0] == pytest.approx(np.mean(values[:5]))
+
+    again = client.get(f'/api/file/{split_file}/smoothing-preview?windows=5').get_json()
+    assert again['current_window'] == 1
+
+
+def test_smoothing_preview_rejects_bad_windows(client, split_file):
+    assert client.get(f'/api/file/{split_file}/smoothing-preview?windows=0').status_code == 400
+    assert client.get(f'/api/file/{split_file}/smoothing-preview?max_points=1').status_code == 400
+
+
+def test_smoothing_preview_keeps_peaks(client):
+    # Serie piatta con un picco isolato: il campionamento a passo fisso lo perderebbe
+    values = np.full(5000, 100.0)
+    values[2501] = 500.0
+    frame = pd.DataFrame({'data': pd.date_range('2000-01-01', periods=len(values)).strftime('%Y-%m-%d'), 'y': values})
+    response = client.post('/api/upload-temp', data={'file': (io.BytesIO(frame.to_csv(index=False).encode()), 'picco.csv')},
+                           content_type='multipart/form-data')
+    file_id = response.get_json()['file_id']
+
+    for method in ('lttb', 'minmax'):
+        response = client.get(f'/api/file/{file_id}/smoothing-preview?windows=1,3&max_points=50&downsample={method}')
+        assert response.status_code == 200, response.get_data(as_text=True)
+        for item in response.get_json()['windows']:
+            assert len(item['values']) <= 50
+            assert max(item['values']) == pytest.approx(100 + 400 / item['window_size'])
+    assert client.get(f'/api/file/{file_id}/smoothing-preview?downsample=step').status_code == 400
@@ -0,0 +1,144 @@
+"""Kernel numerici di utils confrontati con pandas e statsmodels"""
+import numpy as np
+import pandas as pd
+import pytest
+from statsmodels.stats.diagnostic import acorr_ljungbox
+from statsmodels.stats.stattools import jarque_bera
+from statsmodels.tsa.stattools import acf, pacf
+
+from utils import (moving_average, moving_averages, difference, log_values,
+                   apply_smoothing, apply_log_transform, apply_differencing,
+                   durbin_levinson, calculate_acf_pacf, autocovariance_sums, residual_diagnostics)
+
+
+@pytest.fixture
+def random_walk():
+    rng = np.random.default_rng(42)
+    return 20000 + np.cumsum(rng.normal(size=3000))
+
+
+@pytest.fixture
+def arma():
+    rng = np.random.default_rng(7)
+    noise = rng.normal(size=2000)
+    values = np.zeros_like(noise)
+    for t in range(2, len(values)):
+        values[t] = 0.6 * values[t - 1] - 0.2 * values[t - 2] + noise[t] + 0.3 * noise[t - 1]
+    return values
+
+
+@pytest.mark.parametrize('window', [1, 2, 7, 30])
+@pytest.mark.parametrize('block_size', [16, 4096])
+def test_moving_average_matches_pandas_rolling(random_walk, window, block_size):
+    expected = pd.Series(random_walk).rolling(window).mean().to_numpy()[window - 1:]
+    result = moving_average(random_walk, window, block_size=block_size)
+    assert result.shape == expected.shape
+    np.testing.assert_allclose(result, expected, rtol=0, atol=1e-9)
+
+
+def test_moving_average_window_longer_than_series():
+    assert moving_average(np.arange(5.0), 10).size == 0
+
+
+def test_moving_averages_matches_single_window(random_walk):
+    for window, values in moving_averages(random_walk, [3, 12]):
+        np.testing.assert_allclose(values, moving_average(random_walk, window), rtol=0, atol=1e-9)
+
+
+@pytest.mark.parametrize('order', [1, 2, 3])
+def test_difference_matches_repeated_diff(random_walk, order):
+    expected = pd.Series(random_walk)
+    for _ in range(order):
+        expected = expected.diff()
+    np.testing.assert_allclose(difference(random_walk, order), expected.dropna().to_numpy(), rtol=1e-12)
+
+
+def test_log_values_in_place_and_rejects_non_positive(random_walk):
+    buffer = random_walk.copy()
+    result = log_values(buffer, out=buffer)
+    assert result is buffer
+    np.testing.assert_allclose(buffer, np.log(random_walk))
+    with pytest.raises(ValueError):
+        log_values(np.array([1.0, 0.0]))
+
+
+def test_dataframe_helpers_keep_columns_and_dates(random_walk):
+    df = pd.DataFrame({'data': pd.bdate_range('2020-01-01', periods=len(random_walk)), 'y': random_walk})
+    smoothed = apply_smoothing(df, 5)
+    logged = apply_log_transform(df)
+    differenced = apply_differencing(df, 2)
+    for result, offset in ((smoothed, 4), (logged, 0), (differenced, 2)):
+        assert list(result.columns) == ['data', 'y']
+        assert result['data'].iloc[0] == df['data'].iloc[offset]
+    # Il DataFrame originale non viene modificato
+    np.testing.assert_array_equal(df['y'].to_numpy(), random_walk)
+
+
+@pytest.mark.parametrize('nlags', [10, 300])
+def test_autocovariance_sums_direct_and_fft_agree(arma, nlags):
+    x = arma - arma.mean()
+    expected = np.array([np.dot(x[:len(x) - k], x[k:]) for k in range(nlags + 1)])
+    np.testing.assert_allclose(autocovariance_sums(arma, nlags), expected, rtol=1e-9, atol=1e-6)
+
+
+def test_acf_pacf_match_statsmodels(arma):
+    result = calculate_acf_pacf(arma, nlags=40)
+    expected_acf, expected_confint = acf(arma, nlags=40, fft=True, alpha=0.05)
+    np.testing.assert_allclose(result['acf'], expected_acf, atol=1e-10)
+    np.testing.assert_allclose(result['acf_confint_raw'], expected_confint, atol=1e-10)
+    np.testing.assert_allclose(result['pacf'], pacf(arma, nlags=40, method='ywadjusted'), atol=1e-10)
+    assert result['lags'] == list(range(41))
+
+
+def test_durbin_levinson_solves_yule_walker(arma):
+    rho = acf(arma, nlags=5, fft=True)
+    for k in range(1, 6):
+        toeplitz = np.array([[rho[abs(i - j)] for j in range(k)] for i in range(k)])
+        phi = np.linalg.solve(toeplitz, rho[1:k + 1])
+        assert durbin_levinson(rho[:k + 1])[k] == pytest.approx(phi[-1], abs=1e-12)
+
+
+def test_calculate_acf_pacf_returns_independent_copies(arma):
+    first = calculate_acf_pacf(arma, nlags=10)
+    first['acf'][1] = 99.0
+    assert calculate_acf_pacf(arma, nlags=10)['acf'][1] != 99.0
+
+
+def test_calculate_acf_pacf_rejects_short_series():
+    with pytest.raises(ValueError):
+        calculate_acf_pacf(np.arange(5.0))
+
+
+def test_residual_diagnostics_matches_statsmodels():
+    rng = np.random.default_rng(0)
+    residuals = rng.standard_t(5, 2000) + 0.3 * np.r_[0.0, rng.normal(size=1999)]
+    result = residual_diagnostics(residuals)
+
+    expected = acorr_ljungbox(residuals, lags=[5, 10, 20])
+    assert [item['lag'] for item in result['ljung_box']] == [5, 10, 20]
+    np.testing.assert_allclose([item['stat'] for item in result['ljung_box']], expected['lb_stat'], rtol=1e-10)
+    np.testing.assert_allclose([item['pvalue'] for item in result['ljung_box']], expected['lb_pvalue'], rtol=1e-8)
+
+    jb_stat, jb_pvalue, skew, kurtosis = jarque_bera(residuals)
+    assert result['jarque_bera']['stat'] == pytest.approx(jb_stat, rel=1e-10)
+    assert result['skewness'] == pytest.approx(skew, rel=1e-10)
+    assert result['kurtosis'] == pytest.approx(kurtosis, rel=1e-10)
+    assert result['normality_passed'] is bool(jb_pvalue > 0.05)
+
+    np.testing.assert_allclose(result['acf']['values'], acf(residuals, nlags=40, fft=True), atol=1e-10)
+    assert result['acf']['confint'][1] == pytest.approx(1.959964 / np.sqrt(2000), rel=1e-6)
+    assert result['n_obs'] == 2000
+    assert result['std'] == pytest.approx(residuals.std(ddof=1))
+
+
+def test_residual_diagnostics_skips_non_finite_and_short_lags():
+    values = np.r_[np.nan, np.random.default_rng(1).normal(size=30), np.inf]
+    result = residual_diagnostics(values)
+    assert result['n_obs'] == 30
+    # I lag oltre n // 2 vengono scartati
+    assert [item['lag'] for item in result['ljung_box']] == [5, 10]
+
+
+def test_residual_diagnostics_rejects_too_few_values():
+    with pytest.raises(ValueError):
+        residual_diagnostics(np.ones(5))
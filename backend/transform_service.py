@@ -0,0 +1,271 @@
+"""
+Pipeline virtuale delle trasformazioni (smoothing -> log -> differenziazione).
+
+Le trasformazioni di un File sono una ricetta dichiarativa, già salvata sul
+record (smoothing_window, log_transform, differencing_order): nessuna serie
+intermedia viene scritta su disco. La serie trasformata viene calcolata su
+richiesta a partire dalla serie base in cache (FileService.load_series) e
+memorizzata per (contenuto, ricetta), insieme a tutti i passi intermedi: rileggere
+o riapplicare una trasformazione già calcolata costa solo un lookup in cache.
+"""
+import os
+from collections import namedtuple
+import numpy as np
+from cache import LRUCache
+from config import Config
+from series_store import SeriesStore
+from series_pyramid import PyramidStore
+
+# Cache di processo delle serie trasformate: (chiave contenuto, ricetta) -> (dates, values)
+transform_cache = LRUCache('transforms', Config.TRANSFORM_CACHE_MAX_BYTES)
+
+# Fasi della pipeline nell'ordine di applicazione (nomi usati da API e frontend)
+STAGES = ('original', 'smoothed', 'log', 'diff')
+
+
+class TransformRecipe(namedtuple('TransformRecipe', ['smoothing_window', 'log_transform', 'differencing_order'])):
+    """Ricetta delle trasformazioni: finestra media mobile, log, ordine di differenziazione"""
+    __slots__ = ()
+
+    def __new__(cls, smoothing_window=1, log_transform=False, differencing_order=0):
+        return super().__new__(
+            cls,
+            max(1, int(smoothing_window or 1)),
+            bool(log_transform),
+            max(0, int(differencing_order or 0))
+        )
+
+    @classmethod
+    def from_file(cls, file_record):
+        """Ricetta corrente di un File"""
+        return cls(file_record.smoothing_window, file_record.log_transform, file_record.differencing_order)
+
+    @classmethod
+    def from_config(cls, config):
+        """Ricetta salvata nella configurazione di un ModelRun"""
+        return cls(
+            config.get('smoothing_window', 1),
+            config.get('log_transform', False),
+            config.get('differencing_order', 0)
+        )
+
+    @property
+    def is_identity(self):
+        return self == TransformRecipe()
+
+    def parent(self):
+        """Ricetta senza l'ultimo passo applicato"""
+        if self.differencing_order > 0:
+            return self._replace(differencing_order=0)
+        if self.log_transform:
+            return self._replace(log_transform=False)
+        return TransformRecipe()
+
+    def stage(self, stage):
+        """
+        Ricetta fino alla fase indicata ('original', 'smoothed', 'log', 'diff')
+
+        Come nella catena originale, la fase 'log' include lo smoothing e la fase
+        'diff' include smoothing e log se presenti.
+        """
+        if stage == 'original':
+            return TransformRecipe()
+        if stage == 'smoothed':
+            return TransformRecipe(self.smoothing_window)
+        if stage == 'log':
+            return TransformRecipe(self.smoothing_window, self.log_transform)
+        if stage == 'diff':
+            return self
+        raise ValueError(f"Fase non valida: {stage}")
+
+    def has_stage(self, stage):
+        """True se la fase è effettivamente applicata dalla ricetta"""
+        return {
+            'original': True,
+            'smoothed': self.smoothing_window > 1,
+            'log': self.log_transform,
+            'diff': self.differencing_order > 0
+        }[stage]
+
+    @property
+    def last_stage(self):
+        """Ultima fase applicata ('original' se nessuna trasformazione)"""
+        for stage in reversed(STAGES):
+            if self.has_stage(stage):
+                return stage
+        return 'original'
+
+    @property
+    def name(self):
+        """Nome stabile della ricetta (es. 'smooth3_log_diff1'), usato per gli artefatti"""
+        steps = []
+        if self.smoothing_window > 1:
+            steps.append(f'smooth{self.smoothing_window}')
+        if self.log_transform:
+            steps.append('log')
+        if self.differencing_order > 0:
+            steps.append(f'diff{self.differencing_order}')
+        return '_'.join(steps) or 'original'
+
+    def as_dict(self):
+        return dict(self._asdict())
+
+
+class TransformService:
+    """Valutazione lazy e memoizzata delle ricette sulla serie base di un File"""
+
+    @staticmethod
+    def _content_key(file_record):
+        """Identità del contenuto: hash per i file deduplicati, path + firma per gli altri"""
+        if file_record.content_hash:
+            return file_record.content_hash
+        from services import get_absolute_path
+        path = get_absolute_path(file_record.file_path)
+        st = os.stat(path)
+        return (path, st.st_mtime_ns, st.st_size)
+
+    @staticmethod
+    def _apply_step(recipe, dates, values):
+        """
+        Applica alla serie della ricetta parent() l'ultimo passo di recipe
+
+        Lavora direttamente sugli array (kernel NumPy di utils): alloca solo il
+        buffer dei valori in uscita, le date sono una vista su quelle del parent.
+        """
+        from utils import moving_average, log_values, difference
+        if recipe.differencing_order > 0:
+            return dates[recipe.differencing_order:], difference(values, recipe.differencing_order)
+        if recipe.log_transform:
+            return dates, log_values(values)
+        return dates[recipe.smoothing_window - 1:], moving_average(values, recipe.smoothing_window)
+
+    @staticmethod
+    def series(file_record, recipe=None):
+        """
+        Serie trasformata come array colonnari in sola lettura
+
+        Args:
+            file_record: File
+            recipe: TransformRecipe; None = ricetta corrente del File
+
+        Returns:
+            tuple: (dates int64 epoch-ns, values float64)
+
+        Raises:
+            ValueError: trasformazione non applicabile (es. log con valori <= 0)
+        """
+        from services import FileService
+        if recipe is None:
+            recipe = TransformRecipe.from_file(file_record)
+        if recipe.is_identity:
+            return FileService.load_series(file_record.file_path)
+
+        key = (TransformService._content_key(file_record), tuple(recipe))
+        cached = transform_cache.get(key)
+        if cached is not None:
+            return cached
+
+        dates, values = TransformService._apply_step(recipe, *TransformService.series(file_record, recipe.parent()))
+        values.flags.writeable = False
+        return transform_cache.put(key, (dates, values))
+
+    @staticmethod
+    def frame(file_record, recipe=None):
+        """Serie trasformata come DataFrame standard ('data', 'y'), modificabile dal chiamante"""
+        return SeriesStore.to_frame(*TransformService.series(file_record, recipe))
+
+    @staticmethod
+    def count(file_record, recipe=None):
+        """Numero di osservazioni dopo le trasformazioni"""
+        return len(TransformService.series(file_record, recipe)[1])
+
+    @staticmethod
+    def pyramid(file_record, recipe=None):
+        """
+        Piramide multi-risoluzione della serie della ricetta (vedi series_pyramid)
+
+        Viene calcolata e salvata accanto all'archivio della serie la prima volta
+        (upload, applicazione di una trasformazione o prima lettura), poi solo
+        riaperta in memory-map.
+
+        Returns:
+            SeriesPyramid o None se la serie è troppo corta per averne bisogno
+        """
+        from services import get_absolute_path
+        if recipe is None:
+            recipe = TransformRecipe.from_file(file_record)
+        values = TransformService.series(file_record, recipe)[1]
+        if len(values) < Config.PYRAMID_MIN_POINTS:
+            return None
+
+        source_path = get_absolute_path(file_record.file_path)
+        pyramid = PyramidStore.load(source_path, recipe.name, len(values))
+        if pyramid is None:
+            try:
+                pyramid = PyramidStore.save(source_path, recipe.name, values)
+            except OSError as e:
+                # La piramide è solo un'ottimizzazione: si decima la serie al volo
+                print(f"Errore salvataggio piramide {recipe.name} per {source_path}: {e}")
+        return pyramid
+
+    @staticmethod
+    def smoothing_preview(file_record, windows, max_points=500, method='lttb'):
+        """
+        Anteprima dello smoothing per più finestre, senza modificare il File
+
+        Tutte le medie mobili derivano da un'unica somma prefissa della serie
+        originale in cache (utils.moving_averages): nessuna lettura da disco se la
+        serie è già in memoria e nessuna scrittura.
+
+        Args:
+            file_record: File
+            windows: finestre da calcolare
+            max_points: punti massimi per curva (decimazione LTTB o min/max, come i grafici)
+            method: 'lttb' o 'minmax'
+
+        Returns:
+            list: per finestra curva decimata (colonne NumPy per json_response),
+            statistiche e autocorrelazione a lag 1
+        """
+        from services import FileService
+        from serializers import series_columns, decimate_columns
+        from utils import moving_averages, series_summary
+        dates, values = FileService.load_series(file_record.file_path)
+
+        previews = []
+        for window_size, averages in moving_averages(values, windows):
+            statistics, lag1 = series_summary(averages)
+            window_dates = dates[max(window_size, 1) - 1:]
+            columns = decimate_columns(series_columns(window_dates, values=averages), max_points, method=method)
+            previews.append({
+                'window_size': window_size,
+                'n_observations': len(averages),
+                'removed_obs': len(values) - len(averages),
+                'statistics': statistics,
+                'lag1_autocorrelation': lag1,
+                **columns
+            })
+        return previews
+
+    @staticmethod
+    def discard_materialized(file_record):
+        """
+        Rimuove le serie trasformate salvate su disco dalle versioni precedenti
+
+        I CSV intermedi per-file (smoothed_/log_/diff_) non servono più: la ricetta
+        sul File basta a ricalcolarli. Gli artefatti condivisi in DERIVED_FOLDER
+        vengono rimossi insieme al blob da BlobStore.collect_garbage().
+        """
+        from services import get_absolute_path
+        derived_root = os.path.abspath(Config.DERIVED_FOLDER)
+        for attr in ('smoothed_file_path', 'log_transformed_file_path', 'differenced_file_path'):
+            path = getattr(file_record, attr)
+            if not path:
+                continue
+            path = get_absolute_path(path)
+            if not os.path.abspath(path).startswith(derived_root) and os.path.exists(path):
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    print(f"Impossibile rimuovere {path}: {e}")
+            setattr(file_record, attr, None)
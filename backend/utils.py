@@ -1,6 +1,10 @@
+import copy
+import hashlib
 import pandas as pd
 import numpy as np
 from datetime import datetime
+from cache import LRUCache
+from config import Config
 
 def validate_file_format(df):
     """
@@ -129,6 +133,9 @@ def adf_stationarity_test(series):
         'critical_values': {k: float(v) for k, v in critical_values.items()}
     }
 
+# Osservazioni per blocco di somme prefisse in moving_average
+MOVING_AVERAGE_BLOCK = 4096
+
 def apply_smoothing(df, window_size=1):
     """
     Applica media mobile (smoothing) alla serie storica
@@ -146,21 +153,175 @@ def apply_smoothing(df, window_size=1):
     if window_size <= 1:
         return df.copy()
     
-    df_smoothed = df.copy()
+    # Le prime (window_size-1) osservazioni non hanno una finestra completa
+    df_smoothed = df.iloc[window_size - 1:].reset_index(drop=True)
+    df_smoothed['y'] = moving_average(df['y'].to_numpy(dtype=np.float64), window_size)
     
-    # Applica media mobile con min_periods=window_size
-    # Questo significa che le prime (window_size-1) osservazioni saranno NaN
-    df_smoothed['y'] = df_smoothed['y'].rolling(window=window_size, min_periods=window_size).mean()
+    return df_smoothed
+
+def moving_average(values, window_size, block_size=MOVING_AVERAGE_BLOCK):
+    """
+    Media mobile con finestra completa calcolata con somme cumulative
     
-    # Rimuovi le osservazioni NaN (prime window_size-1 osservazioni)
-    df_smoothed = df_smoothed.dropna(subset=['y']).reset_index(drop=True)
+    Ogni media è la differenza di due somme prefisse: O(n) indipendentemente
+    dalla finestra. Le somme prefisse ripartono ogni block_size osservazioni
+    e accumulano gli scarti dal primo valore del blocco, così l'errore di
+    arrotondamento resta al livello di pandas rolling().mean() e non cresce
+    con la lunghezza della serie; il buffer delle somme è riusato tra i blocchi.
     
-    return df_smoothed
+    Args:
+        values: array float64 (serie validata, senza NaN)
+        window_size: dimensione finestra (>= 1)
+        block_size: osservazioni per blocco di somme prefisse
+    
+    Returns:
+        array di len(values) - window_size + 1 medie
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    if window_size <= 1:
+        return values.copy()
+    if window_size > n:
+        return np.empty(0, dtype=np.float64)
+    
+    n_out = n - window_size + 1
+    out = np.empty(n_out, dtype=np.float64)
+    prefix = np.empty(min(block_size, n_out) + window_size, dtype=np.float64)
+    prefix[0] = 0.0
+    for start in range(0, n_out, block_size):
+        stop = min(start + block_size, n_out)
+        length = stop - start
+        block = prefix[:length + window_size]
+        # Somme degli scarti dal primo valore del blocco: ordini di grandezza piccoli
+        reference = values[start]
+        np.subtract(values[start:stop + window_size - 1], reference, out=block[1:])
+        np.cumsum(block[1:], out=block[1:])
+        segment = out[start:stop]
+        np.subtract(block[window_size:], block[:length], out=segment)
+        segment /= window_size
+        segment += reference
+    return out
+
+def moving_averages(values, windows):
+    """
+    Medie mobili per più finestre da un'unica somma prefissa
+    
+    Pensata per le anteprime (es. slider dello smoothing): la somma prefissa
+    degli scarti dalla media viene calcolata una volta sola e ogni finestra
+    costa una sottrazione vettoriale. Per la serie effettivamente trasformata
+    si usa moving_average, più accurata su serie molto lunghe.
+    
+    Args:
+        values: array float64 (serie validata, senza NaN)
+        windows: finestre richieste (>= 1)
+    
+    Yields:
+        (window_size, medie): per window_size 1 la serie stessa
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    center = values.mean() if n else 0.0
+    prefix = np.empty(n + 1, dtype=np.float64)
+    prefix[0] = 0.0
+    np.subtract(values, center, out=prefix[1:])
+    np.cumsum(prefix[1:], out=prefix[1:])
+    
+    for window_size in windows:
+        if window_size <= 1:
+            yield window_size, values
+            continue
+        if window_size > n:
+            yield window_size, np.empty(0, dtype=np.float64)
+            continue
+        out = np.subtract(prefix[window_size:], prefix[:-window_size])
+        out /= window_size
+        out += center
+        yield window_size, out
+
+def series_summary(values):
+    """
+    Statistiche descrittive (come calculate_statistics) e autocorrelazione a lag 1 di un array
+    
+    Returns:
+        (statistics, lag1_autocorrelation): lag1 è None se la serie è costante o troppo corta
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    if n == 0:
+        return {'mean': None, 'std': None, 'min': None, 'max': None,
+                'median': None, 'q25': None, 'q75': None, 'obs_count': 0}, None
+    q25, median, q75 = np.quantile(values, [0.25, 0.5, 0.75])
+    mean = values.mean()
+    statistics = {
+        'mean': float(mean),
+        'std': float(values.std(ddof=1)) if n > 1 else None,
+        'min': float(values.min()),
+        'max': float(values.max()),
+        'median': float(median),
+        'q25': float(q25),
+        'q75': float(q75),
+        'obs_count': n
+    }
+    # Stessa definizione di statsmodels acf: autocovarianza a lag 1 / varianza
+    centered = values - mean
+    denominator = np.dot(centered, centered)
+    lag1 = float(np.dot(centered[:-1], centered[1:]) / denominator) if n > 1 and denominator > 0 else None
+    return statistics, lag1
+
+# Fino a questo numero di lag l'autocovarianza usa prodotti scalari diretti
+# (O(n * nlags), più veloci della FFT per i pochi lag dei grafici), oltre la FFT
+ACF_DIRECT_MAX_LAGS = 256
+
+# Cache di processo dei risultati: (hash valori, nlags, alpha) -> dict di calculate_acf_pacf
+acf_pacf_cache = LRUCache('acf_pacf', Config.ACF_CACHE_MAX_BYTES)
+
+
+def autocovariance_sums(values, nlags):
+    """
+    Somme dei prodotti ritardati della serie centrata: sum(x[t] * x[t+k]), k = 0..nlags
+    
+    Dividendo per n si ottiene l'autocovarianza di acf (statsmodels), per n - k
+    quella 'adjusted' della PACF di Yule-Walker.
+    """
+    x = np.asarray(values, dtype=np.float64)
+    x = x - x.mean()
+    n = len(x)
+    if nlags <= ACF_DIRECT_MAX_LAGS:
+        return np.array([np.dot(x[:n - k], x[k:]) for k in range(nlags + 1)])
+    size = 1 << int(np.ceil(np.log2(2 * n - 1)))
+    spectrum = np.fft.rfft(x, size)
+    return np.fft.irfft(spectrum * np.conj(spectrum), size)[:nlags + 1]
+
+
+def durbin_levinson(rho):
+    """
+    PACF dalle autocorrelazioni rho[0..nlags] con la ricorsione di Durbin-Levinson
+    
+    Equivale a risolvere per ogni k il sistema di Yule-Walker di ordine k e
+    prenderne l'ultimo coefficiente, in O(nlags^2) invece di nlags sistemi.
+    """
+    nlags = len(rho) - 1
+    pacf_values = np.ones(nlags + 1)
+    phi = np.zeros(nlags + 1)
+    for k in range(1, nlags + 1):
+        prev = phi[1:k]
+        denom = 1.0 - np.dot(prev, rho[1:k])
+        phi_kk = (rho[k] - np.dot(prev, rho[k - 1:0:-1])) / denom
+        phi[1:k] = prev - phi_kk * prev[::-1]
+        phi[k] = phi_kk
+        pacf_values[k] = phi_kk
+    return pacf_values
+
 
 def calculate_acf_pacf(series, nlags=None, alpha=0.05):
     """
     Calcola ACF e PACF per una serie temporale
     
+    ACF (con intervalli di Bartlett) e PACF (Yule-Walker 'adjusted', come
+    pacf(method='ywadjusted')) derivano dalle stesse somme di autocovarianza:
+    la PACF viene ottenuta con Durbin-Levinson. I risultati sono memorizzati per
+    (hash dei valori, nlags, alpha): rivedere la stessa serie non ricalcola nulla.
+    
     Args:
         series: pandas Series o array con valori della serie
         nlags: Numero di lag da calcolare (default: min(40, len(series)//4))
@@ -169,9 +330,6 @@ def calculate_acf_pacf(series, nlags=None, alpha=0.05):
     Returns:
         dict con 'acf', 'pacf', 'acf_confint', 'pacf_confint', 'lags'
     """
-    from statsmodels.tsa.stattools import acf, pacf
-    import numpy as np
-    
     # Converti in array se necessario
     if isinstance(series, pd.Series):
         values = series.values
@@ -179,7 +337,7 @@ def calculate_acf_pacf(series, nlags=None, alpha=0.05):
         values = np.array(series)
     
     # Rimuovi NaN
-    values = values[~np.isnan(values)]
+    values = np.ascontiguousarray(values[~np.isnan(values)], dtype=np.float64)
     
     if len(values) < 10:
         raise ValueError("Serie troppo corta per calcolare ACF/PACF (minimo 10 osservazioni)")
@@ -190,42 +348,145 @@ def calculate_acf_pacf(series, nlags=None, alpha=0.05):
     
     nlags = min(nlags, len(values) - 1)
     
-    # Calcola ACF
-    acf_values, acf_confint = acf(values, nlags=nlags, alpha=alpha, fft=True, bartlett_confint=True)
-    
-    # Calcola PACF
-    pacf_values, pacf_confint = pacf(values, nlags=nlags, alpha=alpha, method='ywadjusted')
-    
-    # Per testare significatività, gli intervalli di confidenza dovrebbero essere
-    # bande orizzontali intorno a zero, non intorno ai valori ACF/PACF
-    # Calcola intervalli di confidenza standard: ±1.96/sqrt(n) per testare se != 0
+    key = (hashlib.sha1(memoryview(values)).hexdigest(), nlags, alpha)
+    cached = acf_pacf_cache.get(key)
+    if cached is None:
+        cached = acf_pacf_cache.put(key, _compute_acf_pacf(values, nlags, alpha), nbytes=400 * (nlags + 1))
+    # Copia: i chiamanti possono modificare il dict restituito
+    return copy.deepcopy(cached)
+
+
+def _compute_acf_pacf(values, nlags, alpha):
+    """Calcolo vero e proprio di calculate_acf_pacf (valori senza NaN)"""
     from scipy import stats
     n = len(values)
-    z_critical = stats.norm.ppf(1 - alpha / 2.0)  # 1.96 per alpha=0.05
-    se_acf = 1.0 / np.sqrt(n)  # Standard error per ACF (assumendo white noise)
-    se_pacf = 1.0 / np.sqrt(n)  # Standard error per PACF
+    if nlags > n // 2:
+        raise ValueError(
+            f"La PACF si calcola solo fino al 50% delle osservazioni: nlags {nlags} deve essere < {n // 2}"
+        )
     
-    # Crea intervalli di confidenza intorno a zero per testare significatività
-    acf_ci_lower = [-z_critical * se_acf] * (nlags + 1)
-    acf_ci_upper = [z_critical * se_acf] * (nlags + 1)
+    sums = autocovariance_sums(values, nlags)
+    lags = np.arange(0, nlags + 1)
+    z_critical = stats.norm.ppf(1 - alpha / 2.0)  # 1.96 per alpha=0.05
     
-    pacf_ci_lower = [-z_critical * se_pacf] * (nlags + 1)
-    pacf_ci_upper = [z_critical * se_pacf] * (nlags + 1)
+    # ACF: autocovarianza / n (acf(fft=True) di statsmodels)
+    acf_values = sums / sums[0]
+    # Intervalli di Bartlett intorno ai valori ACF (bartlett_confint=True)
+    varacf = np.ones(nlags + 1) / n
+    varacf[0] = 0
+    varacf[1] = 1.0 / n
+    varacf[2:] *= 1 + 2 * np.cumsum(acf_values[1:-1] ** 2)
+    acf_interval = z_critical * np.sqrt(varacf)
+    acf_confint = np.column_stack((acf_values - acf_interval, acf_values + acf_interval))
+    
+    # PACF: autocovarianza 'adjusted' (/ (n - k)) e Durbin-Levinson
+    adjusted = sums / np.concatenate(([n], n - lags[1:]))
+    pacf_values = durbin_levinson(adjusted / adjusted[0])
+    pacf_interval = z_critical / np.sqrt(n)
+    pacf_confint = np.column_stack((pacf_values - pacf_interval, pacf_values + pacf_interval))
+    pacf_confint[0] = pacf_values[0]
     
-    # Crea array di lag
-    lags = np.arange(0, nlags + 1)
+    # Per testare significatività, gli intervalli di confidenza dovrebbero essere
+    # bande orizzontali intorno a zero, non intorno ai valori ACF/PACF
+    # Calcola intervalli di confidenza standard: ±1.96/sqrt(n) per testare se != 0
+    se = 1.0 / np.sqrt(n)  # Standard error per ACF e PACF (assumendo white noise)
+    band = [-float(z_critical * se), float(z_critical * se)]
     
     return {
-        'acf': [float(x) for x in acf_values],
-        'pacf': [float(x) for x in pacf_values],
-        'acf_confint': [[float(acf_ci_lower[i]), float(acf_ci_upper[i])] for i in range(len(lags))],
-        'pacf_confint': [[float(pacf_ci_lower[i]), float(pacf_ci_upper[i])] for i in range(len(lags))],
-        'lags': [int(x) for x in lags],
-        'acf_confint_raw': acf_confint.tolist() if hasattr(acf_confint, 'tolist') else (acf_confint if acf_confint is not None else None),  # Intervalli di confidenza raw da statsmodels
-        'pacf_confint_raw': pacf_confint.tolist() if hasattr(pacf_confint, 'tolist') else (pacf_confint if pacf_confint is not None else None),  # Intervalli di confidenza raw da statsmodels
+        'acf': acf_values.tolist(),
+        'pacf': pacf_values.tolist(),
+        'acf_confint': [list(band) for _ in range(nlags + 1)],
+        'pacf_confint': [list(band) for _ in range(nlags + 1)],
+        'lags': lags.tolist(),
+        'acf_confint_raw': acf_confint.tolist(),  # Intervalli di confidenza raw (come statsmodels)
+        'pacf_confint_raw': pacf_confint.tolist(),  # Intervalli di confidenza raw (come statsmodels)
         'n_observations': n  # Numero di osservazioni per calcoli successivi
     }
 
+# Lag del test di Ljung-Box sui residui (quelli oltre n // 2 vengono scartati)
+LJUNG_BOX_LAGS = (5, 10, 20)
+
+
+def residual_diagnostics(residuals, nlags=None, lb_lags=LJUNG_BOX_LAGS, alpha=0.05):
+    """
+    Diagnostica dei residui in un solo passaggio vettoriale
+
+    Statistiche descrittive, ACF dei residui, Ljung-Box per più lag e
+    Jarque-Bera derivano dagli stessi array: l'ACF viene calcolata una volta
+    (autocovariance_sums) e la statistica Q di Ljung-Box per tutti i lag è la
+    sua somma cumulata pesata, come acorr_ljungbox e jarque_bera di statsmodels.
+
+    Args:
+        residuals: residui (i valori non finiti vengono ignorati)
+        nlags: lag dell'ACF (default: min(40, n // 4), almeno il lag più alto di lb_lags)
+        lb_lags: lag del test di Ljung-Box
+        alpha: livello dei test e della banda di confidenza dell'ACF
+
+    Returns:
+        dict con n_obs, mean, std, min, max, skewness, kurtosis, 'acf'
+        ({'lags', 'values', 'confint'}), 'ljung_box' (lista per lag),
+        'jarque_bera' e normality_passed
+
+    Raises:
+        ValueError: meno di 10 residui finiti
+    """
+    from scipy import stats
+    x = np.asarray(residuals, dtype=np.float64)
+    x = x[np.isfinite(x)]
+    n = len(x)
+    if n < 10:
+        raise ValueError("Residui insufficienti per la diagnostica (minimo 10 osservazioni)")
+
+    lb_lags = sorted({int(lag) for lag in lb_lags if 0 < int(lag) < n // 2}) or [1]
+    if nlags is None:
+        nlags = min(40, n // 4)
+    nlags = min(max(int(nlags), lb_lags[-1]), n - 1)
+
+    mean = x.mean()
+    centered = x - mean
+    m2 = np.dot(centered, centered) / n
+    sums = autocovariance_sums(x, nlags)
+    acf_values = sums / sums[0] if sums[0] > 0 else np.zeros(nlags + 1)
+    lags = np.arange(nlags + 1)
+
+    # Ljung-Box: Q(h) = n (n + 2) sum_{k=1..h} acf_k^2 / (n - k), chi2 con h gradi di libertà
+    q = n * (n + 2) * np.cumsum(acf_values[1:] ** 2 / (n - lags[1:]))
+    q_lags = np.asarray(lb_lags)
+    q_stat = q[q_lags - 1]
+    q_pvalue = stats.chi2.sf(q_stat, q_lags)
+
+    # Jarque-Bera dai momenti centrali (asimmetria e curtosi non corrette, come statsmodels)
+    if m2 > 0:
+        skewness = np.dot(centered ** 2, centered) / n / m2 ** 1.5
+        kurtosis = np.dot(centered ** 2, centered ** 2) / n / m2 ** 2
+    else:
+        skewness, kurtosis = np.nan, np.nan
+    jb_stat = n / 6.0 * (skewness ** 2 + (kurtosis - 3) ** 2 / 4.0)
+    jb_pvalue = stats.chi2.sf(jb_stat, 2)
+
+    finite = lambda value: float(value) if np.isfinite(value) else None
+    band = float(stats.norm.ppf(1 - alpha / 2.0) / np.sqrt(n))
+    return {
+        'n_obs': n,
+        'mean': float(mean),
+        'std': float(x.std(ddof=1)),
+        'min': float(x.min()),
+        'max': float(x.max()),
+        'skewness': finite(skewness),
+        'kurtosis': finite(kurtosis),
+        'acf': {
+            'lags': lags.tolist(),
+            'values': acf_values.tolist(),
+            'confint': [-band, band]
+        },
+        'ljung_box': [
+            {'lag': int(lag), 'stat': finite(stat), 'pvalue': finite(pvalue), 'passed': bool(pvalue > alpha)}
+            for lag, stat, pvalue in zip(q_lags, q_stat, q_pvalue)
+        ],
+        'jarque_bera': {'stat': finite(jb_stat), 'pvalue': finite(jb_pvalue)},
+        'normality_passed': bool(jb_pvalue > alpha)
+    }
+
 def format_acf_pacf_numerical(acf_pacf_data, max_lags=20):
     """
     Formatta i valori numerici ACF/PACF in una stringa leggibile per l'IA
@@ -308,16 +569,32 @@ def apply_log_transform(df):
     Returns:
         DataFrame con serie trasformata logaritmicamente
     """
-    df_log = df.copy()
+    # Log naturale calcolato in-place sulla copia dei valori (nessun buffer intermedio)
+    values = df['y'].to_numpy(dtype=np.float64, copy=True)
+    df_log = df.drop(columns='y')
+    df_log['y'] = log_values(values, out=values)
     
-    # Verifica che tutti i valori siano positivi (necessario per log)
-    if (df_log['y'] <= 0).any():
-        raise ValueError("La trasformazione logaritmica richiede tutti i valori positivi. La serie contiene valori <= 0.")
+    return df_log
+
+def log_values(values, out=None):
+    """
+    Logaritmo naturale di una serie strettamente positiva
     
-    # Applica log naturale
-    df_log['y'] = np.log(df_log['y'])
+    Args:
+        values: array float64
+        out: buffer di output (può essere values stesso per il calcolo in-place)
     
-    return df_log
+    Returns:
+        array con il logaritmo dei valori
+    
+    Raises:
+        ValueError: se la serie contiene valori <= 0
+    """
+    values = np.asarray(values, dtype=np.float64)
+    # Verifica che tutti i valori siano positivi (necessario per log)
+    if len(values) and values.min() <= 0:
+        raise ValueError("La trasformazione logaritmica richiede tutti i valori positivi. La serie contiene valori <= 0.")
+    return np.log(values, out=out)
 
 def apply_differencing(df, order=1):
     """
@@ -333,14 +610,23 @@ def apply_differencing(df, order=1):
     if order <= 0:
         return df.copy()
     
-    df_diff = df.copy()
-    
-    # Applica differenziazione
-    for i in range(order):
-        df_diff['y'] = df_diff['y'].diff()
-    
-    # Rimuovi le osservazioni NaN (prime 'order' osservazioni)
-    df_diff = df_diff.dropna(subset=['y']).reset_index(drop=True)
+    # Le prime 'order' osservazioni non hanno una differenza definita
+    df_diff = df.iloc[order:].reset_index(drop=True)
+    df_diff['y'] = difference(df['y'].to_numpy(dtype=np.float64), order)
     
     return df_diff
 
+def difference(values, order=1):
+    """
+    Differenze di ordine 'order' (np.diff ripetuto in C, senza Series intermedie)
+    
+    Returns:
+        array di len(values) - order valori
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if order <= 0:
+        return values.copy()
+    if order >= len(values):
+        return np.empty(0, dtype=np.float64)
+    return np.diff(values, n=order)
+
@@ -1148,7 +1148,16 @@ async function loadDataVisualization() {
         
         document.getElementById('data-visualization-section').style.display = 'block';
         
-        createTimeSeriesPlot(data.data);
+        createTimeSeriesPlot(rowsFromColumns(data.data));
+        attachViewportLoader('time-series-plot', async (start, end) => {
+            const params = new URLSearchParams({ max_points: 1000 });
+            if (start) params.set('start', start);
+            if (end) params.set('end', end);
+            const response = await fetch(`/api/file/${currentFileId}/data?${params}`, {
+                credentials: 'include'
+            });
+            return response.ok ? (await response.json()).data : null;
+        });
         displayDescriptiveStats(data.statistics);
         
         // Visualizza ACF/PACF se disponibili
@@ -1172,6 +1181,51 @@ async function loadDataVisualization() {
         showToast('Errore nel caricamento della visualizzazione: ' + error.message, 'error');
     }
 }
+// Le serie arrivano in formato colonnare ({dates: [...], values: [...], ...}):
+// ricostruisce i punti {date, value, ...} usati dai grafici
+function rowsFromColumns(columns) {
+    if (!columns || !columns.dates) {
+        return [];
+    }
+    const keys = Object.keys(columns).filter(k => k !== 'dates');
+    return columns.dates.map((date, i) => {
+        const row = { date: date };
+        keys.forEach(k => { row[k === 'values' ? 'value' : k] = columns[k][i]; });
+        return row;
+    });
+}
+// Zoom su un grafico: ricarica dal server solo la finestra visibile (a piena risoluzione
+// se contiene meno di max_points punti); doppio click torna alla serie intera decimata
+function attachViewportLoader(containerId, fetchWindow) {
+    const chartEl = document.getElementById(containerId);
+    if (!chartEl || !chartEl.on) {
+        return;
+    }
+    let pending = null;
+    chartEl.on('plotly_relayout', event => {
+        let start = null;
+        let end = null;
+        if (event['xaxis.range[0]'] !== undefined) {
+            start = event['xaxis.range[0]'];
+            end = event['xaxis.range[1]'];
+        } else if (event['xaxis.range']) {
+            [start, end] = event['xaxis.range'];
+        } else if (!event['xaxis.autorange']) {
+            return;
+        }
+        clearTimeout(pending);
+        pending = setTimeout(async () => {
+            try {
+                const columns = await fetchWindow(start, end);
+                if (columns && columns.dates) {
+                    Plotly.restyle(containerId, { x: [columns.dates], y: [columns.values] }, [0]);
+                }
+            } catch (error) {
+                console.warn('Errore caricamento finestra del grafico:', error);
+            }
+        }, 250);
+    });
+}
 function createTimeSeriesPlot(dataPoints, containerId = 'time-series-plot', title = 'Serie Temporale') {
     const dates = dataPoints.map(d => d.date);
     const values = dataPoints.map(d => d.value);
@@ -1305,7 +1359,10 @@ async function applySmoothing() {
         
         // Mostra grafico confronto e statistiche se smoothing applicato (window > 1)
         if (windowSize > 1 && result.comparison_data) {
-            createSmoothingComparisonChart(result.comparison_data);
+            createSmoothingComparisonChart({
+                original: rowsFromColumns(result.comparison_data.original),
+                smoothed: rowsFromColumns(result.comparison_data.smoothed)
+            });
             displaySmoothingStats(result.statistics);
             
             // Mostra ACF/PACF serie smussata
@@ -1335,6 +1392,48 @@ async function applySmoothing() {
         document.getElementById('apply-smoothing-btn').disabled = false;
     }
 }
+// Anteprima smoothing: tutte le finestre del menu in una sola richiesta, poi solo lato client
+let smoothingPreview = null;
+
+async function previewSmoothing() {
+    if (!currentFileId) {
+        return;
+    }
+    
+    const select = document.getElementById('smoothing-window');
+    const windowSize = parseInt(select.value);
+    
+    try {
+        if (!smoothingPreview || smoothingPreview.fileId !== currentFileId) {
+            const windows = Array.from(select.options).map(o => o.value).join(',');
+            const response = await fetch(`/api/file/${currentFileId}/smoothing-preview?windows=${windows}`, {
+                credentials: 'include'
+            });
+            if (!response.ok) {
+                return;
+            }
+            const result = await response.json();
+            smoothingPreview = { fileId: currentFileId, windows: {} };
+            result.windows.forEach(w => { smoothingPreview.windows[w.window_size] = w; });
+        }
+        
+        const original = smoothingPreview.windows[1];
+        const smoothed = smoothingPreview.windows[windowSize];
+        if (windowSize <= 1 || !original || !smoothed) {
+            document.getElementById('smoothing-comparison').style.display = 'none';
+            document.getElementById('smoothing-stats').style.display = 'none';
+            return;
+        }
+        
+        createSmoothingComparisonChart({
+            original: rowsFromColumns({ dates: original.dates, values: original.values }),
+            smoothed: rowsFromColumns({ dates: smoothed.dates, values: smoothed.values })
+        });
+        displaySmoothingStats(smoothed.statistics);
+    } catch (error) {
+        console.error('Errore anteprima smoothing:', error);
+    }
+}
 function createACFPlot(acfPacfData, containerId) {
     const lags = acfPacfData.lags;
     const acf = acfPacfData.acf;
@@ -1571,6 +1670,8 @@ function createSmoothingComparisonChart(comparisonData) {
     
     const dates = original.map(d => d.date);
     const originalValues = original.map(d => d.value);
+    // La serie smussata ha meno osservazioni: usa le sue date
+    const smoothedDates = smoothed.map(d => d.date);
     const smoothedValues = smoothed.map(d => d.value);
     
     const traceOriginal = {
@@ -1587,7 +1688,7 @@ function createSmoothingComparisonChart(comparisonData) {
     };
     
     const traceSmoothed = {
-        x: dates,
+        x: smoothedDates,
         y: smoothedValues,
         type: 'scatter',
         mode: 'lines+markers',
@@ -1859,6 +1960,7 @@ async function runSARIMAX() {
             acf_pacf_analyses: acfPacfAnalyses  // Invia le analisi ACF/PACF fatte
         };
         
+        const jobStart = Date.now();
         const response = await fetch(`/api/file/${currentFileId}/fit-sarimax`, {
             method: 'POST',
             headers: {
@@ -1878,7 +1980,16 @@ async function runSARIMAX() {
             throw new Error(errorMessage);
         }
         
-        const result = await response.json();
+        let result = await response.json();
+        
+        // Il fit gira come job asincrono: attendi il completamento
+        if (result.job_id) {
+            result = await waitForJob(result.job_id, (job) => {
+                statusEl.innerHTML = job.status === 'queued'
+                    ? '⏳ SARIMAX in coda...'
+                    : `🔄 Esecuzione SARIMAX in corso... (${Math.round((Date.now() - jobStart) / 1000)}s)`;
+            });
+        }
         
         statusEl.innerHTML = 
             `✅ SARIMAX completato con successo!<br>
@@ -1914,6 +2025,26 @@ async function runSARIMAX() {
         btnEl.disabled = false;
     }
 }
+async function waitForJob(jobId, onProgress = null, intervalMs = 1000) {
+    // Interroga /api/jobs/<id> finché il job non termina; restituisce il result
+    while (true) {
+        const response = await fetch(`/api/jobs/${jobId}`, { credentials: 'include' });
+        if (!response.ok) {
+            throw new Error(`Errore HTTP ${response.status} nel controllo del job`);
+        }
+        const job = await response.json();
+        if (job.status === 'completed') {
+            return job.result;
+        }
+        if (job.status === 'failed') {
+            throw new Error(job.error || 'Job fallito');
+        }
+        if (onProgress) {
+            onProgress(job);
+        }
+        await new Promise(resolve => setTimeout(resolve, intervalMs));
+    }
+}
 function hideResultsSections() {
     // Nascondi le sezioni 8 (Risultati Modello) e 9 (Grafici Confronto)
     const resultsSection = document.getElementById('results-section');
@@ -2526,8 +2657,8 @@ async function loadForecastCharts(modelId = null) {
         const data = await response.json();
         
         // Grafico Training Set
-        if (data.training && data.training.data && data.training.data.length > 0) {
-            createTrainingChart(data.training.data);
+        if (data.training && data.training.data && data.training.data.dates.length > 0) {
+            createTrainingChart(rowsFromColumns(data.training.data));
         } else {
             console.warn('Nessun dato training disponibile per il grafico');
             if (trainChartEl) {
@@ -2536,8 +2667,8 @@ async function loadForecastCharts(modelId = null) {
         }
         
         // Grafico Test Set
-        if (data.test && data.test.data && data.test.data.length > 0) {
-            createTestChart(data.test.data);
+        if (data.test && data.test.data && data.test.data.dates.length > 0) {
+            createTestChart(rowsFromColumns(data.test.data));
         } else {
             console.warn('Nessun dato test disponibile per il grafico');
             if (testChartEl) {
@@ -2788,7 +2919,7 @@ async function applyLogTransform() {
             resultsEl.style.display = 'block';
             
             // Mostra grafico serie trasformata
-            if (result.data && result.data.length > 0) {
+            if (result.data && result.data.dates.length > 0) {
                 // Assicurati che il container sia visibile prima di creare il grafico
                 const chartContainer = document.getElementById('log-transform-chart');
                 if (chartContainer) {
@@ -2801,7 +2932,7 @@ async function applyLogTransform() {
                     }
                 }
                 
-                createTimeSeriesPlot(result.data, 'log-transform-chart', 'Serie Trasformata Log');
+                createTimeSeriesPlot(rowsFromColumns(result.data), 'log-transform-chart', 'Serie Trasformata Log');
                 
                 // Forza il ridisegno dopo che il grafico è stato creato
                 setTimeout(() => {
@@ -2941,7 +3072,7 @@ async function applyDifferencing() {
             resultsEl.style.display = 'block';
             
             // Mostra grafico serie differenziata
-            if (result.data && result.data.length > 0) {
+            if (result.data && result.data.dates.length > 0) {
                 // Assicurati che il container sia visibile prima di creare il grafico
                 const chartContainer = document.getElementById('differencing-chart');
                 if (chartContainer) {
@@ -2954,7 +3085,7 @@ async function applyDifferencing() {
                     }
                 }
                 
-                createTimeSeriesPlot(result.data, 'differencing-chart', `Serie Differenziata (ordine ${order})`);
+                createTimeSeriesPlot(rowsFromColumns(result.data), 'differencing-chart', `Serie Differenziata (ordine ${order})`);
                 
                 // Forza il ridisegno dopo che il grafico è stato creato
                 setTimeout(() => {
@@ -3728,8 +3859,8 @@ async function loadModelFromHistory(runId, modelId, fileId = null) {
                 });
                 if (fileResponse.ok) {
                     const fileData = await fileResponse.json();
-                    if (fileData.data && fileData.data.length > 0) {
-                        totalObservations = fileData.data.length;
+                    if (fileData.data && fileData.data.dates.length > 0) {
+                        totalObservations = fileData.data.dates.length;
                         const totalObsDisplay = document.getElementById('total-obs-display');
                         if (totalObsDisplay) totalObsDisplay.textContent = totalObservations;
                     }